@@ -0,0 +1,310 @@
+# =============================================================================
+# Classement Elo des joueurs (global et par surface) sur tout l'historique
+# =============================================================================
+# Un seul passage chronologique sur les matchs de tous les niveaux (ATP,
+# qualifications/challengers, futures) : la date du tournoi, puis l'ordre des
+# tours (match_schema.ROUND_ORDER), puis match_num. L'état de chaque joueur
+# (classement, nombre de matchs) tient dans des tableaux indexés par une ligne
+# par joueur ; le facteur K décroît avec l'expérience (250 / (n + 5) ** 0.4).
+#
+# Après chaque tourney_date, le classement de chaque joueur ayant joué est
+# enregistré (« checkpoint ») dans des tableaux triés par (joueur, date) : le
+# classement d'un joueur à une date quelconque est une recherche dichotomique
+# (searchsorted), et les jointures as-of sur une table de matchs sont
+# vectorisées. Les matchs d'une date donnée ne voient que les checkpoints
+# strictement antérieurs, comme une prédiction faite avant le tournoi.
+#
+# Mise à jour incrémentale : les matchs datés au plus tôt du watermark (dernier
+# tourney_date ingéré) sont traités, sauf ceux du journal des matchs déjà
+# classés à la date du watermark (clé feature_store.match_keys) ; les matchs
+# d'un tournoi en cours, publiés en plusieurs fois, sont ainsi tous pris en
+# compte. Le fichier enregistré garde l'empreinte des CSV sources et le nombre
+# de matchs classés par saison : une saison antérieure au watermark modifiée, ou
+# une saison relue qui contient des matchs antérieurs au watermark jamais
+# classés (niveau publié en retard), entraîne une reconstruction complète.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from feature_store import match_keys
+from match_loader import changed_seasons, find_match_files, load_tier, season_counts, source_signature
+from match_schema import round_codes, yyyymmdd
+
+ELO_START = 1500.0
+ELO_TIERS = ('atp', 'qual_chall', 'futures')
+ELO_COLUMNS = ['tourney_id', 'tourney_date', 'surface', 'round', 'match_num', 'winner_id', 'loser_id']
+# Décalage des clés de checkpoint : clé = ligne joueur * DATE_SPAN + AAAAMMJJ
+DATE_SPAN = 10 ** 8
+# Clé par surface : (ligne joueur * MAX_SURFACES + surface) * DATE_SPAN + AAAAMMJJ
+MAX_SURFACES = 8
+
+
+def k_factor(n_matches):
+    return 250.0 / (n_matches + 5) ** 0.4
+
+
+# facteurs K précalculés pour la boucle d'ingestion (au-delà : dernière valeur)
+_K = [k_factor(n) for n in range(4000)]
+
+
+class EloRatings:
+    def __init__(self):
+        self.player_ids = []
+        self.rating = []              # classement global, une entrée par joueur
+        self.played = []              # nombre de matchs joués
+        self.surfaces = []
+        self.surface_rating = {}      # surface -> liste alignée sur les joueurs
+        self.surface_played = {}
+        self.watermark = None         # dernier tourney_date ingéré (AAAAMMJJ)
+        self.watermark_keys = set()   # clés des matchs déjà classés à la date du watermark
+        self.signature = []           # empreinte des CSV sources (match_loader.source_signature)
+        self.seasons = {}             # année -> nombre de matchs classés
+        self._row = {}
+        # checkpoints (tableaux triés par clé)
+        self.keys = np.empty(0, dtype=np.int64)
+        self.values = np.empty(0, dtype=np.float64)
+        self.surface_keys = np.empty(0, dtype=np.int64)
+        self.surface_values = np.empty(0, dtype=np.float64)
+
+    # --- état ---
+    def _player(self, pid):
+        row = self._row.get(pid)
+        if row is None:
+            row = len(self.player_ids)
+            self._row[pid] = row
+            self.player_ids.append(pid)
+            self.rating.append(ELO_START)
+            self.played.append(0)
+            for s in self.surfaces:
+                self.surface_rating[s].append(ELO_START)
+                self.surface_played[s].append(0)
+        return row
+
+    def _surface(self, surface):
+        if surface not in self.surface_rating:
+            if len(self.surfaces) == MAX_SURFACES:
+                raise ValueError(f"Trop de surfaces distinctes (max {MAX_SURFACES}) : {surface!r}")
+            self.surfaces.append(surface)
+            self.surface_rating[surface] = [ELO_START] * len(self.player_ids)
+            self.surface_played[surface] = [0] * len(self.player_ids)
+        return self.surfaces.index(surface)
+
+    # --- ingestion ---
+    def update(self, matches):
+        """
+        Ingère les matchs datés au plus tôt du watermark et pas encore classés
+        (colonnes ELO_COLUMNS), dans l'ordre chronologique. Renvoie le nombre
+        de matchs traités.
+        """
+        dates = yyyymmdd(matches['tourney_date'])
+        keys = match_keys(matches)
+        keep = self._fresh(dates, keys)
+        dates, keys = dates[keep], keys[keep]
+        if not len(dates):
+            return 0
+        winners = matches['winner_id'].to_numpy(np.int64)[keep]
+        losers = matches['loser_id'].to_numpy(np.int64)[keep]
+        surfaces = matches['surface'].to_numpy(dtype=object)[keep]
+        rounds = round_codes(matches['round'].to_numpy(dtype=object)[keep])
+        match_num = pd.to_numeric(matches['match_num'], errors='coerce').fillna(0).to_numpy(np.int64)[keep]
+        order = np.lexsort((match_num, rounds, dates))
+
+        rating, played, K, last_k = self.rating, self.played, _K, len(_K) - 1
+        ev_row, ev_date, ev_rating = [], [], []
+        ev_srow, ev_sdate, ev_srating = [], [], []
+        for i in order.tolist():
+            w = self._player(int(winners[i]))
+            l = self._player(int(losers[i]))
+            rw, rl = rating[w], rating[l]
+            expected = 1.0 / (1.0 + 10.0 ** ((rl - rw) / 400.0))
+            rating[w] = rw + K[min(played[w], last_k)] * (1.0 - expected)
+            rating[l] = rl - K[min(played[l], last_k)] * (1.0 - expected)
+            played[w] += 1
+            played[l] += 1
+            d = dates[i]
+            ev_row += [w, l]
+            ev_date += [d, d]
+            ev_rating += [rating[w], rating[l]]
+
+            s = surfaces[i]
+            if isinstance(s, str):
+                c = self._surface(s)
+                sr, sp = self.surface_rating[s], self.surface_played[s]
+                rw, rl = sr[w], sr[l]
+                expected = 1.0 / (1.0 + 10.0 ** ((rl - rw) / 400.0))
+                sr[w] = rw + K[min(sp[w], last_k)] * (1.0 - expected)
+                sr[l] = rl - K[min(sp[l], last_k)] * (1.0 - expected)
+                sp[w] += 1
+                sp[l] += 1
+                ev_srow += [w * MAX_SURFACES + c, l * MAX_SURFACES + c]
+                ev_sdate += [d, d]
+                ev_srating += [sr[w], sr[l]]
+
+        self.keys, self.values = _merge_checkpoints(self.keys, self.values, ev_row, ev_date, ev_rating)
+        self.surface_keys, self.surface_values = _merge_checkpoints(
+            self.surface_keys, self.surface_values, ev_srow, ev_sdate, ev_srating)
+        last = int(dates.max())
+        if self.watermark is None or last > self.watermark:
+            self.watermark, self.watermark_keys = last, set()
+        self.watermark_keys.update(keys[dates == self.watermark].tolist())
+        for year, n in season_counts(dates).items():
+            self.seasons[year] = self.seasons.get(year, 0) + n
+        return len(order)
+
+    def _fresh(self, dates, keys):
+        # matchs à classer : sans doublon, datés au plus tôt du watermark, pas encore vus à cette date
+        keep = ~pd.Series(keys).duplicated().to_numpy()
+        if self.watermark is not None:
+            keep &= dates >= self.watermark
+            keep[keep] &= np.array([k not in self.watermark_keys for k in keys[keep].tolist()], dtype=bool)
+        return keep
+
+    def missed(self, matches, start_year):
+        """
+        Vrai si les saisons relues depuis 'start_year' ne se réduisent pas aux matchs
+        déjà classés plus ceux que update ajouterait (match antérieur au watermark
+        publié après coup, ou match supprimé) : le classement doit être reconstruit.
+        """
+        dates = yyyymmdd(matches['tourney_date'])
+        keys = match_keys(matches)
+        read = season_counts(dates[~pd.Series(keys).duplicated().to_numpy()])
+        fresh = season_counts(dates[self._fresh(dates, keys)])
+        years = set(read) | {y for y in self.seasons if y >= start_year}
+        return any(read.get(y, 0) != self.seasons.get(y, 0) + fresh.get(y, 0) for y in years)
+
+    # --- lecture ---
+    def _rows(self, player_ids):
+        return np.array([self._row.get(pid, -1) for pid in np.asarray(player_ids).tolist()], dtype=np.int64)
+
+    def asof(self, player_ids, dates, surfaces=None):
+        """
+        Classement de chaque joueur juste avant chaque date (checkpoints
+        strictement antérieurs) ; ELO_START si le joueur n'a encore rien joué.
+        Avec 'surfaces', classement sur la surface donnée.
+        """
+        rows = self._rows(player_ids)
+        dates = yyyymmdd(dates)
+        if surfaces is None:
+            keys, values, slots = self.keys, self.values, rows
+        else:
+            col = {s: i for i, s in enumerate(self.surfaces)}
+            cols = np.array([col.get(s, -1) if isinstance(s, str) else -1
+                             for s in np.asarray(surfaces, dtype=object).tolist()], dtype=np.int64)
+            keys, values = self.surface_keys, self.surface_values
+            slots = np.where((rows >= 0) & (cols >= 0), rows * MAX_SURFACES + cols, -1)
+        out = np.full(len(rows), ELO_START)
+        if not len(keys):
+            return out
+        idx = np.searchsorted(keys, slots * DATE_SPAN + dates, side='left') - 1
+        found = (slots >= 0) & (idx >= 0)
+        found[found] &= keys[idx[found]] // DATE_SPAN == slots[found]
+        out[found] = values[idx[found]]
+        return out
+
+    def rating_of(self, player_id, date, surface=None):
+        """Classement d'un joueur à une date AAAAMMJJ (recherche dichotomique)."""
+        row = self._row.get(player_id)
+        if row is None:
+            return ELO_START
+        if surface is None:
+            keys, values, slot = self.keys, self.values, row
+        elif surface in self.surface_rating:
+            keys, values, slot = self.surface_keys, self.surface_values, row * MAX_SURFACES + self.surfaces.index(surface)
+        else:
+            return ELO_START
+        i = int(np.searchsorted(keys, slot * DATE_SPAN + int(date))) - 1
+        return float(values[i]) if i >= 0 and keys[i] // DATE_SPAN == slot else ELO_START
+
+    def current(self):
+        """Classements actuels : index player_id, colonnes elo et elo_<surface>."""
+        table = pd.DataFrame({'elo': self.rating, 'elo_matches': self.played},
+                             index=pd.Index(self.player_ids, name='player_id'))
+        for s in self.surfaces:
+            rating = np.array(self.surface_rating[s])
+            rating[np.array(self.surface_played[s]) == 0] = np.nan
+            table[f'elo_{s}'] = rating
+        return table
+
+    # --- persistance ---
+    def save(self, path):
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, player_ids=np.array(self.player_ids, dtype=np.int64),
+                 rating=np.array(self.rating), played=np.array(self.played, dtype=np.int32),
+                 surfaces=np.array(self.surfaces, dtype=str),
+                 surface_rating=np.array([self.surface_rating[s] for s in self.surfaces]).reshape(len(self.surfaces), -1),
+                 surface_played=np.array([self.surface_played[s] for s in self.surfaces], dtype=np.int32).reshape(len(self.surfaces), -1),
+                 keys=self.keys, values=self.values, surface_keys=self.surface_keys, surface_values=self.surface_values,
+                 watermark=np.array([] if self.watermark is None else [self.watermark], dtype=np.int64),
+                 watermark_keys=np.array(sorted(self.watermark_keys), dtype=str),
+                 signature=np.array(self.signature, dtype=str),
+                 season_years=np.array(list(self.seasons.keys()), dtype=np.int64),
+                 season_matches=np.array(list(self.seasons.values()), dtype=np.int64))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        ratings = cls()
+        with np.load(path) as z:
+            ratings.player_ids = z['player_ids'].tolist()
+            ratings.rating = z['rating'].tolist()
+            ratings.played = z['played'].tolist()
+            ratings.surfaces = z['surfaces'].tolist()
+            for i, s in enumerate(ratings.surfaces):
+                ratings.surface_rating[s] = z['surface_rating'][i].tolist()
+                ratings.surface_played[s] = z['surface_played'][i].tolist()
+            ratings.keys, ratings.values = z['keys'], z['values']
+            ratings.surface_keys, ratings.surface_values = z['surface_keys'], z['surface_values']
+            ratings.watermark = int(z['watermark'][0]) if len(z['watermark']) else None
+            ratings.watermark_keys = set(z['watermark_keys'].tolist()) if 'watermark_keys' in z else set()
+            ratings.signature = z['signature'].tolist() if 'signature' in z else []
+            if 'season_years' in z:
+                ratings.seasons = dict(zip(z['season_years'].tolist(), z['season_matches'].tolist()))
+        ratings._row = {pid: i for i, pid in enumerate(ratings.player_ids)}
+        return ratings
+
+    @classmethod
+    def load_or_build(cls, path, data_path='.', tiers=ELO_TIERS):
+        """
+        Relit le fichier s'il existe puis ingère les saisons depuis son watermark ;
+        reconstruction complète si un CSV d'une saison antérieure a changé ou si
+        les saisons relues contiennent des matchs que la mise à jour ne peut pas
+        classer (cf. missed).
+        """
+        signature = source_signature(find_match_files(data_path, tiers))
+        ratings = cls.load(path) if os.path.exists(path) else cls()
+        if ratings.watermark is not None:
+            changed = changed_seasons(ratings.signature, signature)
+            if changed and min(changed) < ratings.watermark // 10000:
+                print(f"Avertissement : fichiers de matchs modifiés, le classement Elo '{path}' est reconstruit.")
+                ratings = cls()
+        start_year = None if ratings.watermark is None else ratings.watermark // 10000
+        matches = load_tier(data_path, tiers, start_year=start_year, columns=ELO_COLUMNS)
+        if start_year is not None and ratings.missed(matches, start_year):
+            print(f"Avertissement : matchs antérieurs au watermark ajoutés, le classement Elo '{path}' est reconstruit.")
+            ratings = cls()
+            matches = load_tier(data_path, tiers, columns=ELO_COLUMNS)
+        ratings.update(matches)
+        ratings.signature = signature
+        ratings.save(path)
+        return ratings
+
+
+def _merge_checkpoints(keys, values, rows, dates, ratings):
+    # ajoute les évènements (chronologiques) et ne garde que le dernier par (joueur, date)
+    if not rows:
+        return keys, values
+    new_keys = np.array(rows, dtype=np.int64) * DATE_SPAN + np.array(dates, dtype=np.int64)
+    new_values = np.array(ratings)
+    order = np.argsort(new_keys, kind='stable')
+    new_keys, new_values = new_keys[order], new_values[order]
+    last = np.r_[new_keys[1:] != new_keys[:-1], True]
+    new_keys, new_values = new_keys[last], new_values[last]
+    # à la date du watermark, le nouveau classement remplace l'ancien checkpoint
+    keys = np.r_[keys, new_keys]
+    values = np.r_[values, new_values]
+    order = np.argsort(keys, kind='stable')
+    keys, values = keys[order], values[order]
+    last = np.r_[keys[1:] != keys[:-1], True]
+    return keys[last], values[last]
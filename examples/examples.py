@@ -6,6 +6,7 @@
     Python Version: 3
 '''
 import csv
+import os
 import pprint
 import datetime
 import glob
@@ -22,6 +23,14 @@ import math
 from pandas.core.categorical import Categorical
 from spyderlib.widgets.externalshell import namespacebrowser
 
+#shared season-file loader lives in the parent directory (next to predict.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from match_loader import load_tier
+from rankings_index import RankingsIndex
+from h2h_index import H2HIndex
+from streaks import find_streaks
+from score_parser import MAX_SETS, parse_scores
+
 
 
 #util functions
@@ -36,92 +45,34 @@ def parse(t):
         ret.append(tsdt)
     return ret
 
+def _parse_tourney_date(matches):
+    """parses the tourney_date column (YYYYMMDD) into datetime objects"""
+    matches['tourney_date'] = pd.to_datetime(parse(matches['tourney_date']))
+    return matches
+
 def readATPMatches(dirname):
     """Reads ATP matches but does not parse time into datetime object"""
-    allFiles = glob.glob(dirname + "/atp_matches_" + "????.csv")
-    matches = pd.DataFrame()
-    container = list()
-    for filen in allFiles:
-        df = pd.read_csv(filen,
-                         index_col=None,
-                         header=0)
-        container.append(df)
-    matches = pd.concat(container)
-    return matches
+    return load_tier(dirname, ('atp',))
 
 def readATPMatchesParseTime(dirname):
     """Reads ATP matches and parses time into datetime object"""
-    allFiles = glob.glob(dirname + "/atp_matches_" + "????.csv")
-    matches = pd.DataFrame()
-    container = list()
-    for filen in allFiles:
-        df = pd.read_csv(filen,
-                         index_col=None,
-                         header=0,
-                         parse_dates=[5],
-                         encoding = "ISO-8859-1",
-                         date_parser=lambda t:parse(t))
-        container.append(df)
-    matches = pd.concat(container)
-    return matches
+    return _parse_tourney_date(load_tier(dirname, ('atp',)))
 
 def readFMatches(dirname):
     """Reads ITF future matches but does not parse time into datetime object"""
-    allFiles = glob.glob(dirname + "/atp_matches_futures_" + "????.csv")
-    matches = pd.DataFrame()
-    container = list()
-    for filen in allFiles:
-        df = pd.read_csv(filen,
-                         index_col=None,
-                         header=0)
-        container.append(df)
-    matches = pd.concat(container)
-    return matches
+    return load_tier(dirname, ('futures',))
 
 def readFMatchesParseTime(dirname):
-    """Reads ITF future matches but does not parse time into datetime object"""
-    allFiles = glob.glob(dirname + "/atp_matches_futures_" + "????.csv")
-    matches = pd.DataFrame()
-    container = list()
-    for filen in allFiles:
-        df = pd.read_csv(filen,
-                         index_col=None,
-                         header=0,
-                         parse_dates=[5],
-                         encoding = "ISO-8859-1",
-                         date_parser=lambda t:parse(t))
-        container.append(df)
-    matches = pd.concat(container)
-    return matches
+    """Reads ITF future matches and parses time into datetime object"""
+    return _parse_tourney_date(load_tier(dirname, ('futures',)))
 
 def readChall_QATPMatchesParseTime(dirname):
     """reads Challenger level + ATP Q matches and parses time into datetime objects"""
-    allFiles = glob.glob(dirname + "/atp_matches_qual_chall_" + "????.csv")
-    matches = pd.DataFrame()
-    container = list()
-    for filen in allFiles:
-        df = pd.read_csv(filen,
-                         index_col=None,
-                         header=0,
-                         parse_dates=[5],
-                         encoding = "ISO-8859-1",
-                         date_parser=lambda t:parse(t))
-        container.append(df)
-    matches = pd.concat(container)
-    return matches
+    return _parse_tourney_date(load_tier(dirname, ('qual_chall',)))
 
 def readChall_QATPMatches(dirname):
     """reads Challenger level + ATP Q matches but does not parse time into datetime objects"""
-    allFiles = glob.glob(dirname + "/atp_matches_qual_chall_" + "????.csv")
-    matches = pd.DataFrame()
-    container = list()
-    for filen in allFiles:
-        df = pd.read_csv(filen,
-                         index_col=None,
-                         header=0)
-        container.append(df)
-    matches = pd.concat(container)
-    return matches
+    return load_tier(dirname, ('qual_chall',))
 
 def readAllRankings(dirname):
     """reads all ranking files"""
@@ -157,23 +108,29 @@ def get_date_wins(in_group):
     in_group["tournament_wins"] = in_group.apply(lambda x: len(temp[temp['tourney_date'] < x['ranking_date']]), axis=1) 
     return in_group
     
+def getRankingsIndex(dirname=".."):
+    """returns the point-in-time rankings index (built once, then reused)"""
+    global rankingsindex
+    if rankingsindex is None:
+        rankingsindex = RankingsIndex.from_files(dirname)
+    return rankingsindex
+
 def getRankForPreviousMonday(tdate,playername):
     """utility function to calculate the rank of a player from the previous week"""
-    global joinedrankingsdf
-    print(tdate)
-    print(playername)
+    index = getRankingsIndex()
+    tdate = pd.Timestamp(tdate).date()
     #some tournaments start on a sunday, so we change this to a monday in order to get the correct ranking later on (we only have rankings for mondays obviously)
     if (tdate.weekday() != 0):
         diff = 7 - tdate.weekday()
         tdate = tdate + datetime.timedelta(days = diff)
+    playerid = index.player_id(playername)
     for x in range(1, 3):
         prevmon = tdate - datetime.timedelta(days = 7*x)
-        if (len(joinedrankingsdf[(joinedrankingsdf['date'] == prevmon)]) > 0):
-            rank = joinedrankingsdf[((joinedrankingsdf['fullname'] == playername) & (joinedrankingsdf['date'] == prevmon))].iloc[[0]]['rank'].values[0]
-            return rank
-            break
-        else:
-            continue
+        prevmon = prevmon.year * 10000 + prevmon.month * 100 + prevmon.day
+        if index.has_ranking_date(prevmon):
+            if playerid is None:
+                return None
+            return index.rank_on(playerid, prevmon)
 
 #calculations            
 def matchesPerCountryAndRound(matches):
@@ -190,36 +147,26 @@ def bestLLinGrandSlams(matches):
     print(matches[['tourney_name','tourney_date','round','winner_name','winner_entry', 'loser_name', 'loser_entry']].to_csv(sys.stdout,index=False))    
   
 def numberOfSetsLongerThan(matches,sets,minutes):
-    """find matches longer than 'minutes' with 'sets' number of played sets"""
-    matches['score'].astype('str')
-    matches = matches[(matches['minutes'] > minutes) & (matches['score'].str.count('-') == sets)]
-    matches = matches.sort(['minutes'], ascending=False)
+    """find matches longer than 'minutes' with 'sets' number of played sets (an interrupted set counts, as in '6-4 3-2 RET')"""
+    scores = parse_scores(matches['score'])
+    #n_sets only counts completed sets: count every set with a score instead
+    played = (scores[['set%d_w' % i for i in range(1, MAX_SETS + 1)]] >= 0).sum(axis=1)
+    matches = matches[(matches['minutes'] > minutes) & (played == sets)]
+    matches = matches.sort_values(['minutes'], ascending=False)
     print(matches[['minutes','score','tourney_name','tourney_date','round','winner_name', 'loser_name']].to_csv(sys.stdout,index=False))    
     
-def geth2hforplayer(matches,name):
-    """get all head-to-heads of the player"""
-    matches = matches[(matches['winner_name'] == name) | (matches['loser_name'] == name)]
-    h2hs = {}
-    for index, match in matches.iterrows():
-        if (match['winner_name'] == name):
-            if (match['loser_name'] not in h2hs):
-                h2hs[match['loser_name']] = {}
-                h2hs[match['loser_name']]['l'] = 0
-                h2hs[match['loser_name']]['w'] = 1
-            else:
-                h2hs[match['loser_name']]['w'] = h2hs[match['loser_name']]['w']+1
-        elif (match['loser_name'] == name):
-            if (match['winner_name'] not in h2hs):
-                h2hs[match['winner_name']] = {}
-                h2hs[match['winner_name']]['w'] = 0
-                h2hs[match['winner_name']]['l'] = 1
-            else:
-                h2hs[match['winner_name']]['l'] = h2hs[match['winner_name']]['l']+1
-
+def geth2hforplayer(matches,name,index=None):
+    """get all head-to-heads of the player. pass a prebuilt H2HIndex when calling this for many players"""
+    if index is None:
+        index = H2HIndex.from_matches(matches)
+    #all players with this name (homonyms are merged, as are opponents sharing a name)
+    playerids = index.player_ids(name)
+    if not playerids:
+        return ''
+    opponents = pd.concat([index.opponents(p) for p in playerids])
+    h2hs = opponents.groupby(opponents['opponent_id'].map(index.names))[['wins', 'losses']].sum()
     #create list
-    h2hlist = []
-    for k, v in h2hs.items():
-        h2hlist.append([k, v['w'],v['l']])
+    h2hlist = [[o, w, l] for o, w, l in zip(h2hs.index.tolist(), h2hs['wins'].tolist(), h2hs['losses'].tolist())]
     #sort by wins and then by losses + print
     #filter by h2hs with more than 6 wins:
     #h2hlist = [i for i in h2hlist if i[1] > 6]
@@ -625,25 +572,7 @@ def getLastSeedRankForGroupedTourneysDeprecated(groupedmatches):
         
 def getLastSeedRankForGroupedTourneys(groupedmatches):
     """returns the rank of the last seed for a give tournament"""
-    global joinedrankingsdf
-    #read rankings
-    dirname = ".."
-    ranking10s = dirname + "/atp_rankings_10s.csv"
-    playersDB = dirname + "/atp_players.csv"
-    
-    rankingdf = pd.DataFrame()
-    playersdf = pd.DataFrame()
-    
-    rankingdf = pd.read_csv(ranking10s,index_col=None,header=None,
-                         parse_dates=[0],
-                         date_parser=lambda t:parse(t))
-    rankingdf.columns = ['date', 'rank', 'id','points']
-    playersdf = pd.read_csv(playersDB,index_col=None,header=None)
-    playersdf.columns = ['id', 'fname', 'lname','hand','dob','country']
-    
-    joinedrankingsdf = pd.merge(rankingdf,playersdf, on='id')
-    joinedrankingsdf["fullname"] = joinedrankingsdf["fname"] + ' ' + joinedrankingsdf["lname"]
-
+    #rankings are looked up in the shared point-in-time index (see getRankForPreviousMonday)
     resultlist = []
     resultlist8 = []
     resultlist16 = []
@@ -913,8 +842,9 @@ def youngestChallengerWinners(matches):
     
 def getStreaks(atpmatches):
     """detects streaks in players' careers.
-    in the next lines some parameters can be changed."""
-    #how many wins allowed during the streak? only tested for 0 and 1.
+    in the next lines some parameters can be changed.
+    all players are processed at once by streaks.find_streaks (one sort, run-length encoding)"""
+    #how many losses (for winning streaks) or wins (for losing streaks) allowed during the streak?
     #GAPS_ALLOWED=1
     GAPS_ALLOWED=0
     #max rank of player when the streak was started
@@ -925,89 +855,16 @@ def getStreaks(atpmatches):
     #winning streak or losing streak?
     #WINS = False
     WINS = True
+    #change tourney_level in next line! (None for all levels, or a list like ['A','G','M'])
+    TOURNEY_LEVEL = 'S'
     
-    if (WINS):
-        NAME_COLUMN = 'winner_name'
-        RANK_COLUMN = 'winner_rank'
-    else:
-        NAME_COLUMN = 'loser_name'
-        RANK_COLUMN = 'loser_rank' 
-        
-    #change tourney_level in next line!
-    #atpmatches = atpmatches[(atpmatches['tourney_date'] >= 19900000) & (atpmatches['tourney_level'] != 'D')]
-    atpmatches = atpmatches[(atpmatches['tourney_date'] >= 19900000) & (atpmatches['tourney_level'] == 'S')]
-    
-    #counting wins and losses (and adding as a column) for each player (for filter later to increase speed of algorithm)
-    atpmatches['wfreq'] = atpmatches.groupby('winner_name')['winner_name'].transform('count')
-    atpmatches['lfreq'] = atpmatches.groupby('loser_name')['loser_name'].transform('count')
-
-    #only include players with more than 30 wins and 10 losses (to increase algorithm speed by reducing number of players)
-    wplayers = atpmatches[atpmatches['wfreq'] > 30]['winner_name'].tolist()
-    lplayers = atpmatches[atpmatches['lfreq'] > 10]['loser_name'].tolist()
-    players = set(wplayers+lplayers)
-
-    streaks = []
-    for player in players:
-        playerFullName = player
-        matches = atpmatches[((atpmatches['winner_name'] == playerFullName) | (atpmatches['loser_name'] == playerFullName))]
-        matches['round'] = pd.Categorical(matches['round'], categories = ["RR", "R128", "R64", "R32", "R16", "QF", "SF", "F", "W"])
-        matches = matches.sort(['tourney_date', 'round'])
-                
-        wins_cnt=0
-        streak = 0
-
-        for i in range(len(matches)):
-            #get losing streak
-            if (matches.iloc[i][NAME_COLUMN] == playerFullName):
-                if (streak == 0):
-                    startdate = matches.iloc[i]['tourney_date']
-                    startrank = matches.iloc[i][RANK_COLUMN]
-                streak = streak+1
-            else:
-                #win
-                wins_cnt=wins_cnt+1
-                if (wins_cnt==1):
-                    win_pos = i+1
-                
-                if (wins_cnt > GAPS_ALLOWED):  
-                    if (streak > MIN_STREAK_LENGTH):
-                        streaks.append([playerFullName,startdate,startrank,streak,GAPS_ALLOWED])
-                    streak = 0
-                    wins_cnt=0
-                    i = win_pos+1
-            
-#old version of the function            
-#         for index, match in matches.iterrows():
-#             #get losing streak
-#             if (match['loser_name'] == playerFullName):
-#                 if (streak == 0):
-#                     startdate = match['tourney_date']
-#                     startrank = match['loser_rank']
-#                 streak = streak+1
-#                 tempmatch = match
-#                 continue
-#             else:
-#                 #save streak because of win
-#                 if (streak > 6):
-#                     streaks.append([playerFullName,startdate,startrank,streak])
-#                 streak = 0
-#                 continue
-
-        #to get ongoing streaks or players who ended career with a losing streak
-        if (streak > MIN_STREAK_LENGTH):
-            streaks.append([playerFullName,startdate,startrank,streak,GAPS_ALLOWED])
-        streak = 0
-    #do some styling (for streak-starts where we dont have a ranking (possibly due to WC awarded) we enter 9999 as a streak-ranking-start
+    #for streak-starts where we dont have a ranking (possibly due to WC awarded) the streak-ranking-start is 9999
     #so in order to include them MAX_RANK needs to be set accordingly
-    streaks = [[row[0],row[1],9999 if math.isnan(row[2]) else int(row[2]),row[3],row[4]] for row in streaks]
-
-    #sort by date first because it's secondary sort index
-    streaks.sort(key=itemgetter(1),reverse=True)
-    #sort by streak length
-    streaks.sort(key=itemgetter(3),reverse=True)   
-    streaks = [y for y in streaks if int(y[2]) <= MAX_RANK]
-    for streak in streaks:
-        print(streak[0]+','+str(streak[1])+','+str(streak[2])+','+str(streak[3])+','+str(streak[4]))
+    streaks = find_streaks(atpmatches, wins=WINS, gaps_allowed=GAPS_ALLOWED, min_length=MIN_STREAK_LENGTH,
+                           max_rank=MAX_RANK, tourney_level=TOURNEY_LEVEL, since=19900000)
+    #sorted by streak length and then by date
+    for streak in streaks.itertuples(index=False):
+        print(streak.name+','+str(streak.start_date)+','+str(streak.start_rank)+','+str(streak.length)+','+str(GAPS_ALLOWED))
         
 def get1seedWinners(matches):
     """calculates how often the first seed won an ATP tournament"""
@@ -1730,71 +1587,41 @@ def setstats(atpmatches):
     name='Gael Monfils'
     matches=atpmatches[(atpmatches['winner_name'] == name) | (atpmatches['loser_name'] == name)]
     matches=matches[matches['tourney_date'] >  datetime.date(2014,12,28)]
-    #setfilter
-    matches = matches[(matches['score'].str.count('-') == 3) | (matches['score'].str.count('-') == 2)]
-    #norets
-    matches = matches[~matches['score'].str.contains('RET|W').fillna(False)]
-    matches['sets_analysis'] = matches.apply(analyzeSets, axis=1)
-    matches['sets_won'], matches['sets_lost'], matches['first'], matches['res']  = zip(*matches['sets_analysis'].map(lambda x: x.split(',')))
-    matches['sets_won'] = matches['sets_won'].astype('int')
-    matches['sets_lost'] = matches['sets_lost'].astype('int')
-    matches['first'] = matches['first'].astype('int')
-    print('sets won: ' + str(matches['sets_won'].sum()))
-    print('sets lost: ' + str(matches['sets_lost'].sum()))
-    print('first sets won: ' + str(matches['first'].sum()))
-    print('cb analysis:\n' + str(matches['res'].value_counts(sort=False)))
+    scores = parse_scores(matches['score'])
+    #setfilter + norets
+    keep = scores['n_sets'].isin([2,3]) & ~(scores['retired'] | scores['walkover'])
+    matches = matches[keep]
+    sets = analyzeSets(matches, scores[keep], name)
+    print('sets won: ' + str(sets['sets_won'].sum()))
+    print('sets lost: ' + str(sets['sets_lost'].sum()))
+    print('first sets won: ' + str(sets['first'].sum()))
+    print('cb analysis:\n' + str(sets['res'].value_counts(sort=False)))
     print('# of matches: ' + str(len(matches)))
-    #print(matches[['score','sets_won', 'sets_lost', 'first','winner_name', 'loser_name']].to_csv(sys.stdout,index=False))
-
-    
-    
-def analyzeSets(row):
-    """helper function"""
-    sets = row['score'].split(' ')
-    won=0
-    lost=0
-    first=0
-    res=0
-    print(sets)
-    for idx,set in enumerate(sets):
-        setscore = set.split('-')
-        if (len(setscore)>1):
-            #clean tb scores
-            if( '(' in setscore[0]):
-                setscore[0]=setscore[0][0]
-            if( '(' in setscore[1]):
-                setscore[1]=setscore[1][0]
-            if(row['winner_name'] == 'Gael Monfils'):
-                print('player winner')
-                if((int(setscore[0])>int(setscore[1])) & (int(setscore[0]) > 5)):
-                    won=won+1
-                    if(idx==0):
-                        first=1
-                elif(int(setscore[0])<int(setscore[1])):
-                    lost=lost+1
-            else:
-                print('player loser')
-                if((int(setscore[0])<int(setscore[1])) & (int(setscore[1]) > 5)):
-                    won=won+1
-                    if(idx==0):
-                        first=1
-                elif((int(setscore[0])>int(setscore[1]))):
-                    lost=lost+1 
-        print(setscore)
-    #ersten gewonnen und gewonnen = 0
-    if ((first==1) & (won>lost)):
-        res=0
-    #ersten verloren und gewonnen = 1
-    if ((first==0) & (won>lost)):
-        res=1
-    #ersten gewonnen und verloren = 2
-    if ((first==1) & (won<lost)):
-        res=2
-    #ersten verloren und verloren = 3
-    if ((first==0) & (won<lost)):
-        res=3
-    print(str(won)+','+str(lost)+','+str(first)+','+str(res))
-    return(str(won)+','+str(lost)+','+str(first)+','+str(res))
+    #print(pd.concat([matches[['score','winner_name', 'loser_name']], sets], axis=1).to_csv(sys.stdout,index=False))
+
+    
+    
+def analyzeSets(matches, scores, name):
+    """helper function: sets won/lost by 'name', first set won and comeback category for each match.
+    'scores' is the parsed score table of the matches (score_parser.parse_scores)"""
+    won_match = (matches['winner_name'] == name).to_numpy()
+    #a set counts as won when the player got more games and at least 6 of them
+    won = np.zeros(len(matches), dtype=int)
+    lost = np.zeros(len(matches), dtype=int)
+    for i in range(1, MAX_SETS+1):
+        w = scores['set'+str(i)+'_w'].to_numpy()
+        l = scores['set'+str(i)+'_l'].to_numpy()
+        own, opp = np.where(won_match, w, l), np.where(won_match, l, w)
+        setwon = (own > opp) & (own > 5)
+        won += setwon
+        lost += own < opp
+        if (i == 1):
+            first = setwon.astype(int)
+    #ersten gewonnen und gewonnen = 0, ersten verloren und gewonnen = 1
+    #ersten gewonnen und verloren = 2, ersten verloren und verloren = 3
+    res = np.select([(first == 1) & (won > lost), (first == 0) & (won > lost), (first == 1) & (won < lost), (first == 0) & (won < lost)],
+                    [0, 1, 2, 3], default=0)
+    return pd.DataFrame({'sets_won': won, 'sets_lost': lost, 'first': first, 'res': res}, index=matches.index)
             
     
         
@@ -1802,17 +1629,19 @@ def analyzeSets(row):
 def geth2hforplayerswrapper(atpmatches,qmatches):
     """helper function"""
     #geth2hforplayer(atpmatches,"Roger Federer")
-    atpmatches = atpmatches.append(qmatches)
+    atpmatches = pd.concat([atpmatches, qmatches])
+    index = H2HIndex.from_matches(atpmatches)
     names = atpmatches[atpmatches['winner_rank'] < 100]
     names = names.winner_name.unique()
     for name in names:
-        geth2hforplayer(atpmatches,name)
+        geth2hforplayer(atpmatches,name,index)
         
 def getwnonh2hs(atpmatches,qmatches,rankings):
     """calculates head to heads"""
     #todo: could be extended to older players and also show career-overlap (e.g. were 10y together on tour)s
     #make full matches df
-    atpmatches = atpmatches.append(qmatches)
+    atpmatches = pd.concat([atpmatches, qmatches])
+    index = H2HIndex.from_matches(atpmatches)
     
     global joinedrankingsdf
     #join rankings with playernames
@@ -1838,7 +1667,7 @@ def getwnonh2hs(atpmatches,qmatches,rankings):
     losses = atpmatches.groupby('loser_name').count()
     
     for player in playernames:
-        h2hlist = geth2hforplayer(atpmatches,player)
+        h2hlist = geth2hforplayer(atpmatches,player,index)
         h2hnames = [row[0] for row in h2hlist]
         noh2hs = [x for x in playernameslist if x not in h2hnames]
         
@@ -1902,13 +1731,7 @@ def gamesconcededpertitle(matches):
     matches = matches[(matches['tourney_level'] == 'S')]
     matches['wcnt'] = matches.groupby(['tourney_id','winner_name'])['winner_name'].transform('count')
     matches = matches[matches['wcnt'] == 5]
-    matches['sets_analysis'] = matches.apply(analyzeSetsFutures, axis=1)
-    matches['games_won'], matches['games_lost'], matches['rets'] = zip(*matches['sets_analysis'].map(lambda x: x.split(',')))
-    
-    #convert columns to int for summing up
-    matches['games_won'] = matches['games_won'].astype('int')
-    matches['games_lost'] = matches['games_lost'].astype('int')
-    matches['rets'] = matches['rets'].astype('int')
+    matches = pd.concat([matches, analyzeSetsFutures(matches)], axis=1)
     
     #calculate the sum over each matches games
     matches['games_won_t'] = matches.groupby(['tourney_id'])['games_won'].transform('sum')
@@ -1925,33 +1748,14 @@ def gamesconcededpertitle(matches):
     print(matches[['tourney_id', 'winner_name', 'wcnt','games_won_t','games_lost_t','rets_t']].drop_duplicates().to_csv(sys.stdout,index=False))
     
     
-def analyzeSetsFutures(row):
-    """helper function"""
+def analyzeSetsFutures(matches):
+    """helper function: games won and lost by the winner and retirement/walkover flag for each match"""
     #6-4 6-7(5) 6-4
-    #setscore[0] sind die vom sieger, setscore[1] sind die vom verlierer
-    try:
-        sets = row['score'].split(' ')
-        gameswonwinner=0
-        gameslostwinner=0
-        retcount=0
-        if 'RET' in row['score']: retcount=1
-        if 'W' in row['score']: retcount=1
-        #print(sets)
-        for idx,set in enumerate(sets):
-            setscore = set.split('-')
-            if (len(setscore)>1):
-                #clean tb scores
-                if( '(' in setscore[0]):
-                    setscore[0]=setscore[0][0]
-                if( '(' in setscore[1]):
-                    setscore[1]=setscore[1][0]
-                gameswonwinner=gameswonwinner+int(setscore[0])
-                gameslostwinner=gameslostwinner+int(setscore[1])
-    
-        #print(str(gameswonwinner)+','+str(gameslostwinner)+','+str(retcount))
-        return(str(gameswonwinner)+','+str(gameslostwinner)+','+str(retcount))
-    except:
-        return(str(0)+','+str(0)+','+str(0))
+    #set<i>_w sind die vom sieger, set<i>_l sind die vom verlierer
+    scores = parse_scores(matches['score'])
+    return pd.DataFrame({'games_won': scores['games_w'].astype(int),
+                         'games_lost': scores['games_l'].astype(int),
+                         'rets': (scores['retired'] | scores['walkover']).astype(int)}, index=matches.index)
 
 def lastTimeGrandSlamCountry(atpmatches):
     """grand slam results per country"""
@@ -2274,84 +2078,87 @@ rankdict = collections.defaultdict(dict)
 
 
 joinedrankingsdf = pd.DataFrame()
-#reading ATP level matches. The argument defines the path to the match files.
-#since the match files are in the parent directory we provide ".." as an argument
-#atpmatches = readATPMatches("..")
-atpmatches = readATPMatchesParseTime("..")
-
-#reading Challenger + ATP Q matches
-#qmatches = readChall_QATPMatches("..")
-#qmatches = readChall_QATPMatchesParseTime("..")
-#fmatches = readFMatches("..")
-#fmatches = readFMatchesParseTime("..")
-#rankings = readAllRankings("..")
-
-#the following lines make use of methods defined above this file. just remove the hash to uncomment the line and use the method.
-#matchesPerCountryAndRound(matches)
-#findLLQmultipleMatchesAtSameTournament(atpmatches,qmatches)
-#bestLLinGrandSlams(atpmatches)
-#numberOfSetsLongerThan(atpmatches,2,130)
-#geth2hforplayerswrapper(atpmatches,qmatches)
-#getwnonh2hs(atpmatches,qmatches,rankings)
-#getTop100ChallengerPlayersPerWeek(qmatches)
-#getTop100ChallengerPlayersPerWeek(fmatches)
-#showTourneysOfDate(fmatches,2011,10,3)
-#geth2hforplayer(atpmatches,"Roger Federer")
-#getStreaks(fmatches)
-#activeplayers = getActivePlayers("..")
-#getWinLossByPlayer(fmatches,activeplayers,False)
-#seedRanking(atpmatches)
-#qualifierSeeded(fmatches)
-#rankofQhigherthanlastSeed(atpmatches)
-#highRankedQLosers(qmatches,atpmatches)
-#avglastseedrank(atpmatches)
-#getBestQGrandSlamPlayer(qmatches,rankings)
-#getShortestFiveSetter(atpmatches)
-#getworstlda(atpmatches)
-#getCountriesPerTournament(qmatches)
-#getRetsPerPlayer(atpmatches,qmatches,fmatches,activeplayers,False)
-#youngestChallengerWinners(qmatches)
-#bestNonChampion(players,ranks)
-#fedR4WimbiTime(atpmatches)
-#youngFutures(fmatches)
-#rankingPointsOfYoungsters(players,ranks)
-#highestRankedAustriansInR16(atpmatches)
-#mostRetsInTourneyPerPlayer(atpmatches)
-#mostRetsPerYear(atpmatches)
-#mostWCs(atpmatches)
-#oldestWinnerATP(atpmatches,qmatches)
-#getAces(qmatches)
-#getRets(fmatches)
-#get1seedWinners(atpmatches)
-#getseedWinners(atpmatches)
-#getZeroBreakPointChampions(atpmatches)
-#easiestOpponents(atpmatches)
-#wcwinner(atpmatches)
-#titlesataage(atpmatches)
-#consecutivlosseswithoutbreaks(atpmatches)
-#losetonadalafterwin(atpmatches)
-#fouroffiveseedsgone(atpmatches)
-#backtobacklosses(atpmatches,'Rafael Nadal')
-#titlesdefended(atpmatches)
-#titlessurface(atpmatches)
-#matchesPerLastNameAndRound(atpmatches)
-#bestNeverQFWin(atpmatches,rankings,activeplayers)
-#listAllTimeNoQFWins(atpmatches)
-#setstats(atpmatches)
-#titles(fmatches)
-#lowestRankedTitlists(qmatches)
-#gamesconcededpertitle(fmatches)
-#lastTimeGrandSlamCountry(atpmatches)
-#countunder21grandslam(atpmatches)
-#countryTitle(fmatches)
-#youngGsmatchwinners(atpmatches)
-#mostPlayersInTop100OfCountry(rankings)
-#topSeedsGS(atpmatches)
-#top10winstitlist(atpmatches)
-#findLLwhoWOdinQ(atpmatches,qmatches)
-#ageBetweenPlayers(atpmatches,qmatches,fmatches)
-#percentageOfSeedWinnersinQ(qmatches)
-#percentagOfQWinners(qmatches)
-#findSmallestQDraws(qmatches)
-#youngestCombinedAge(atpmatches,fmatches,qmatches)
-highestRanked500finalist(atpmatches)
\ No newline at end of file
+rankingsindex = None
+#guarded so that the loader's worker processes can import this module safely
+if __name__ == "__main__":
+    #reading ATP level matches. The argument defines the path to the match files.
+    #since the match files are in the parent directory we provide ".." as an argument
+    #atpmatches = readATPMatches("..")
+    atpmatches = readATPMatchesParseTime("..")
+
+    #reading Challenger + ATP Q matches
+    #qmatches = readChall_QATPMatches("..")
+    #qmatches = readChall_QATPMatchesParseTime("..")
+    #fmatches = readFMatches("..")
+    #fmatches = readFMatchesParseTime("..")
+    #rankings = readAllRankings("..")
+
+    #the following lines make use of methods defined above this file. just remove the hash to uncomment the line and use the method.
+    #matchesPerCountryAndRound(matches)
+    #findLLQmultipleMatchesAtSameTournament(atpmatches,qmatches)
+    #bestLLinGrandSlams(atpmatches)
+    #numberOfSetsLongerThan(atpmatches,2,130)
+    #geth2hforplayerswrapper(atpmatches,qmatches)
+    #getwnonh2hs(atpmatches,qmatches,rankings)
+    #getTop100ChallengerPlayersPerWeek(qmatches)
+    #getTop100ChallengerPlayersPerWeek(fmatches)
+    #showTourneysOfDate(fmatches,2011,10,3)
+    #geth2hforplayer(atpmatches,"Roger Federer")
+    #getStreaks(fmatches)
+    #activeplayers = getActivePlayers("..")
+    #getWinLossByPlayer(fmatches,activeplayers,False)
+    #seedRanking(atpmatches)
+    #qualifierSeeded(fmatches)
+    #rankofQhigherthanlastSeed(atpmatches)
+    #highRankedQLosers(qmatches,atpmatches)
+    #avglastseedrank(atpmatches)
+    #getBestQGrandSlamPlayer(qmatches,rankings)
+    #getShortestFiveSetter(atpmatches)
+    #getworstlda(atpmatches)
+    #getCountriesPerTournament(qmatches)
+    #getRetsPerPlayer(atpmatches,qmatches,fmatches,activeplayers,False)
+    #youngestChallengerWinners(qmatches)
+    #bestNonChampion(players,ranks)
+    #fedR4WimbiTime(atpmatches)
+    #youngFutures(fmatches)
+    #rankingPointsOfYoungsters(players,ranks)
+    #highestRankedAustriansInR16(atpmatches)
+    #mostRetsInTourneyPerPlayer(atpmatches)
+    #mostRetsPerYear(atpmatches)
+    #mostWCs(atpmatches)
+    #oldestWinnerATP(atpmatches,qmatches)
+    #getAces(qmatches)
+    #getRets(fmatches)
+    #get1seedWinners(atpmatches)
+    #getseedWinners(atpmatches)
+    #getZeroBreakPointChampions(atpmatches)
+    #easiestOpponents(atpmatches)
+    #wcwinner(atpmatches)
+    #titlesataage(atpmatches)
+    #consecutivlosseswithoutbreaks(atpmatches)
+    #losetonadalafterwin(atpmatches)
+    #fouroffiveseedsgone(atpmatches)
+    #backtobacklosses(atpmatches,'Rafael Nadal')
+    #titlesdefended(atpmatches)
+    #titlessurface(atpmatches)
+    #matchesPerLastNameAndRound(atpmatches)
+    #bestNeverQFWin(atpmatches,rankings,activeplayers)
+    #listAllTimeNoQFWins(atpmatches)
+    #setstats(atpmatches)
+    #titles(fmatches)
+    #lowestRankedTitlists(qmatches)
+    #gamesconcededpertitle(fmatches)
+    #lastTimeGrandSlamCountry(atpmatches)
+    #countunder21grandslam(atpmatches)
+    #countryTitle(fmatches)
+    #youngGsmatchwinners(atpmatches)
+    #mostPlayersInTop100OfCountry(rankings)
+    #topSeedsGS(atpmatches)
+    #top10winstitlist(atpmatches)
+    #findLLwhoWOdinQ(atpmatches,qmatches)
+    #ageBetweenPlayers(atpmatches,qmatches,fmatches)
+    #percentageOfSeedWinnersinQ(qmatches)
+    #percentagOfQWinners(qmatches)
+    #findSmallestQDraws(qmatches)
+    #youngestCombinedAge(atpmatches,fmatches,qmatches)
+    highestRanked500finalist(atpmatches)
\ No newline at end of file
@@ -1,54 +1,31 @@
-import csv
+import os
+import sys
 
 ## scans results files to identify players with
 ## most bagels (6-0 sets won) in a single season
+## seasons are read one at a time and counted by set_patterns.py
+## (breadsticks: use BREADSTICK, or any (games won, games lost) pattern)
 
-## yrend is inclusive
-mw, yrstart, yrend = 'm', 1991, 2015
-
-if mw == 'm':   prefix = 'atp'
-else:   prefix = 'wta'
-
-## load files for chosen years
-matches = [row for row in csv.reader(open(prefix+'_matches_'+str(yrstart)+'.csv'))]
-for yr in range(yrstart+1, yrend+1):
-    matches += [row for row in csv.reader(open(prefix+'_matches_'+str(yr)+'.csv'))]
-
-## initial filtering of relevant matches
-matches = filter(lambda x: '6-0' in x[27] or '0-6' in x[27], matches)
-
-bagel_years = {}
-for m in matches:
-    tnyid, tnyname, surf, field, tlev, tdate, mno, wid, wseed, watt, wname, whand, wht, wcc, wage, wrank, wpts = m[:17]
-    lid, lseed, latt, lname, lhand, lht, lcc, lage, lrank, lpts, score, bestof, rd = m[17:30]
-
-    if '6-0' in score:
-        ## key is yr+player
-        wkey = tnyid[:4] + ' ' + wname
-        if wkey not in bagel_years:   bagel_years[wkey] = []
-        ## for each bagel, add list item with date (mmdd), tourney name, and round
-        bagel_years[wkey] += [tdate[4:]+' '+tnyname+' '+rd]*score.count('6-0')
-
-    if '0-6' in score:
-        lkey = tnyid[:4] + ' ' + lname
-        if lkey not in bagel_years:   bagel_years[lkey] = []
-        bagel_years[lkey] += [tdate[4:]+' '+tnyname+' '+rd]*score.count('0-6')        
-
-rows = []
-for bc in bagel_years:
-    ## show only player-seasons with 10+ bagels
-    if len(bagel_years[bc]) >= 10:
-        ## find and include metadata for 10th (chronological) bagel
-        bagels = sorted(bagel_years[bc])
-        tenth_bagel = bagels[9]
-        rows.append([bc[:4], bc[5:], len(bagel_years[bc]), tenth_bagel])
-
-## sort by most bagels
-rows = sorted(rows, key=lambda x: int(x[2]), reverse=True)
-
-results  = open(prefix+'_bagels_by_year.csv', 'wb')
-writer = csv.writer(results)
-for row in rows:    writer.writerow(row)
-results.close()
-
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from set_patterns import BAGEL, season_set_patterns
 
+## yrend is inclusive
+tiers, yrstart, yrend = ('atp', 'qual_chall', 'futures'), 1991, 2024
+pattern = BAGEL
+min_bagels = 10     ## show only player-seasons with 10+ bagels
+input_path = '../'  ## path to the single-season results csv files
+
+prefix = 'atp'
+
+if __name__ == "__main__":
+    ## counts per player-season, with metadata for the 10th (chronological) bagel
+    counts = season_set_patterns(input_path, tiers, yrstart, yrend, patterns=(pattern,),
+                                 nth=min_bagels, min_count=min_bagels)
+    ## date (mmdd), tourney name, and round of the 10th bagel
+    tenth_bagel = (counts['nth_date'].astype(str).str[4:] + ' ' + counts['nth_tourney'].astype(str)
+                   + ' ' + counts['nth_round'].astype(str))
+    rows = counts[['season', 'player', 'count']].assign(tenth_bagel=tenth_bagel)
+
+    ## sort by most bagels
+    rows = rows.sort_values('count', ascending=False, kind='stable')
+    rows.to_csv(prefix + '_bagels_by_year.csv', index=False, header=False)
@@ -1,84 +1,42 @@
-import csv
-from collections import Counter
+import os
+import sys
+
+import pandas as pd
 
 ## Aggregate the match results in the csv files provided at
-## https://github.com/JeffSackmann/tennis_atp and
-## https://github.com/JeffSackmann/tennis_wta
+## https://github.com/JeffSackmann/tennis_atp
 ## to create "player-season" rate stats, e.g. Ace% for Roger Federer in
-## 2015 or SPW% for Sara Errani in 2021.
+## 2015 or SPW% for Rafael Nadal in 2021.
+## Seasons are read one at a time (peak memory bounded by a single season);
+## all player-seasons of a year are computed at once by season_totals.py
+## (one grouped reduction over a long player-perspective table).
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from match_loader import INCOMPLETE_SCORES, load_tier
+from season_totals import TOTALS_COLUMNS, TOTALS_INPUT_COLUMNS, season_totals
 
-mw = 'm'            ## 'm' = men, 'w' = women
+tiers = ('atp',)    ## any of 'atp', 'qual_chall', 'futures'
 yrstart = 2018      ## first season to calculate totals
 yrend = 2019        ## last season to calculate totals
 match_min = 20      ## minimum number of matches (with matchstats)
                     ## a player must have to be included for a given year
 input_path = '../'  ## path to the single-season results csv files
 
-if mw == 'm':   prefix = 'atp'
-else:           prefix = 'wta'
-
+prefix = '_'.join(tiers)
 output_path = 'player_season_totals_' + prefix + '_' + str(yrstart) + '_' + str(yrend) + '.csv'
 
-header = ['Player', 'Year', 'Matches', 'Wins', 'Losses', 'Win%',
-          'Ace%', 'DF%', '1stIn', '1st%', '2nd%',
-          'SPW%', 'RPW%', 'TPW%', 'DomRatio']
-player_seasons = [header]
-
-for yr in range(yrstart, yrend + 1):
-    ## load one year of match results
-    matches = [row for row in csv.reader(open(input_path + prefix + '_matches_' + str(yr) + '.csv'))]
-    ## exclude incomplete/unplayed matches (e.g. "W/O" or "RET" in score]
-    matches = [k for k in matches if 'W' not in k[23] and 'R' not in k[23]]
-    ## exclude matches without stats
-    matches = [k for k in matches if '' not in [k[27], k[36]]]
-    ## make list of all players with a result
-    players = [k[10] for k in matches] + [k[18] for k in matches]
-    ## limit list of players to those with at least match_min matches
-    qualifs = [k for k, v in Counter(players).iteritems() if v >= match_min]
-    
-    for pl in qualifs:
-        ## find all of the players matches
-        pmatches = [k for k in matches if pl in [k[10], k[18]]]
-        ## make matrix of their stats (different columns depending if they won or lost)
-        pstats = [k[27:36] + k[36:45] if pl == k[10] else k[36:45] + k[27:36] for k in pmatches]
-        ## make row for their aggregate counting stats, starting with number of matches [with stats]
-        sum_row = [len(pstats)]
-        for i in range(len(pstats[0])):
-            this_stat = sum([int(k[i]) for k in pstats if k[i].isdigit()])
-            sum_row.append(this_stat)
-        ## calculate aggregates
-        match_count = len(pmatches)
-        wins = len([k for k in pmatches if k[10] == pl])
-        losses = match_count - wins
-        win_perc = wins / float(match_count)        
-        
-        ## readable names for serve stats
-        aces, dfs, svpt, firstin, firstwon, secondwon = sum_row[1:7]
-        ## calculate common rate stats
-        ace_rate = aces / float(svpt)
-        df_rate = dfs / float(svpt)
-        firstin_rate = firstin / float(svpt)
-        first_win = firstwon / float(firstin)
-        second_win = secondwon / (svpt - float(firstin))
-        spw = firstwon + secondwon
-        spw_rate = spw / float(svpt)
-
-        ## raw return stats
-        vaces, vdfs, retpt, vfirstin, vfirstwon, vsecondwon = sum_row[10:16]
-        ## calculate more aggregates
-        rpw = retpt - vfirstwon - vsecondwon
-        rpw_rate = rpw / float(retpt)
-
-        tpw_rate = (spw + rpw) / (float(svpt) + retpt)
-        dom_ratio = rpw_rate / (1 - spw_rate)
-
-        row = [pl, yr, match_count, wins, losses, win_perc,
-               ace_rate, df_rate, firstin_rate, first_win, second_win,
-               spw_rate, rpw_rate, tpw_rate, dom_ratio]
-        player_seasons.append(row)
-
-results  = open(output_path, 'wb')
-writer = csv.writer(results)
-for row in player_seasons:    writer.writerow(row)
-results.close()
-
+if __name__ == "__main__":
+    seasons = []
+    for year in range(yrstart, yrend + 1):
+        ## exclude incomplete/unplayed matches (e.g. "W/O" or "RET" in score) while reading
+        matches = load_tier(input_path, tiers, start_year=year, end_year=year,
+                            columns=TOTALS_INPUT_COLUMNS + ['score'], exclude_scores=INCOMPLETE_SCORES)
+        if len(matches):
+            seasons.append(season_totals(matches, match_min))
+    if seasons:
+        totals = pd.concat(seasons, ignore_index=True)
+    else:
+        ## no season of the range has matches for these tiers: header-only csv
+        print('No ' + '/'.join(tiers) + ' matches found in ' + input_path + ' for ' + str(yrstart) + '-' + str(yrend))
+        totals = pd.DataFrame(columns=TOTALS_COLUMNS)
+    totals.to_csv(output_path, index=False)
@@ -1,12 +1,23 @@
-import csv
-from itertools import islice,ifilter
-from collections import OrderedDict
+import os
+import sys
+from itertools import islice
+
+## prints the top 10 of the current rankings with each player's record
+## (files are streamed by match_records.py: one typed record per line)
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from match_records import iter_players, iter_rankings
 
 MAINDIR = "../"
-with  open(MAINDIR + "atp_players.csv") as pf,  open(MAINDIR + "atp_rankings_current.csv") as rf:
-    players = OrderedDict((row[0],row) for row in csv.reader(pf))
-    rankings = csv.reader(rf)
-    for i in islice(rankings, None, 10):
-        # now constant work getting row as opposed to 0(n)    
-        print players.get(i[2])
 
+
+def as_row(record):
+    # same output as the raw csv row: every field as a string, '' for an empty one
+    return None if record is None else ['' if value is None else str(value) for value in record]
+
+
+if __name__ == "__main__":
+    players = {p.player_id: p for p in iter_players(MAINDIR)}
+    for ranking in islice(iter_rankings(MAINDIR, files=['atp_rankings_current.csv']), None, 10):
+        # now constant work getting row as opposed to 0(n)
+        print(as_row(players.get(ranking.player)))
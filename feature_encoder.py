@@ -0,0 +1,157 @@
+# =============================================================================
+# Encodeur one-hot précompilé pour le modèle (remplace get_dummies + reindex)
+# =============================================================================
+# Ajusté une fois à l'entraînement puis sauvegardé avec le modèle (joblib).
+# Chaque modalité connue est associée directement à l'indice de sa colonne
+# dans la matrice de sortie, préallouée en float32 : l'encodage d'un lot ne
+# crée aucun DataFrame intermédiaire.
+# Même disposition que pd.get_dummies(drop_first=True) : colonnes numériques,
+# puis pour chaque colonne catégorielle une colonne '<col>_<modalité>' par
+# modalité sauf la première. Une valeur manquante donne une ligne de zéros ;
+# une modalité jamais vue à l'entraînement lève une UnknownCategoryError
+# (ValueError) au lieu d'être silencieusement mise à zéro.
+
+import numpy as np
+import pandas as pd
+
+
+class UnknownCategoryError(ValueError):
+    """Modalité absente des données d'ajustement de l'encodeur (erreur d'entrée)."""
+
+
+class FeatureEncoder:
+    # aucune colonne catégorielle côté LightGBM : tout est déjà en one-hot
+    categorical_feature = []
+
+    def __init__(self, numeric, categorical, drop_first=True):
+        self.numeric = list(numeric)
+        self.categorical = list(categorical)
+        self.drop_first = drop_first
+        self.categories = {}
+        self.offsets = {}     # colonne -> tableau (indice de modalité -> colonne de sortie, -1 = aucune)
+        self.lookup = {}      # colonne -> {modalité: colonne de sortie}
+        self.columns = []
+
+    def fit(self, df):
+        """Relève les modalités de chaque colonne catégorielle (ordre des catégories, sinon tri)."""
+        self.columns = list(self.numeric)
+        for col in self.categorical:
+            s = df[col]
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                cats = list(s.cat.categories)
+            else:
+                cats = sorted(pd.unique(s.dropna()).tolist())
+            kept = cats[1:] if self.drop_first else cats
+            start = len(self.columns)
+            self.columns += [f'{col}_{c}' for c in kept]
+            offsets = np.full(len(cats), -1, dtype=np.int64)
+            offsets[len(cats) - len(kept):] = np.arange(start, start + len(kept))
+            self.categories[col] = cats
+            self.offsets[col] = offsets
+            self.lookup[col] = dict(zip(cats, offsets.tolist()))
+        return self
+
+    @property
+    def n_features(self):
+        return len(self.columns)
+
+    def _codes(self, col, values):
+        codes = pd.Categorical(values, categories=self.categories[col]).codes
+        unknown = (codes < 0) & pd.notna(values)
+        if unknown.any():
+            raise UnknownCategoryError(f"Modalité(s) inconnue(s) pour '{col}' : {sorted(set(np.asarray(values, dtype=object)[unknown].tolist()))}")
+        return codes
+
+    def transform(self, df):
+        """Matrice (n, n_features) float32 pour un DataFrame contenant les colonnes d'entrée."""
+        n = len(df)
+        out = np.zeros((n, len(self.columns)), dtype=np.float32)
+        for j, col in enumerate(self.numeric):
+            out[:, j] = df[col].to_numpy(dtype=np.float32)
+        rows = np.arange(n)
+        for col in self.categorical:
+            values = df[col].to_numpy(dtype=object)
+            codes = self._codes(col, values)
+            offsets = np.where(codes >= 0, self.offsets[col][codes], -1)
+            hit = offsets >= 0
+            out[rows[hit], offsets[hit]] = 1.0
+        return out
+
+    def transform_one(self, record):
+        """Encode un seul match (dict) en une matrice (1, n_features), sans passer par pandas."""
+        out = np.zeros((1, len(self.columns)), dtype=np.float32)
+        for j, col in enumerate(self.numeric):
+            out[0, j] = record[col]
+        for col in self.categorical:
+            value = record[col]
+            if value is None or value != value:   # manquant (None ou NaN)
+                continue
+            offset = self.lookup[col].get(value)
+            if offset is None:
+                raise UnknownCategoryError(f"Modalité inconnue pour '{col}' : {value!r}")
+            if offset >= 0:
+                out[0, offset] = 1.0
+        return out
+
+
+# --- Mode catégoriel natif de LightGBM ---
+# Chaque colonne catégorielle devient une seule colonne de codes entiers
+# (0..k-1) que LightGBM découpe lui-même (categorical_feature), au lieu d'une
+# colonne par modalité. Une valeur manquante est codée NaN. Pour les colonnes
+# « ouvertes » (identifiants joueurs), une modalité inconnue est traitée comme
+# manquante ; pour les autres elle lève une ValueError.
+
+class CategoryEncoder:
+    def __init__(self, numeric, categorical, open_columns=()):
+        self.numeric = list(numeric)
+        self.categorical = list(categorical)
+        self.open_columns = set(open_columns)
+        self.categories = {}
+        self.lookup = {}      # colonne -> {modalité: code}
+        self.columns = self.numeric + self.categorical
+
+    def fit(self, df):
+        for col in self.categorical:
+            s = df[col]
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                cats = list(s.cat.categories)
+            else:
+                cats = sorted(pd.unique(s.dropna()).tolist())
+            self.categories[col] = cats
+            self.lookup[col] = {c: i for i, c in enumerate(cats)}
+        return self
+
+    @property
+    def n_features(self):
+        return len(self.columns)
+
+    @property
+    def categorical_feature(self):
+        """Indices des colonnes à déclarer catégorielles à LightGBM."""
+        return list(range(len(self.numeric), len(self.columns)))
+
+    def transform(self, df):
+        n = len(df)
+        out = np.empty((n, len(self.columns)), dtype=np.float32)
+        for j, col in enumerate(self.numeric):
+            out[:, j] = df[col].to_numpy(dtype=np.float32)
+        for j, col in enumerate(self.categorical, start=len(self.numeric)):
+            values = df[col].to_numpy(dtype=object)
+            codes = pd.Categorical(values, categories=self.categories[col]).codes
+            unknown = (codes < 0) & pd.notna(values)
+            if unknown.any() and col not in self.open_columns:
+                raise UnknownCategoryError(f"Modalité(s) inconnue(s) pour '{col}' : {sorted(set(values[unknown].tolist()))}")
+            out[:, j] = np.where(codes >= 0, codes, np.nan)
+        return out
+
+    def transform_one(self, record):
+        out = np.empty((1, len(self.columns)), dtype=np.float32)
+        for j, col in enumerate(self.numeric):
+            out[0, j] = record[col]
+        for j, col in enumerate(self.categorical, start=len(self.numeric)):
+            value = record.get(col)
+            code = None if value is None or value != value else self.lookup[col].get(value)
+            if code is None and value is not None and value == value and col not in self.open_columns:
+                raise UnknownCategoryError(f"Modalité inconnue pour '{col}' : {value!r}")
+            out[0, j] = np.nan if code is None else code
+        return out
@@ -0,0 +1,269 @@
+# =============================================================================
+# Magasin incrémental des caractéristiques joueurs (forme et surface)
+# =============================================================================
+# État persistant, en ajout seul, utilisé par precompute_advanced_stats :
+#   - pour chaque joueur, les WINDOW derniers résultats (tampon de forme) ;
+#   - pour chaque joueur et surface, les compteurs victoires / matchs ;
+#   - un journal des matchs déjà ingérés avec la forme des deux joueurs
+#     avant le match.
+# Lors d'une mise à jour, seuls les matchs datés au plus tôt du dernier
+# tourney_date ingéré (le « watermark ») et absents du journal sont traités, et
+# seuls les joueurs concernés voient leur état modifié : ajouter une semaine de
+# résultats ne coûte que quelques millisecondes. Un match plus ancien que le
+# watermark et jamais ingéré est ignoré (le magasin est en ajout seul).
+# Le magasin retient aussi le premier tourney_date ingéré (« start ») : des
+# données commençant plus tôt (START_YEAR avancé) n'y ont pas leur forme, et
+# celle des matchs suivants en dépend ; load_or_create reconstruit alors le
+# magasin, et update refuse de tels matchs.
+#
+# L'ordre de traitement reproduit celui du calcul complet de predict.py
+# (tri stable par joueur puis par date, victoires de la semaine avant les
+# défaites), si bien qu'un magasin construit sur les mêmes données donne
+# exactement les mêmes valeurs de forme.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from features import FORM_MIN_PERIODS, rolling_form
+
+FORM_WINDOW = 10
+# Colonnes identifiant un match de façon unique dans les fichiers
+MATCH_KEY_COLUMNS = ['tourney_id', 'match_num', 'winner_id', 'loser_id']
+
+
+def match_keys(df):
+    """Clé texte d'un match : tourney_id|match_num|winner_id|loser_id."""
+    parts = [df[c].astype(str) for c in MATCH_KEY_COLUMNS]
+    key = parts[0]
+    for p in parts[1:]:
+        key = key + '|' + p
+    return key.to_numpy(dtype=str)
+
+
+def _date_values(dates):
+    # datetime64 ou entier AAAAMMJJ -> entiers comparables
+    return np.asarray(dates.to_numpy()).astype(np.int64)
+
+
+class PlayerFeatureStore:
+    def __init__(self, window=FORM_WINDOW, min_periods=FORM_MIN_PERIODS):
+        self.window = window
+        self.min_periods = min_periods
+        self.player_ids = np.empty(0, dtype=np.int64)
+        self.history = np.zeros((0, window), dtype=np.int8)   # résultats, le plus récent en dernier
+        self.history_len = np.zeros(0, dtype=np.int16)
+        self.surfaces = []
+        self.surface_wins = np.zeros((0, 0), dtype=np.int32)
+        self.surface_matches = np.zeros((0, 0), dtype=np.int32)
+        self.log_keys = np.empty(0, dtype=str)
+        self.log_winner_form = np.empty(0, dtype=np.float64)
+        self.log_loser_form = np.empty(0, dtype=np.float64)
+        self.watermark = None   # dernier tourney_date ingéré (entier, ns ou AAAAMMJJ)
+        self.start = None       # premier tourney_date ingéré (même unité)
+        self._player_row = {}
+        self._log_row = {}
+
+    # --- persistance ---
+    def save(self, path):
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, window=self.window, min_periods=self.min_periods,
+                 player_ids=self.player_ids, history=self.history, history_len=self.history_len,
+                 surfaces=np.array(self.surfaces, dtype=str),
+                 surface_wins=self.surface_wins, surface_matches=self.surface_matches,
+                 log_keys=self.log_keys, log_winner_form=self.log_winner_form, log_loser_form=self.log_loser_form,
+                 watermark=np.array([] if self.watermark is None else [self.watermark], dtype=np.int64),
+                 start=np.array([] if self.start is None else [self.start], dtype=np.int64))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            store = cls(int(z['window']), int(z['min_periods']))
+            store.player_ids = z['player_ids']
+            store.history = z['history']
+            store.history_len = z['history_len']
+            store.surfaces = list(z['surfaces'])
+            store.surface_wins = z['surface_wins']
+            store.surface_matches = z['surface_matches']
+            store.log_keys = z['log_keys']
+            store.log_winner_form = z['log_winner_form']
+            store.log_loser_form = z['log_loser_form']
+            store.watermark = int(z['watermark'][0]) if len(z['watermark']) else None
+            store.start = int(z['start'][0]) if 'start' in z and len(z['start']) else None
+        store._player_row = {pid: i for i, pid in enumerate(store.player_ids.tolist())}
+        store._log_row = {k: i for i, k in enumerate(store.log_keys.tolist())}
+        return store
+
+    @classmethod
+    def load_or_create(cls, path, window=FORM_WINDOW, min_periods=FORM_MIN_PERIODS, dates=None):
+        """
+        Relit le magasin s'il existe et convient, sinon en crée un vide.
+        'dates' : colonne tourney_date des données à traiter ; un magasin qui
+        commence après leur premier match est reconstruit.
+        """
+        if os.path.exists(path):
+            store = cls.load(path)
+            if (store.window, store.min_periods) != (window, min_periods):
+                print(f"Avertissement : paramètres de forme modifiés, le magasin '{path}' est reconstruit.")
+            elif dates is not None and len(store.log_keys) and not store.covers(dates):
+                print(f"Avertissement : données antérieures au début du magasin '{path}', il est reconstruit.")
+            else:
+                return store
+        return cls(window, min_periods)
+
+    def covers(self, dates):
+        """Vrai si le magasin commence au plus tard au premier match de 'dates' (tourney_date)."""
+        return self.start is not None and (not len(dates) or self.start <= _date_values(dates).min())
+
+    # --- état interne ---
+    def _rows_for(self, ids):
+        new = [pid for pid in pd.unique(ids).tolist() if pid not in self._player_row]
+        if new:
+            start = len(self.player_ids)
+            self.player_ids = np.r_[self.player_ids, np.array(new, dtype=np.int64)]
+            self.history = np.vstack([self.history, np.zeros((len(new), self.window), dtype=np.int8)])
+            self.history_len = np.r_[self.history_len, np.zeros(len(new), dtype=np.int16)]
+            pad = np.zeros((len(new), len(self.surfaces)), dtype=np.int32)
+            self.surface_wins = np.vstack([self.surface_wins, pad])
+            self.surface_matches = np.vstack([self.surface_matches, pad])
+            self._player_row.update({pid: start + i for i, pid in enumerate(new)})
+        return np.array([self._player_row[pid] for pid in ids.tolist()], dtype=np.int64)
+
+    def _surface_cols(self, surfaces):
+        known = set(self.surfaces)
+        for s in pd.unique(surfaces[pd.notna(surfaces)]).tolist():
+            if s not in known:
+                self.surfaces.append(s)
+                known.add(s)
+                pad = np.zeros((len(self.player_ids), 1), dtype=np.int32)
+                self.surface_wins = np.hstack([self.surface_wins, pad])
+                self.surface_matches = np.hstack([self.surface_matches, pad])
+        col = {s: i for i, s in enumerate(self.surfaces)}
+        return np.array([col.get(s, -1) if pd.notna(s) else -1 for s in surfaces.tolist()], dtype=np.int64)
+
+    # --- ingestion ---
+    def update(self, df):
+        """
+        Ingère les matchs de 'df' absents du journal (colonnes MATCH_KEY_COLUMNS,
+        tourney_date, surface). Renvoie le nombre de matchs ajoutés.
+        """
+        if self.start is not None and len(df) and _date_values(df['tourney_date']).min() < self.start:
+            raise ValueError("Matchs antérieurs au début du magasin : reconstruction nécessaire "
+                             "(PlayerFeatureStore.load_or_create avec 'dates')")
+        if self.watermark is not None:
+            df = df[_date_values(df['tourney_date']) >= self.watermark]
+        keys = match_keys(df)
+        fresh = np.array([k not in self._log_row for k in keys.tolist()], dtype=bool)
+        # doublons à l'intérieur du lot
+        fresh &= ~pd.Series(keys).duplicated().to_numpy()
+        if not fresh.any():
+            return 0
+        new = df[fresh]
+        keys = keys[fresh]
+        n = len(new)
+
+        # évènements joueur : vainqueurs puis perdants, tri stable (joueur, date)
+        ids = np.r_[new['winner_id'].to_numpy(np.int64), new['loser_id'].to_numpy(np.int64)]
+        date = _date_values(new['tourney_date'])
+        dates = np.r_[date, date]
+        won = np.r_[np.ones(n, dtype=np.int8), np.zeros(n, dtype=np.int8)]
+        match_pos = np.r_[np.arange(n), np.arange(n)]
+        surfaces = np.r_[new['surface'].to_numpy(dtype=object), new['surface'].to_numpy(dtype=object)]
+
+        rows = self._rows_for(ids)
+        order = np.lexsort((dates, rows))
+        rows, won, match_pos, surfaces = rows[order], won[order], match_pos[order], surfaces[order]
+
+        # préfixe : tampon de forme actuel des joueurs concernés
+        players = np.unique(rows)
+        plen = self.history_len[players].astype(np.int64)
+        prefix_rows = np.repeat(players, plen)
+        prefix_won = np.concatenate([self.history[p, self.window - l:] for p, l in zip(players, plen)]) if plen.sum() else np.empty(0, dtype=np.int8)
+
+        # fusion préfixe + nouveaux évènements, bloc par joueur
+        seq_rows = np.r_[prefix_rows, rows]
+        seq_won = np.r_[prefix_won, won]
+        is_new = np.r_[np.zeros(len(prefix_rows), dtype=bool), np.ones(len(rows), dtype=bool)]
+        seq_order = np.lexsort((is_new, seq_rows))  # préfixe avant les nouveaux, ordre interne conservé
+        seq_rows, seq_won, is_new = seq_rows[seq_order], seq_won[seq_order], is_new[seq_order]
+        form_seq = rolling_form(seq_rows, seq_won, (self.window,), self.min_periods)[self.window]
+        form = np.empty(len(rows))
+        form[seq_order[is_new] - len(prefix_rows)] = form_seq[is_new]
+
+        # forme par match (vainqueur / perdant)
+        winner_form = np.full(n, np.nan)
+        loser_form = np.full(n, np.nan)
+        winner_form[match_pos[won == 1]] = form[won == 1]
+        loser_form[match_pos[won == 0]] = form[won == 0]
+
+        # nouveaux tampons : les 'window' derniers résultats de chaque joueur
+        ends = np.r_[np.flatnonzero(seq_rows[1:] != seq_rows[:-1]), len(seq_rows) - 1]
+        starts = np.r_[0, ends[:-1] + 1]
+        for p, s, e in zip(seq_rows[ends], starts, ends):
+            last = seq_won[max(s, e + 1 - self.window):e + 1]
+            self.history[p, :] = 0
+            self.history[p, self.window - len(last):] = last
+            self.history_len[p] = len(last)
+
+        # compteurs par surface (les matchs sans surface sont ignorés, comme dans le groupby)
+        cols = self._surface_cols(surfaces)
+        ok = cols >= 0
+        np.add.at(self.surface_matches, (rows[ok], cols[ok]), 1)
+        np.add.at(self.surface_wins, (rows[ok], cols[ok]), won[ok])
+
+        # journal
+        start = len(self.log_keys)
+        self.log_keys = np.r_[self.log_keys, keys]
+        self.log_winner_form = np.r_[self.log_winner_form, winner_form]
+        self.log_loser_form = np.r_[self.log_loser_form, loser_form]
+        self._log_row.update({k: start + i for i, k in enumerate(keys.tolist())})
+        self.watermark = int(date.max()) if self.watermark is None else max(self.watermark, int(date.max()))
+        self.start = int(date.min()) if self.start is None else min(self.start, int(date.min()))
+        return n
+
+    # --- lecture ---
+    def contains(self, df):
+        """Masque des matchs de 'df' déjà présents dans le journal."""
+        return np.array([k in self._log_row for k in match_keys(df).tolist()], dtype=bool)
+
+    def match_form(self, df):
+        """Forme (vainqueur, perdant) avant chaque match de 'df', lue dans le journal."""
+        idx = np.array([self._log_row.get(k, -1) for k in match_keys(df).tolist()], dtype=np.int64)
+        found = idx >= 0
+        winner_form = np.full(len(idx), np.nan)
+        loser_form = np.full(len(idx), np.nan)
+        winner_form[found] = self.log_winner_form[idx[found]]
+        loser_form[found] = self.log_loser_form[idx[found]]
+        return winner_form, loser_form
+
+    def current_form(self, player_id):
+        """Forme actuelle d'un joueur (NaN si moins de min_periods matchs)."""
+        row = self._player_row.get(player_id)
+        if row is None or self.history_len[row] < self.min_periods:
+            return np.nan
+        return self.history[row, self.window - self.history_len[row]:].mean()
+
+    def surface_record(self, player_ids, surfaces):
+        """Bilan actuel (victoires, matchs) de chaque joueur sur la surface donnée ; 0 si inconnu."""
+        rows = np.array([self._player_row.get(pid, -1) for pid in np.asarray(player_ids).tolist()], dtype=np.int64)
+        col = {s: i for i, s in enumerate(self.surfaces)}
+        cols = np.array([col.get(s, -1) if pd.notna(s) else -1 for s in np.asarray(surfaces, dtype=object).tolist()], dtype=np.int64)
+        ok = (rows >= 0) & (cols >= 0)
+        wins = np.zeros(len(rows), dtype=np.int64)
+        matches = np.zeros(len(rows), dtype=np.int64)
+        wins[ok] = self.surface_wins[rows[ok], cols[ok]]
+        matches[ok] = self.surface_matches[rows[ok], cols[ok]]
+        return wins, matches
+
+    def surface_stats(self):
+        """Même format que le groupby de precompute_advanced_stats : index (player_id, surface)."""
+        rows, cols = np.nonzero(self.surface_matches)
+        index = pd.MultiIndex.from_arrays(
+            [self.player_ids[rows], np.array(self.surfaces, dtype=object)[cols]], names=['player_id', 'surface'])
+        stats = pd.DataFrame({
+            'surface_win_pct': self.surface_wins[rows, cols] / self.surface_matches[rows, cols],
+            'surface_matches': self.surface_matches[rows, cols],
+        }, index=index)
+        return stats.sort_index()
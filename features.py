@@ -0,0 +1,112 @@
+# =============================================================================
+# Noyaux vectorisés de calcul des caractéristiques joueurs
+# =============================================================================
+# Fonctions NumPy pures, sans groupby ni lambda Python par joueur : les
+# évènements sont triés par blocs de joueur et les fenêtres glissantes se
+# calculent par différences de sommes cumulées et décalages d'indices.
+
+import numpy as np
+import pandas as pd
+
+FORM_WINDOWS = (10,)
+FORM_MIN_PERIODS = 3
+
+
+def block_starts(*keys):
+    """
+    Indice de début du bloc de chaque élément, pour des tableaux triés par
+    blocs ; un nouveau bloc commence dès que l'une des clés change.
+    """
+    n = len(keys[0])
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    change = np.zeros(n, dtype=bool)
+    change[0] = True
+    for k in keys:
+        change[1:] |= k[1:] != k[:-1]
+    starts = np.flatnonzero(change)
+    return np.repeat(starts, np.diff(np.r_[starts, n]))
+
+
+def rolling_form(player_ids, won, windows=FORM_WINDOWS, min_periods=FORM_MIN_PERIODS):
+    """
+    Forme de chaque évènement : moyenne des 'w' résultats précédents du même
+    joueur (le résultat courant exclu), NaN s'il y en a moins de 'min_periods'.
+    Équivaut à groupby(joueur)['won'].transform(lambda x: x.shift(1).rolling(w, min_periods).mean()).
+
+    'player_ids' doit être trié par blocs (ordre chronologique dans chaque bloc).
+    Renvoie un dict {w: tableau float64} ; toutes les fenêtres sont calculées
+    sur la même somme cumulée.
+    """
+    n = len(player_ids)
+    start = block_starts(np.asarray(player_ids))
+    csum = np.r_[0, np.cumsum(np.asarray(won), dtype=np.int64)]
+    pos = np.arange(n)
+    forms = {}
+    for w in windows:
+        lo = np.maximum(start, pos - w)
+        count = pos - lo
+        total = csum[pos] - csum[lo]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            forms[w] = np.where(count >= min(min_periods, w), total / count, np.nan)
+    return forms
+
+
+def surface_record_asof(winner_ids, loser_ids, surfaces, dates):
+    """
+    Bilan de chaque joueur sur la surface du match, strictement avant la date
+    du match (les matchs de la même date, donc du même tournoi, sont exclus).
+    Un seul passage chronologique trié, sans jointure ; les tableaux renvoyés
+    sont alignés sur les lignes de matchs :
+        winner_wins, winner_matches, loser_wins, loser_matches
+    Les matchs sans surface renvoient 0 match.
+    """
+    n = len(winner_ids)
+    ids = np.r_[np.asarray(winner_ids, dtype=np.int64), np.asarray(loser_ids, dtype=np.int64)]
+    won = np.r_[np.ones(n, dtype=np.int64), np.zeros(n, dtype=np.int64)]
+    codes, _ = pd.factorize(np.asarray(surfaces, dtype=object))
+    surf = np.r_[codes, codes]
+    day = np.asarray(dates).astype(np.int64)
+    day = np.r_[day, day]
+
+    order = np.lexsort((day, surf, ids))
+    ids, surf, day, won = ids[order], surf[order], day[order], won[order]
+    block = block_starts(ids, surf)          # début du bloc (joueur, surface)
+    same_day = block_starts(ids, surf, day)  # premier match du joueur ce jour-là sur cette surface
+    csum = np.r_[0, np.cumsum(won)]
+    prior_wins = csum[same_day] - csum[block]
+    prior_matches = same_day - block
+    prior_matches[surf < 0] = 0
+    prior_wins[surf < 0] = 0
+
+    wins = np.empty(2 * n, dtype=np.int64)
+    matches = np.empty(2 * n, dtype=np.int64)
+    wins[order] = prior_wins
+    matches[order] = prior_matches
+    return wins[:n], matches[:n], wins[n:], matches[n:]
+
+
+# --- Augmentation symétrique (lignes p1/p2 inversées) ---
+# Chaque match donne deux lignes : (vainqueur, perdant) avec result = 1 puis
+# (perdant, vainqueur) avec result = 0. Seules les colonnes utiles au modèle
+# sont construites ; le DataFrame des matchs n'est ni copié ni doublé.
+
+def antisymmetric(diff):
+    """Différence p1 - p2 sur les lignes d'origine puis son opposé sur les lignes inversées."""
+    diff = np.asarray(diff, dtype=np.float32)
+    out = np.empty(2 * len(diff), dtype=np.float32)
+    out[:len(diff)] = diff
+    np.negative(diff, out=out[len(diff):])
+    return out
+
+
+def mirrored(first, second):
+    """Colonne p1 : 'first' sur les lignes d'origine, 'second' sur les lignes inversées."""
+    if isinstance(first.dtype, pd.CategoricalDtype) or isinstance(second.dtype, pd.CategoricalDtype):
+        return pd.api.types.union_categoricals([first.astype('category'), second.astype('category')])
+    return np.concatenate([np.asarray(first), np.asarray(second)])
+
+
+def mirrored_result(n):
+    """Cible : 1 pour les lignes d'origine (p1 a gagné), 0 pour les lignes inversées."""
+    return np.r_[np.ones(n, dtype=np.int8), np.zeros(n, dtype=np.int8)]
@@ -0,0 +1,351 @@
+# =============================================================================
+# Index des confrontations directes (head-to-head) de toutes les paires
+# =============================================================================
+# Construit en un seul passage vectorisé (np.unique + bincount) sur la clé de
+# la paire ordonnée (min_id, max_id) de tous les matchs donnés (tous niveaux) :
+#   - bilan de la paire : matchs, victoires de chaque joueur, dernière rencontre ;
+#   - bilan par surface ;
+#   - pour chaque joueur, la liste de ses adversaires (tranche d'un tableau trié).
+# Les requêtes unitaires (pair, opponents) passent par des dictionnaires
+# clé de paire -> ligne et joueur -> tranche, construits à la première requête.
+# Les rencontres de chaque paire sont aussi rangées par date avec leurs cumuls :
+# le bilan d'une paire avant une date donnée (caractéristique sans fuite pour
+# le modèle) est une recherche dichotomique, vectorisée sur toute une table.
+#
+# Mise à jour incrémentale (comme elo.py) : seuls les matchs datés au plus tôt
+# du watermark et absents des clés déjà vues à cette date sont ajoutés ; leur
+# bilan, calculé à part, est fusionné avec celui de l'index (sommes par paire,
+# cumuls datés prolongés). L'empreinte des CSV sources et le nombre de matchs
+# comptés par saison sont enregistrés avec l'index : une saison antérieure au
+# watermark modifiée, ou une saison relue qui contient des matchs antérieurs au
+# watermark jamais comptés (niveau publié en retard), entraîne une
+# reconstruction complète.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from feature_store import MATCH_KEY_COLUMNS, match_keys
+from match_loader import changed_seasons, find_match_files, load_tier, season_counts, source_signature
+from match_schema import yyyymmdd
+
+H2H_TIERS = ('atp', 'qual_chall', 'futures')
+H2H_COLUMNS = ['tourney_id', 'match_num', 'tourney_date', 'surface', 'winner_id', 'loser_id', 'winner_name', 'loser_name']
+H2H_SURFACES = ['Hard', 'Clay', 'Grass', 'Carpet']
+DATE_SPAN = 10 ** 8
+# Clé d'une paire : lo * PAIR_SPAN + hi (identifiants joueurs < 2**24)
+PAIR_SPAN = 1 << 24
+
+
+def pair_keys(a, b):
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    return np.minimum(a, b) * PAIR_SPAN + np.maximum(a, b)
+
+
+class H2HIndex:
+    def __init__(self, pairs, event_keys, event_lo_wins, event_matches, names=None):
+        # pairs : une ligne par paire (lo < hi) triée par clé, colonnes lo, hi, matches,
+        #         lo_wins, last_date, <surface>_matches, <surface>_lo_wins
+        self.pairs = pairs
+        self.event_keys = event_keys          # code paire * DATE_SPAN + AAAAMMJJ, trié
+        self.event_lo_wins = event_lo_wins    # cumuls (inclus) par paire
+        self.event_matches = event_matches
+        self.names = names or {}              # id -> nom
+        self.watermark = None                 # dernier tourney_date ingéré (AAAAMMJJ)
+        self.watermark_keys = set()           # clés des matchs déjà comptés à la date du watermark
+        self.signature = []                   # empreinte des CSV sources (match_loader.source_signature)
+        self.seasons = {}                     # année -> nombre de matchs comptés
+        self._cols = {c: pairs[c].to_numpy() for c in pairs.columns}
+        lo, hi = self._cols['lo'], self._cols['hi']
+        self._keys = lo.astype(np.int64) * PAIR_SPAN + hi
+        # adversaires par joueur : chaque paire vue des deux côtés, triée par joueur
+        player = np.r_[lo, hi]
+        order = np.argsort(player, kind='stable')
+        self._side_pair = np.r_[np.arange(len(lo)), np.arange(len(lo))][order]
+        self._side_is_lo = np.r_[np.ones(len(lo), dtype=bool), np.zeros(len(lo), dtype=bool)][order]
+        self._side_player = player[order]
+
+    def _codes(self, keys):
+        # position de chaque paire dans self.pairs (-1 si jamais rencontrée)
+        if not len(self._keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        pos = np.searchsorted(self._keys, keys)
+        pos[pos == len(self._keys)] = 0
+        return np.where(self._keys[pos] == keys, pos, -1)
+
+    @classmethod
+    def from_matches(cls, matches):
+        w = matches['winner_id'].to_numpy(np.int64)
+        l = matches['loser_id'].to_numpy(np.int64)
+        lo_won = (w < l).astype(np.int64)
+        date = yyyymmdd(matches['tourney_date'])
+        keys, code = np.unique(pair_keys(w, l), return_inverse=True)
+        n = len(keys)
+        pairs = {'lo': (keys // PAIR_SPAN).astype(np.int32), 'hi': (keys % PAIR_SPAN).astype(np.int32),
+                 'matches': np.bincount(code, minlength=n), 'lo_wins': np.bincount(code, lo_won, minlength=n)}
+        last_date = np.zeros(n, dtype=np.int64)
+        np.maximum.at(last_date, code, date)
+        pairs['last_date'] = last_date
+        surfaces = matches['surface'].to_numpy(dtype=object) if 'surface' in matches else np.full(len(w), None)
+        for s in H2H_SURFACES:
+            on = surfaces == s
+            pairs[f'{s}_matches'] = np.bincount(code[on], minlength=n)
+            pairs[f'{s}_lo_wins'] = np.bincount(code[on], lo_won[on], minlength=n)
+        pairs = pd.DataFrame(pairs).astype(np.int32)
+
+        # rencontres datées : cumuls par paire après chaque date (dernier cumul du jour)
+        order = np.lexsort((date, code))
+        code, date, lo_won = code[order], date[order], lo_won[order]
+        starts = np.r_[0, np.flatnonzero(code[1:] != code[:-1]) + 1]
+        block = np.repeat(starts, np.diff(np.r_[starts, len(code)]))
+        csum = np.r_[0, np.cumsum(lo_won)]
+        cum_wins = csum[1:] - csum[block]
+        cum_matches = np.arange(len(code)) - block + 1
+        event_keys = code.astype(np.int64) * DATE_SPAN + date
+        last = np.r_[event_keys[1:] != event_keys[:-1], True]
+
+        names = {}
+        if 'winner_name' in matches and 'loser_name' in matches:
+            named = pd.Series(np.r_[matches['winner_name'].to_numpy(dtype=object), matches['loser_name'].to_numpy(dtype=object)],
+                              index=np.r_[w, l])
+            names = named[~named.index.duplicated(keep='last')].to_dict()
+        index = cls(pairs, event_keys[last], cum_wins[last].astype(np.int32), cum_matches[last].astype(np.int32), names)
+        if len(date):
+            index.watermark = int(date.max())
+            if all(c in matches for c in MATCH_KEY_COLUMNS):
+                all_dates = yyyymmdd(matches['tourney_date'])
+                keys = match_keys(matches)
+                index.watermark_keys = set(keys[all_dates == index.watermark].tolist())
+                index.seasons = season_counts(all_dates[~pd.Series(keys).duplicated().to_numpy()])
+        return index
+
+    @classmethod
+    def from_files(cls, path='.', tiers=H2H_TIERS):
+        return cls.from_matches(load_tier(path, tiers, columns=H2H_COLUMNS))
+
+    # --- mise à jour incrémentale ---
+    def update(self, matches):
+        """
+        Ajoute les matchs datés au plus tôt du watermark et pas encore comptés
+        (colonnes H2H_COLUMNS). Renvoie le nombre de matchs ajoutés.
+        """
+        dates = yyyymmdd(matches['tourney_date'])
+        keys = match_keys(matches)
+        keep = self._fresh(dates, keys)
+        if not keep.any():
+            return 0
+        new = matches[keep]
+        self._merge(type(self).from_matches(new))
+        dates, keys = dates[keep], keys[keep]
+        last = int(dates.max())
+        if self.watermark is None or last > self.watermark:
+            self.watermark, self.watermark_keys = last, set()
+        self.watermark_keys.update(keys[dates == self.watermark].tolist())
+        for year, n in season_counts(dates).items():
+            self.seasons[year] = self.seasons.get(year, 0) + n
+        return len(new)
+
+    def _fresh(self, dates, keys):
+        # matchs à compter : sans doublon, datés au plus tôt du watermark, pas encore vus à cette date
+        keep = ~pd.Series(keys).duplicated().to_numpy()
+        if self.watermark is not None:
+            keep &= dates >= self.watermark
+            keep[keep] &= np.array([k not in self.watermark_keys for k in keys[keep].tolist()], dtype=bool)
+        return keep
+
+    def missed(self, matches, start_year):
+        """
+        Vrai si les saisons relues depuis 'start_year' ne se réduisent pas aux matchs
+        déjà comptés plus ceux que update ajouterait (match antérieur au watermark
+        publié après coup, ou match supprimé) : l'index doit être reconstruit.
+        """
+        dates = yyyymmdd(matches['tourney_date'])
+        keys = match_keys(matches)
+        read = season_counts(dates[~pd.Series(keys).duplicated().to_numpy()])
+        fresh = season_counts(dates[self._fresh(dates, keys)])
+        years = set(read) | {y for y in self.seasons if y >= start_year}
+        return any(read.get(y, 0) != self.seasons.get(y, 0) + fresh.get(y, 0) for y in years)
+
+    def _merge(self, part):
+        # ajoute le bilan de 'part' (matchs tous datés au plus tôt du watermark)
+        # clés des deux index, triées et sans doublon : ajout des seules paires nouvelles
+        pos = np.minimum(np.searchsorted(self._keys, part._keys), max(len(self._keys) - 1, 0))
+        known = (self._keys[pos] == part._keys) if len(self._keys) else np.zeros(len(part._keys), dtype=bool)
+        keys = np.sort(np.r_[self._keys, part._keys[~known]], kind='stable')
+        old_pos = np.searchsorted(keys, self._keys)
+        new_pos = np.searchsorted(keys, part._keys)
+        pairs = {'lo': (keys // PAIR_SPAN).astype(np.int32), 'hi': (keys % PAIR_SPAN).astype(np.int32)}
+        for c in self.pairs.columns.drop(['lo', 'hi']):
+            values = np.zeros(len(keys), dtype=np.int64)
+            values[old_pos] = self._cols[c]
+            if c == 'last_date':
+                values[new_pos] = np.maximum(values[new_pos], part._cols[c])
+            else:
+                values[new_pos] += part._cols[c]
+            pairs[c] = values
+        pairs = pd.DataFrame(pairs)[self.pairs.columns].astype(np.int32)
+
+        # cumuls datés : codes des paires renumérotés, ceux de 'part' prolongent le bilan existant
+        prior_wins = np.zeros(len(keys), dtype=np.int64)
+        prior_matches = np.zeros(len(keys), dtype=np.int64)
+        prior_wins[old_pos] = self._cols['lo_wins']
+        prior_matches[old_pos] = self._cols['matches']
+        old_code = old_pos[self.event_keys // DATE_SPAN]
+        new_code = new_pos[part.event_keys // DATE_SPAN]
+        event_keys = np.r_[old_code * DATE_SPAN + self.event_keys % DATE_SPAN,
+                           new_code * DATE_SPAN + part.event_keys % DATE_SPAN]
+        event_lo_wins = np.r_[self.event_lo_wins, part.event_lo_wins + prior_wins[new_code]]
+        event_matches = np.r_[self.event_matches, part.event_matches + prior_matches[new_code]]
+        # à la date du watermark, le cumul prolongé remplace l'ancien
+        order = np.argsort(event_keys, kind='stable')
+        event_keys, event_lo_wins, event_matches = event_keys[order], event_lo_wins[order], event_matches[order]
+        last = np.r_[event_keys[1:] != event_keys[:-1], True]
+
+        names = {**self.names, **part.names}
+        state = (self.watermark, self.watermark_keys, self.signature, self.seasons)
+        for cached in ('_ids', '_pair_rows', '_side_slices'):
+            self.__dict__.pop(cached, None)
+        self.__init__(pairs, event_keys[last], event_lo_wins[last].astype(np.int32),
+                      event_matches[last].astype(np.int32), names)
+        self.watermark, self.watermark_keys, self.signature, self.seasons = state
+
+    @classmethod
+    def load_or_build(cls, path, data_path='.', tiers=H2H_TIERS):
+        """
+        Relit l'index s'il existe puis ajoute les saisons depuis son watermark ;
+        reconstruction complète si un CSV d'une saison antérieure a changé ou si
+        les saisons relues contiennent des matchs que la mise à jour ne peut pas
+        ajouter (cf. missed).
+        """
+        signature = source_signature(find_match_files(data_path, tiers))
+        index = cls.load(path) if os.path.exists(path) else None
+        if index is not None:
+            changed = changed_seasons(index.signature, signature)
+            if index.watermark is None or (changed and min(changed) < index.watermark // 10000):
+                print(f"Avertissement : fichiers de matchs modifiés, l'index des face-à-face '{path}' est reconstruit.")
+                index = None
+        if index is not None:
+            start_year = index.watermark // 10000
+            recent = load_tier(data_path, tiers, start_year=start_year, columns=H2H_COLUMNS)
+            if index.missed(recent, start_year):
+                print(f"Avertissement : matchs antérieurs au watermark ajoutés, l'index des face-à-face '{path}' est reconstruit.")
+                index = None
+            else:
+                index.update(recent)
+        if index is None:
+            index = cls.from_files(data_path, tiers)
+        index.signature = signature
+        index.save(path)
+        return index
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def player_ids(self, name):
+        """Identifiants de tous les joueurs portant ce nom (homonymes), triés."""
+        if not hasattr(self, '_ids'):
+            self._ids = {}
+            for pid, n in self.names.items():
+                self._ids.setdefault(n, []).append(pid)
+        return sorted(self._ids.get(name, []))
+
+    def player_id(self, name):
+        """Identifiant du joueur 'name' (None si inconnu) ; ValueError si le nom est ambigu."""
+        ids = self.player_ids(name)
+        if len(ids) > 1:
+            raise ValueError(f"Plusieurs joueurs s'appellent '{name}' : {ids} (utiliser player_ids)")
+        return ids[0] if ids else None
+
+    def _pair_row(self, key):
+        if not hasattr(self, '_pair_rows'):
+            self._pair_rows = dict(zip(self._keys.tolist(), range(len(self._keys))))
+        return self._pair_rows.get(key)
+
+    def _side_slice(self, player_id):
+        if not hasattr(self, '_side_slices'):
+            players, starts, counts = np.unique(self._side_player, return_index=True, return_counts=True)
+            self._side_slices = {p: (s, s + c) for p, s, c in zip(players.tolist(), starts.tolist(), counts.tolist())}
+        return self._side_slices.get(player_id, (0, 0))
+
+    # --- requêtes ---
+    def pair(self, a, b):
+        """Bilan de 'a' contre 'b' (victoires, défaites, par surface, dernière rencontre) ou None."""
+        lo, hi = (a, b) if a < b else (b, a)
+        code = self._pair_row(int(lo) * PAIR_SPAN + int(hi))
+        if code is None:
+            return None
+        row = {c: values[code] for c, values in self._cols.items()}
+        a_is_lo = a == lo
+
+        def side(wins, matches):
+            return (wins, matches - wins) if a_is_lo else (matches - wins, wins)
+
+        wins, losses = side(int(row['lo_wins']), int(row['matches']))
+        surfaces = {s: dict(zip(('wins', 'losses'), side(int(row[f'{s}_lo_wins']), int(row[f'{s}_matches']))))
+                    for s in H2H_SURFACES if row[f'{s}_matches'] > 0}
+        return {'wins': wins, 'losses': losses, 'matches': int(row['matches']),
+                'surfaces': surfaces, 'last_meeting': int(row['last_date'])}
+
+    def opponents(self, player_id):
+        """Bilan de 'player_id' contre chacun de ses adversaires : opponent_id, wins, losses, last_meeting."""
+        start, end = self._side_slice(int(player_id))
+        rows = self._side_pair[start:end]
+        is_lo = self._side_is_lo[start:end]
+        cols = self._cols
+        lo_wins = cols['lo_wins'][rows]
+        lost_by_lo = cols['matches'][rows] - lo_wins
+        return pd.DataFrame({
+            'opponent_id': np.where(is_lo, cols['hi'][rows], cols['lo'][rows]),
+            'wins': np.where(is_lo, lo_wins, lost_by_lo),
+            'losses': np.where(is_lo, lost_by_lo, lo_wins),
+            'last_meeting': cols['last_date'][rows],
+        })
+
+    def asof(self, p1_ids, p2_ids, dates=None):
+        """
+        Victoires de p1 et de p2 dans leurs confrontations strictement avant
+        chaque date (toutes les rencontres si 'dates' vaut None).
+        """
+        p1 = np.asarray(p1_ids, dtype=np.int64)
+        p2 = np.asarray(p2_ids, dtype=np.int64)
+        code = self._codes(pair_keys(p1, p2))
+        dates = np.full(len(p1), DATE_SPAN - 1, dtype=np.int64) if dates is None else yyyymmdd(dates)
+        pos = np.searchsorted(self.event_keys, code * DATE_SPAN + dates, side='left') - 1
+        found = (code >= 0) & (pos >= 0)
+        found[found] &= self.event_keys[pos[found]] // DATE_SPAN == code[found]
+        lo_wins = np.zeros(len(p1), dtype=np.int64)
+        matches = np.zeros(len(p1), dtype=np.int64)
+        lo_wins[found] = self.event_lo_wins[pos[found]]
+        matches[found] = self.event_matches[pos[found]]
+        p1_is_lo = p1 < p2
+        p1_wins = np.where(p1_is_lo, lo_wins, matches - lo_wins)
+        return p1_wins, matches - p1_wins
+
+    # --- persistance ---
+    def save(self, path):
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, event_keys=self.event_keys, event_lo_wins=self.event_lo_wins, event_matches=self.event_matches,
+                 name_ids=np.array(list(self.names.keys()), dtype=np.int64),
+                 name_values=np.array(list(self.names.values()), dtype=str),
+                 watermark=np.array([] if self.watermark is None else [self.watermark], dtype=np.int64),
+                 watermark_keys=np.array(sorted(self.watermark_keys), dtype=str),
+                 signature=np.array(self.signature, dtype=str),
+                 season_years=np.array(list(self.seasons.keys()), dtype=np.int64),
+                 season_matches=np.array(list(self.seasons.values()), dtype=np.int64),
+                 **{f'pairs_{c}': self.pairs[c].to_numpy() for c in self.pairs.columns})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            pairs = pd.DataFrame({k[len('pairs_'):]: z[k] for k in z.files if k.startswith('pairs_')})
+            names = dict(zip(z['name_ids'].tolist(), z['name_values'].tolist()))
+            index = cls(pairs, z['event_keys'], z['event_lo_wins'], z['event_matches'], names)
+            if 'watermark' in z and len(z['watermark']):
+                index.watermark = int(z['watermark'][0])
+                index.watermark_keys = set(z['watermark_keys'].tolist())
+                index.signature = z['signature'].tolist()
+                index.seasons = dict(zip(z['season_years'].tolist(), z['season_matches'].tolist()))
+            return index
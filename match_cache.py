@@ -0,0 +1,213 @@
+# =============================================================================
+# Cache colonnaire (Arrow/Feather) des fichiers de matchs atp_matches_*.csv
+# =============================================================================
+# Chaque CSV est parsé une seule fois puis stocké au format Feather (Arrow IPC,
+# non compressé, lisible par memory-map) dans un dossier '.cache_matches' placé
+# à côté des données. Le nom du fichier cache contient la taille et le mtime du
+# CSV source : si le CSV change, la clé change et seul ce fichier est
+# reconstruit, les autres restent valides.
+
+import glob
+import os
+
+import pandas as pd
+
+from match_schema import apply_schema
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+    ARROW_AVAILABLE = True
+    _NULLABLE_INTS = {pa.int16(): pd.Int16Dtype(), pa.int32(): pd.Int32Dtype()}
+except ImportError:
+    ARROW_AVAILABLE = False
+
+CACHE_DIRNAME = '.cache_matches'
+# À incrémenter dès que la façon de lire les CSV change (colonnes, types...)
+CACHE_VERSION = 3
+
+READ_CSV_KWARGS = dict(index_col=None, header=0, encoding='ISO-8859-1', on_bad_lines='skip', low_memory=False)
+# Taille des blocs lus quand un filtre de lignes est appliqué sans cache
+CSV_CHUNKSIZE = 50000
+
+
+# --- Projection et filtres appliqués pendant la lecture ---
+# columns        : liste des colonnes à garder (None = toutes)
+# levels         : valeurs de tourney_level à garder (None = toutes)
+# exclude_scores : regex (insensible à la casse) ; les matchs sans score ou
+#                  dont le score correspond sont écartés (None = aucun filtre)
+
+def _needed_columns(columns, levels, exclude_scores):
+    if columns is None:
+        return None
+    needed = list(columns)
+    if levels is not None and 'tourney_level' not in needed:
+        needed.append('tourney_level')
+    if exclude_scores is not None and 'score' not in needed:
+        needed.append('score')
+    return needed
+
+
+def _filter_frame(df, levels=None, exclude_scores=None):
+    if levels is not None and 'tourney_level' in df.columns:
+        df = df[df['tourney_level'].astype(str).isin([str(l) for l in levels])]
+    if exclude_scores is not None and 'score' in df.columns:
+        df = df[df['score'].notna()]
+        df = df[~df['score'].astype(str).str.contains(exclude_scores, case=False, na=False)]
+    return df
+
+
+def _filter_table(table, levels=None, exclude_scores=None):
+    names = table.column_names
+    if levels is not None and 'tourney_level' in names:
+        level = pc.cast(table['tourney_level'], pa.string())
+        table = table.filter(pc.is_in(level, value_set=pa.array([str(l) for l in levels])))
+    if exclude_scores is not None and 'score' in names:
+        bad = pc.match_substring_regex(table['score'], exclude_scores, ignore_case=True)
+        table = table.filter(pc.invert(pc.fill_null(bad, True)))
+    return table
+
+
+def read_match_csv(path, columns=None, levels=None, exclude_scores=None):
+    """
+    Lecture d'un fichier de matchs (sans cache), typée selon match_schema.
+    Avec un filtre, le fichier est lu par blocs pour ne jamais garder en
+    mémoire plus que les lignes retenues.
+    """
+    needed = _needed_columns(columns, levels, exclude_scores)
+    usecols = None if needed is None else (lambda c: c in needed)
+    if levels is None and exclude_scores is None:
+        df = pd.read_csv(path, usecols=usecols, **READ_CSV_KWARGS)
+    else:
+        chunks = pd.read_csv(path, usecols=usecols, chunksize=CSV_CHUNKSIZE, **READ_CSV_KWARGS)
+        df = pd.concat([_filter_frame(c, levels, exclude_scores) for c in chunks], ignore_index=True)
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return apply_schema(df)
+
+
+def _table_to_pandas(table):
+    # entiers avec valeurs manquantes -> types nullables plutôt que float64
+    return apply_schema(table.to_pandas(types_mapper=_NULLABLE_INTS.get))
+
+
+def _cache_dir_for(path, cache_dir=None):
+    if cache_dir is not None:
+        return cache_dir
+    return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIRNAME)
+
+
+def cache_path_for(path, cache_dir=None):
+    """Chemin du fichier cache correspondant à l'état actuel (taille, mtime) du CSV."""
+    st = os.stat(path)
+    base = os.path.splitext(os.path.basename(path))[0]
+    name = f"{base}.{st.st_size}.{st.st_mtime_ns}.v{CACHE_VERSION}.arrow"
+    return os.path.join(_cache_dir_for(path, cache_dir), name)
+
+
+def _remove_stale(path, current, cache_dir=None):
+    base = os.path.splitext(os.path.basename(path))[0]
+    for old in glob.glob(os.path.join(_cache_dir_for(path, cache_dir), f"{base}.*.arrow")):
+        if old != current:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def _write_cache(path, df, cached, cache_dir=None):
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    tmp = f"{cached}.{os.getpid()}.tmp"
+    try:
+        feather.write_feather(df, tmp, compression='uncompressed')
+        os.replace(tmp, cached)
+        _remove_stale(path, cached, cache_dir)
+    except Exception as e:
+        print(f"Avertissement : cache non écrit pour {os.path.basename(path)} ({e})")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def is_cached(path, cache_dir=None):
+    """Vrai si un cache à jour existe pour ce CSV."""
+    return ARROW_AVAILABLE and os.path.exists(cache_path_for(path, cache_dir))
+
+
+def ensure_cached(path, cache_dir=None):
+    """Construit le cache du CSV s'il est absent ou périmé, renvoie son chemin."""
+    cached = cache_path_for(path, cache_dir)
+    if not os.path.exists(cached):
+        _write_cache(path, read_match_csv(path), cached, cache_dir)
+    return cached
+
+
+def read_match_table(path, cache_dir=None):
+    """
+    Renvoie le contenu d'un fichier de matchs sous forme de pyarrow.Table.
+    Le CSV n'est re-parsé que si le cache est absent ou périmé.
+    """
+    cached = cache_path_for(path, cache_dir)
+    if os.path.exists(cached):
+        try:
+            return feather.read_table(cached, memory_map=True)
+        except Exception:
+            pass  # fichier cache corrompu : on le reconstruit
+
+    df = read_match_csv(path)
+    _write_cache(path, df, cached, cache_dir)
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _project_table(table, columns=None, levels=None, exclude_scores=None):
+    needed = _needed_columns(columns, levels, exclude_scores)
+    if needed is not None:
+        table = table.select([c for c in needed if c in table.column_names])
+    table = _filter_table(table, levels, exclude_scores)
+    if columns is not None:
+        table = table.select([c for c in columns if c in table.column_names])
+    return table
+
+
+def read_match_file(path, use_cache=True, cache_dir=None, columns=None, levels=None, exclude_scores=None):
+    """Lit un fichier de matchs (DataFrame) en passant par le cache si possible."""
+    if not (use_cache and ARROW_AVAILABLE):
+        return read_match_csv(path, columns, levels, exclude_scores)
+    table = _project_table(read_match_table(path, cache_dir), columns, levels, exclude_scores)
+    return _table_to_pandas(table)
+
+
+def read_match_files(paths, use_cache=True, cache_dir=None, columns=None, levels=None, exclude_scores=None):
+    """
+    Lit et concatène plusieurs fichiers de matchs dans l'ordre donné.
+    Avec le cache, projection et filtres s'appliquent sur les tables Arrow
+    (lues par memory-map, seules les colonnes demandées sont touchées), la
+    concaténation se fait sans copie et la conversion en DataFrame n'a lieu
+    qu'une seule fois, sur les lignes retenues.
+    """
+    if not paths:
+        return pd.DataFrame()
+    if not (use_cache and ARROW_AVAILABLE):
+        container = [read_match_csv(f, columns, levels, exclude_scores) for f in paths]
+        # les catégories diffèrent d'un fichier à l'autre : on les réunifie après concat
+        return apply_schema(pd.concat(container, axis=0, ignore_index=True))
+    needed = _needed_columns(columns, levels, exclude_scores)
+    tables = [read_match_table(f, cache_dir) for f in paths]
+    if needed is not None:
+        tables = [t.select([c for c in needed if c in t.column_names]) for t in tables]
+    try:
+        table = pa.concat_tables(tables, promote_options='permissive')
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        # colonnes hors schéma de types incompatibles entre fichiers
+        frames = [_table_to_pandas(_project_table(t, columns, levels, exclude_scores)) for t in tables]
+        return apply_schema(pd.concat(frames, axis=0, ignore_index=True))
+    return _table_to_pandas(_project_table(table, columns, levels, exclude_scores))
+
+
+def clear_cache(path='.'):
+    """Supprime tous les fichiers cache du dossier de données."""
+    removed = 0
+    for f in glob.glob(os.path.join(path, CACHE_DIRNAME, '*.arrow')):
+        os.remove(f)
+        removed += 1
+    return removed
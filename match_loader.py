@@ -0,0 +1,126 @@
+# =============================================================================
+# Chargeur partagé des fichiers de matchs par saison
+# =============================================================================
+# Utilisé par predict.py et par les lecteurs de examples/examples.py.
+# Les fichiers dont le cache (match_cache.py) est absent ou périmé sont parsés
+# en parallèle sur un pool de processus borné ; l'ordre de concaténation est
+# toujours celui de la liste de fichiers, quel que soit l'ordre de fin des
+# processus.
+
+import glob
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from match_cache import ARROW_AVAILABLE, ensure_cached, is_cached, read_match_csv, read_match_files
+from match_schema import apply_schema
+
+# Motif de nom de fichier par niveau de jeu
+TIERS = {
+    'atp': 'atp_matches_{year}.csv',
+    'qual_chall': 'atp_matches_qual_chall_{year}.csv',
+    'futures': 'atp_matches_futures_{year}.csv',
+    'doubles': 'atp_matches_doubles_{year}.csv',
+}
+
+# Au-delà, le disque devient le goulot d'étranglement
+MAX_WORKERS = 8
+
+# Scores de matchs non terminés (forfait, abandon, disqualification)
+INCOMPLETE_SCORES = 'W/O|RET|DEF|Default'
+
+
+def find_match_files(path, tiers=('atp',), start_year=None, end_year=None):
+    """
+    Liste les fichiers de matchs des niveaux demandés, triés par année puis
+    dans l'ordre de 'tiers'. Sans bornes d'années, toutes les saisons présentes
+    sont retenues.
+    """
+    found = []
+    for order, tier in enumerate(tiers):
+        pattern = TIERS[tier]
+        for f in glob.glob(os.path.join(path, pattern.format(year='[0-9][0-9][0-9][0-9]'))):
+            year = int(os.path.basename(f)[-8:-4])
+            if start_year is not None and year < start_year:
+                continue
+            if end_year is not None and year > end_year:
+                continue
+            found.append((year, order, f))
+    return [f for _, _, f in sorted(found)]
+
+
+def source_signature(files):
+    """
+    Empreinte 'fichier:taille:mtime' de chaque CSV source, enregistrée avec les
+    fichiers dérivés (Elo, face-à-face, cube) pour détecter une modification.
+    """
+    signature = []
+    for f in files:
+        st = os.stat(f)
+        signature.append(f"{os.path.basename(f)}:{st.st_size}:{st.st_mtime_ns}")
+    return sorted(signature)
+
+
+def changed_seasons(saved, current):
+    """Saisons dont un fichier a été ajouté, modifié ou supprimé entre deux empreintes."""
+    return {int(entry.split(':')[0][-8:-4]) for entry in set(saved) ^ set(current)}
+
+
+def season_counts(dates):
+    """Nombre de matchs par saison pour des dates AAAAMMJJ : {année: n}."""
+    years, counts = np.unique(np.asarray(dates, dtype=np.int64) // 10000, return_counts=True)
+    return dict(zip(years.tolist(), counts.tolist()))
+
+
+def _worker_count(workers, n_files):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    # pas de pool imbriqué si l'on est déjà dans un processus fils
+    if multiprocessing.parent_process() is not None:
+        workers = 1
+    return max(1, min(workers, MAX_WORKERS, n_files))
+
+
+def load_matches(files, workers=None, use_cache=True, columns=None, levels=None, exclude_scores=None):
+    """
+    Charge et concatène les fichiers donnés (dans cet ordre).
+    'workers' borne le nombre de processus utilisés pour parser les CSV.
+    'columns', 'levels' et 'exclude_scores' (cf. match_cache) sont appliqués
+    pendant la lecture de chaque fichier, avant la concaténation.
+    """
+    files = list(files)
+    if not files:
+        return pd.DataFrame()
+    query = dict(columns=columns, levels=levels, exclude_scores=exclude_scores)
+
+    if use_cache and ARROW_AVAILABLE:
+        # Les processus fils écrivent le cache ; le parent se contente ensuite
+        # de le lire par memory-map, sans faire transiter les DataFrames.
+        stale = [f for f in files if not is_cached(f)]
+        n = _worker_count(workers, len(stale))
+        if n > 1:
+            with ProcessPoolExecutor(max_workers=n) as pool:
+                list(pool.map(ensure_cached, stale))
+        return read_match_files(files, use_cache=True, **query)
+
+    read = partial(read_match_csv, **query)
+    n = _worker_count(workers, len(files))
+    if n > 1:
+        with ProcessPoolExecutor(max_workers=n) as pool:
+            container = list(pool.map(read, files))
+    else:
+        container = [read(f) for f in files]
+    # les catégories diffèrent d'un fichier à l'autre : on les réunifie après concat
+    return apply_schema(pd.concat(container, axis=0, ignore_index=True))
+
+
+def load_tier(path, tiers=('atp',), start_year=None, end_year=None, workers=None, use_cache=True,
+              columns=None, levels=None, exclude_scores=None):
+    """Raccourci : find_match_files puis load_matches."""
+    files = find_match_files(path, tiers, start_year, end_year)
+    return load_matches(files, workers=workers, use_cache=use_cache,
+                        columns=columns, levels=levels, exclude_scores=exclude_scores)
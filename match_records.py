@@ -0,0 +1,109 @@
+# =============================================================================
+# Lecture en flux des fichiers CSV atp_* (matchs, classements, joueurs)
+# =============================================================================
+# Pour les scripts qui parcourent les fichiers ligne à ligne (module csv) :
+# un générateur qui enchaîne les fichiers demandés et produit un
+# enregistrement léger par ligne (namedtuple, champs nommés d'après l'en-tête
+# au lieu d'indices k[23], k[27]...). Les conversions (int, float, None pour
+# un champ vide) sont choisies une fois par colonne d'après match_schema,
+# puis appliquées à chaque ligne. Rien n'est conservé d'une ligne à l'autre :
+# la mémoire reste constante quel que soit le nombre de saisons parcourues.
+
+import csv
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+from match_loader import find_match_files
+from match_schema import FLOAT32_COLUMNS, INT16_COLUMNS, INT32_COLUMNS
+from rankings_index import RANKING_COLUMNS, find_ranking_files
+
+ENCODING = 'ISO-8859-1'
+INT_FIELDS = set(INT32_COLUMNS + INT16_COLUMNS) | {'player_id', 'dob', 'height', 'ranking_date', 'rank', 'player', 'points'}
+FLOAT_FIELDS = set(FLOAT32_COLUMNS)
+
+
+def _to_int(value):
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value   # valeur non numérique (ex. tête de série 'WC') gardée telle quelle
+
+
+def _to_float(value):
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _to_str(value):
+    return value
+
+
+def _converter(field):
+    if field in INT_FIELDS:
+        return _to_int
+    if field in FLOAT_FIELDS:
+        return _to_float
+    return _to_str
+
+
+@lru_cache(maxsize=None)
+def record_type(fields):
+    """Type d'enregistrement (namedtuple) pour un en-tête donné (tuple de noms)."""
+    return namedtuple('Record', fields, rename=True)
+
+
+def iter_records(paths, fields=None):
+    """
+    Enregistrements de chaque ligne des fichiers 'paths', dans l'ordre.
+    La première ligne d'un fichier sert d'en-tête si elle n'est pas numérique ;
+    sinon (fichiers de classements sans en-tête) les noms sont ceux de 'fields'.
+    """
+    for path in paths:
+        with open(path, newline='', encoding=ENCODING) as f:
+            reader = csv.reader(f)
+            first = next(reader, None)
+            if first is None:
+                continue
+            has_header = not first[0].strip().lstrip('-').isdigit()
+            names = tuple(first) if has_header else tuple(fields)
+            make = record_type(names)._make
+            converters = [_converter(name) for name in names]
+            width = len(names)
+            rows = reader if has_header else _prepend(first, reader)
+            for row in rows:
+                if len(row) != width:
+                    if not row:
+                        continue
+                    row = (row + [''] * width)[:width]
+                yield make([convert(value) for convert, value in zip(converters, row)])
+
+
+def _prepend(first, reader):
+    yield first
+    yield from reader
+
+
+def iter_matches(path='.', tiers=('atp',), start_year=None, end_year=None):
+    """Matchs des niveaux et saisons demandés, saison après saison."""
+    return iter_records(find_match_files(path, tiers, start_year, end_year))
+
+
+def iter_rankings(path='.', files=None):
+    """Lignes de classement (ranking_date, rank, player, points) ; 'files' : noms de fichiers à lire."""
+    paths = find_ranking_files(path) if files is None else [os.path.join(path, f) for f in files]
+    return iter_records(paths, fields=RANKING_COLUMNS)
+
+
+def iter_players(path='.'):
+    """Joueurs de atp_players.csv (player_id, name_first, name_last, hand, dob, ioc...)."""
+    return iter_records([os.path.join(path, 'atp_players.csv')])
@@ -0,0 +1,119 @@
+# =============================================================================
+# Schéma des colonnes des fichiers de matchs (cf. matches_data_dictionary.txt)
+# =============================================================================
+# Types explicites appliqués au chargement au lieu de l'inférence de pandas :
+#   - colonnes à faible cardinalité (niveau, surface, tour, main, pays, entrée,
+#     best_of) et identifiants textuels répétés -> category
+#   - identifiants joueurs, dates, classements  -> int32
+#   - tailles de tableau, têtes de série, statistiques de service -> int16
+#   - âges -> float32
+# Une colonne entière contenant des valeurs manquantes prend le type nullable
+# correspondant ('Int16', 'Int32') plutôt que de retomber en float64. Le type
+# n'est réduit que si toutes les valeurs y tiennent : une valeur hors bornes
+# fait passer au type entier plus large (int32, puis int64), une valeur non
+# entière (185.5) fait garder des flottants, avec ou sans valeurs manquantes.
+
+import numpy as np
+import pandas as pd
+
+# Statistiques de service (w_ = vainqueur, l_ = perdant), dans l'ordre des fichiers
+SERVE_STATS = ['ace', 'df', 'svpt', '1stIn', '1stWon', '2ndWon', 'SvGms', 'bpSaved', 'bpFaced']
+WINNER_STAT_COLUMNS = [f'w_{s}' for s in SERVE_STATS]
+LOSER_STAT_COLUMNS = [f'l_{s}' for s in SERVE_STATS]
+STAT_COLUMNS = WINNER_STAT_COLUMNS + LOSER_STAT_COLUMNS
+
+CATEGORY_COLUMNS = [
+    'tourney_id', 'tourney_name', 'surface', 'tourney_level', 'round', 'best_of',
+    'winner_name', 'winner_hand', 'winner_ioc', 'winner_entry',
+    'loser_name', 'loser_hand', 'loser_ioc', 'loser_entry',
+]
+INT32_COLUMNS = [
+    'tourney_date', 'winner_id', 'loser_id',
+    'winner_rank', 'winner_rank_points', 'loser_rank', 'loser_rank_points',
+]
+INT16_COLUMNS = [
+    'draw_size', 'match_num', 'winner_seed', 'loser_seed', 'winner_ht', 'loser_ht', 'minutes',
+] + STAT_COLUMNS
+FLOAT32_COLUMNS = ['winner_age', 'loser_age']
+
+MATCH_DTYPES = {}
+MATCH_DTYPES.update({c: 'category' for c in CATEGORY_COLUMNS})
+MATCH_DTYPES.update({c: 'int32' for c in INT32_COLUMNS})
+MATCH_DTYPES.update({c: 'int16' for c in INT16_COLUMNS})
+MATCH_DTYPES.update({c: 'float32' for c in FLOAT32_COLUMNS})
+
+_NULLABLE = {'int16': 'Int16', 'int32': 'Int32', 'int64': 'Int64'}
+_INT_TYPES = ['int16', 'int32', 'int64']
+# flottant gardé pour des valeurs non entières (float32 est exact pour des demi-entiers int16)
+_FLOAT = {'int16': 'float32', 'int32': 'float64'}
+
+
+# Ordre chronologique des tours dans un tournoi (qualifications, poules, tableau final)
+ROUND_ORDER = ['Q1', 'Q2', 'Q3', 'Q4', 'ER', 'RR', 'R128', 'R64', 'R32', 'R16', 'QF', 'SF', 'BR', 'F']
+
+
+def round_codes(rounds):
+    """Rang de chaque tour dans ROUND_ORDER (-1 pour un tour inconnu ou manquant)."""
+    return pd.Categorical(np.asarray(rounds, dtype=object), categories=ROUND_ORDER, ordered=True).codes.astype(np.int8)
+
+
+def yyyymmdd(dates):
+    """Dates (datetime64 ou entiers AAAAMMJJ) en entiers AAAAMMJJ."""
+    dates = pd.Series(dates)
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).to_numpy(np.int64)
+    return pd.to_numeric(dates).to_numpy(np.int64)
+
+
+# Colonnes catégorielles dont les modalités restent numériques
+NUMERIC_CATEGORY_COLUMNS = ['best_of']
+
+
+def _to_category(s, text=True):
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        if text and not pd.api.types.is_string_dtype(s.cat.categories):
+            s = s.cat.rename_categories(s.cat.categories.astype(str))
+        return s
+    if text and not pd.api.types.is_string_dtype(s):
+        # certains fichiers futures ont un tourney_level numérique (15, 25...)
+        s = s.astype('string')
+    return s.astype('category')
+
+
+def _int_type(values, dtype):
+    # premier type entier (dtype ou plus large) contenant toutes les valeurs, None si elles ne sont pas entières
+    if not len(values):
+        return dtype
+    if not np.isfinite(values).all() or (values != np.trunc(values)).any():
+        return None
+    lo, hi = values.min(), values.max()
+    for candidate in _INT_TYPES[_INT_TYPES.index(dtype):]:
+        info = np.iinfo(candidate)
+        if info.min <= lo and hi <= info.max:
+            return candidate
+    return None
+
+
+def _to_int(s, dtype):
+    if s.dtype == dtype:
+        return s
+    s = pd.to_numeric(s, errors='coerce')
+    target = _int_type(s.dropna().to_numpy(dtype=np.float64), dtype)
+    if target is None:
+        return s.astype(_FLOAT[dtype])  # valeurs non entières : on garde la précision utile
+    return s.astype(_NULLABLE[target] if s.isna().any() else target)
+
+
+def apply_schema(df):
+    """Convertit (en place) les colonnes connues d'un DataFrame de matchs. Idempotent."""
+    for col, dtype in MATCH_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'category':
+            df[col] = _to_category(df[col], text=col not in NUMERIC_CATEGORY_COLUMNS)
+        elif dtype == 'float32':
+            if df[col].dtype != np.float32:
+                df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+        else:
+            df[col] = _to_int(df[col], dtype)
+    return df
@@ -0,0 +1,76 @@
+# =============================================================================
+# Index des joueurs pour les prédictions (recherche en O(1))
+# =============================================================================
+# Enveloppe le player_db produit par create_features (DataFrame indexé par id)
+# avec trois tables de hachage vers la position de la ligne :
+#   - nom exact ;
+#   - nom normalisé (casse, accents, tirets/apostrophes/points, espaces),
+#     pour que « Giovanni Mpetshi-Perricard » retrouve « Giovanni Mpetshi Perricard » ;
+#   - identifiant joueur.
+# Pour un seul match (predict_match), values() donne la ligne sous forme de
+# dict Python, construit une fois à la première demande : aucun accès pandas.
+
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+_SEPARATORS = re.compile(r"[-‐‑–—'’.`]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_name(name):
+    """Forme canonique d'un nom : minuscules, sans accents ni tirets, espaces simples."""
+    text = unicodedata.normalize('NFKD', str(name))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = _SEPARATORS.sub(' ', text.lower())
+    return _SPACES.sub(' ', text).strip()
+
+
+class PlayerIndex:
+    def __init__(self, player_db):
+        self.db = player_db
+        self._by_name = {}
+        self._by_normalized = {}
+        # en cas d'homonymes, le premier joueur du player_db l'emporte (comme l'ancien .iloc[0])
+        for pos, name in enumerate(player_db['name'].tolist()):
+            if pd.isna(name):
+                continue
+            self._by_name.setdefault(name, pos)
+            self._by_normalized.setdefault(normalize_name(name), pos)
+        self.ids = player_db.index.tolist()
+        self._by_id = {pid: pos for pos, pid in enumerate(self.ids)}
+        self._records = None
+
+    def __len__(self):
+        return len(self.db)
+
+    def position(self, name):
+        """Position de la ligne du joueur (nom exact, puis nom normalisé), None si inconnu."""
+        pos = self._by_name.get(name)
+        if pos is None:
+            pos = self._by_normalized.get(normalize_name(name))
+        return pos
+
+    def positions(self, names):
+        """Positions pour une liste de noms (-1 pour les inconnus)."""
+        return np.array([-1 if (p := self.position(n)) is None else p for n in names], dtype=np.int64)
+
+    def position_by_id(self, player_id):
+        return self._by_id.get(player_id)
+
+    def values(self, pos):
+        """Ligne en position 'pos' : dict colonne -> valeur (NaN pour une valeur manquante)."""
+        if self._records is None:
+            self._records = self.db.to_dict('records')
+        return self._records[pos]
+
+    def get(self, name):
+        """Ligne du player_db (Series, dont .name est l'id) ou None."""
+        pos = self.position(name)
+        return None if pos is None else self.db.iloc[pos]
+
+    def get_by_id(self, player_id):
+        pos = self.position_by_id(player_id)
+        return None if pos is None else self.db.iloc[pos]
@@ -0,0 +1,81 @@
+# =============================================================================
+# Instantané des joueurs écrit avec le modèle (Feather, lisible par memory-map)
+# =============================================================================
+# Écrit par predict.py à l'entraînement, lu par les processus d'inférence
+# (prediction_server.py) sans recharger l'historique des matchs.
+# Une ligne par joueur : id, nom, dernier classement, âge, taille, main, forme
+# actuelle, % de victoires par surface (colonnes surface_win_pct_<surface>) et
+# classements Elo global et par surface (elo, elo_<surface>).
+# Le fichier porte dans ses métadonnées la version du format, la date du
+# dernier match pris en compte et la date d'écriture ; un fichier d'une autre
+# version est refusé.
+
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from match_cache import ARROW_AVAILABLE
+
+if ARROW_AVAILABLE:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+# À incrémenter dès que les colonnes de l'instantané changent
+SNAPSHOT_VERSION = 2
+SNAPSHOT_COLUMNS = ['name', 'rank', 'age', 'ht', 'hand', 'form']
+_META_KEY = b'player_snapshot'
+
+
+def build_snapshot(player_db, store=None):
+    """
+    Table compacte (float32, category) à partir du player_db de create_features.
+    Avec un PlayerFeatureStore, la forme est la forme actuelle (après le dernier
+    match) et non celle d'avant le dernier match.
+    """
+    rating_cols = [c for c in player_db.columns if c == 'elo' or c.startswith(('surface_win_pct_', 'elo_'))]
+    snap = player_db[SNAPSHOT_COLUMNS + rating_cols].copy()
+    snap.index = snap.index.astype(np.int32)
+    snap.index.name = 'id'
+    if store is not None:
+        snap['form'] = [store.current_form(pid) for pid in snap.index.tolist()]
+    for col in ['rank', 'age', 'ht', 'form'] + rating_cols:
+        snap[col] = pd.to_numeric(snap[col], errors='coerce').astype(np.float32)
+    for col in ['name', 'hand']:
+        snap[col] = snap[col].astype('category')
+    return snap
+
+
+def write_snapshot(player_db, path, store=None, watermark=None):
+    """Écrit l'instantané (non compressé, écriture atomique)."""
+    if not ARROW_AVAILABLE:
+        raise ImportError("pyarrow est requis pour écrire l'instantané des joueurs")
+    snap = build_snapshot(player_db, store)
+    table = pa.Table.from_pandas(snap, preserve_index=True)
+    meta = {'version': SNAPSHOT_VERSION, 'players': len(snap),
+            'watermark': None if watermark is None else str(watermark),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), _META_KEY: json.dumps(meta).encode()})
+    tmp = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp, compression='uncompressed')
+    os.replace(tmp, path)
+    return meta
+
+
+def snapshot_metadata(path):
+    """Métadonnées de l'instantané (version, watermark, date d'écriture)."""
+    schema = feather.read_table(path, memory_map=True).schema
+    return json.loads((schema.metadata or {}).get(_META_KEY, b'{}'))
+
+
+def read_snapshot(path):
+    """player_db (DataFrame indexé par id) lu par memory-map depuis l'instantané."""
+    if not ARROW_AVAILABLE:
+        raise ImportError("pyarrow est requis pour lire l'instantané des joueurs")
+    table = feather.read_table(path, memory_map=True)
+    meta = json.loads((table.schema.metadata or {}).get(_META_KEY, b'{}'))
+    if meta.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"Instantané '{path}' en version {meta.get('version')}, version {SNAPSHOT_VERSION} attendue : relancer predict.py")
+    return table.to_pandas()
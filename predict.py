@@ -3,51 +3,100 @@
 # =============================================================================
 
 import pandas as pd
-import glob
 import numpy as np
 import os
+import sys
 from lightgbm import LGBMClassifier
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
 import joblib
+from match_loader import INCOMPLETE_SCORES, find_match_files, load_matches
+from feature_store import PlayerFeatureStore
+from player_index import PlayerIndex
+from player_snapshot import SNAPSHOT_COLUMNS, read_snapshot, write_snapshot
+from feature_encoder import CategoryEncoder, FeatureEncoder
+from walk_forward import DEFAULT_GRID, walk_forward
+from elo import ELO_START, EloRatings
+from h2h_index import H2HIndex
+from score_parser import parse_scores
+from features import FORM_WINDOWS, antisymmetric, mirrored, mirrored_result, rolling_form, surface_record_asof
 
-# --- ÉTAPE 1 : CHARGEMENT (inchangée) ---
-def load_and_combine_matches(path, start_year, end_year):
-    all_files = []
+# Colonnes utilisées par le modèle (projection appliquée dès la lecture)
+MODEL_COLUMNS = [
+    'tourney_id', 'match_num', 'tourney_name', 'surface', 'tourney_date', 'winner_id', 'winner_name', 'winner_hand',
+    'winner_ht', 'winner_age', 'loser_id', 'loser_name', 'loser_hand', 'loser_ht', 'loser_age',
+    'winner_rank', 'loser_rank', 'tourney_level'
+]
+
+# --- ÉTAPE 1 : CHARGEMENT (chargeur partagé match_loader.py, avec cache Arrow) ---
+def load_and_combine_matches(path, start_year, end_year, use_cache=True, workers=None,
+                             columns=None, levels=None, exclude_scores=None):
     print(f"Recherche des fichiers de {start_year} à {end_year} dans le dossier : {os.path.abspath(path)}")
-    for year in range(start_year, end_year + 1):
-        all_files.extend(glob.glob(os.path.join(path, f'atp_matches_{year}.csv')))
-        all_files.extend(glob.glob(os.path.join(path, f'atp_matches_qual_chall_{year}.csv')))
+    all_files = find_match_files(path, ('atp', 'qual_chall'), start_year, end_year)
     if not all_files:
         print("\nAvertissement : Aucun fichier de match trouvé.")
         return pd.DataFrame()
-    container = [pd.read_csv(f, index_col=None, header=0, encoding='ISO-8859-1', on_bad_lines='skip') for f in all_files]
-    return pd.concat(container, axis=0, ignore_index=True)
+    return load_matches(all_files, workers=workers, use_cache=use_cache,
+                        columns=columns, levels=levels, exclude_scores=exclude_scores)
 
 # --- ÉTAPE 2 : NETTOYAGE (inchangée) ---
-def clean_and_prepare_data(df):
-    df.dropna(subset=['score'], inplace=True)
-    df = df[~df['score'].str.contains('W/O|RET|DEF|Default', na=False, case=False)]
-    relevant_cols = [
-        'tourney_name', 'surface', 'tourney_date', 'winner_id', 'winner_name', 'winner_hand', 
-        'winner_ht', 'winner_age', 'loser_id', 'loser_name', 'loser_hand', 'loser_ht', 'loser_age',
-        'winner_rank', 'loser_rank'
-    ]
-    existing_cols = [col for col in relevant_cols if col in df.columns]
+def clean_and_prepare_data(df, path=None):
+    # déjà fait à la lecture si load_and_combine_matches a reçu exclude_scores ;
+    # les scores (analysés une fois par chaîne distincte, conservés dans le cache
+    # du dossier 'path') écartent aussi les matchs abandonnés ou sans set lisible (ABD, UNK...)
+    if 'score' in df.columns:
+        df = df[parse_scores(df['score'], path)['complete'].to_numpy()]
+    existing_cols = [col for col in MODEL_COLUMNS if col in df.columns]
     df = df[existing_cols]
     numeric_cols = ['winner_ht', 'winner_age', 'loser_ht', 'loser_age', 'winner_rank', 'loser_rank']
     for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
+        # les colonnes typées par match_schema sont des entiers nullables : on passe en float32 pour le modèle
+        df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
     critical_cols = ['winner_rank', 'loser_rank', 'winner_age', 'loser_age', 'winner_id', 'loser_id']
     df.dropna(subset=critical_cols, inplace=True)
     df['tourney_date'] = pd.to_datetime(df['tourney_date'], format='%Y%m%d')
     df = df.sort_values('tourney_date').reset_index(drop=True)
     return df
 
-# --- ÉTAPE 3 : PRÉ-CALCUL (inchangée, la forme est calculée mais ne sera pas utilisée) ---
-def precompute_advanced_stats(df):
-    print("\nPré-calcul des statistiques avancées (Forme et Surface)...")
+# --- ÉTAPE 3 : PRÉ-CALCUL (forme et surface, éventuellement via le magasin incrémental) ---
+def add_elo_features(df, ratings):
+    """Classements Elo (global et surface) de chaque joueur à la veille du tournoi (cf. elo.py)."""
+    df['winner_elo'] = ratings.asof(df['winner_id'], df['tourney_date'])
+    df['loser_elo'] = ratings.asof(df['loser_id'], df['tourney_date'])
+    df['winner_surface_elo'] = ratings.asof(df['winner_id'], df['tourney_date'], df['surface'])
+    df['loser_surface_elo'] = ratings.asof(df['loser_id'], df['tourney_date'], df['surface'])
+    return df
+
+def add_h2h_features(df, h2h):
+    """Victoires de chaque joueur dans ses confrontations avec l'adversaire avant le tournoi (cf. h2h_index.py)."""
+    df['winner_h2h_wins'], df['loser_h2h_wins'] = h2h.asof(df['winner_id'], df['loser_id'], df['tourney_date'])
+    return df
+
+def precompute_advanced_stats(df, ratings, h2h, store=None, form_windows=FORM_WINDOWS):
+    # 'ratings' (EloRatings) et 'h2h' (H2HIndex) sont obligatoires : elo_diff, surface_elo_diff
+    # et h2h_diff font partie de FEATURE_COLUMNS
+    print("\nPré-calcul des statistiques avancées (Forme, Surface, Elo et face-à-face)...")
+    if store is not None and tuple(form_windows) != (store.window,):
+        # le magasin ne conserve qu'une fenêtre de forme (store.window)
+        raise ValueError(f"Fenêtres de forme {tuple(form_windows)} incompatibles avec le magasin "
+                         f"(fenêtre unique {store.window}) : appeler sans 'store'")
+    # les colonnes sont ajoutées à une copie : le DataFrame de l'appelant reste intact
+    df = df.copy()
     df['match_id'] = df.index
+    add_elo_features(df, ratings)
+    add_h2h_features(df, h2h)
+
+    # bilan sur la surface strictement avant chaque match (sans fuite du futur)
+    w_wins, w_matches, l_wins, l_matches = surface_record_asof(df['winner_id'], df['loser_id'], df['surface'], df['tourney_date'])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        df['winner_surface_win_pct'] = np.where(w_matches > 0, w_wins / w_matches, np.nan)
+        df['loser_surface_win_pct'] = np.where(l_matches > 0, l_wins / l_matches, np.nan)
+
+    if store is not None:
+        # seuls les matchs absents du magasin sont traités ; le reste est relu
+        added = store.update(df)
+        print(f"Magasin de caractéristiques : {added} nouveaux matchs ingérés.")
+        df['winner_form'], df['loser_form'] = store.match_form(df)
+        return df, store.surface_stats()
     
     winner_df = df[['match_id', 'tourney_date', 'surface', 'winner_id']].rename(columns={'winner_id': 'player_id'})
     winner_df['won'] = 1
@@ -56,138 +105,379 @@ def precompute_advanced_stats(df):
     
     all_player_matches = pd.concat([winner_df, loser_df]).sort_values(['player_id', 'tourney_date'])
     
-    all_player_matches['form'] = all_player_matches.groupby('player_id')['won'].transform(lambda x: x.shift(1).rolling(10, min_periods=3).mean())
+    # forme vectorisée (cf. features.rolling_form) ; la première fenêtre donne 'form',
+    # les suivantes 'form_<fenêtre>'
+    forms = rolling_form(all_player_matches['player_id'].to_numpy(), all_player_matches['won'].to_numpy(), form_windows)
+    form_cols = []
+    for i, w in enumerate(form_windows):
+        col = 'form' if i == 0 else f'form_{w}'
+        all_player_matches[col] = forms[w]
+        form_cols.append(col)
     
-    surface_stats = all_player_matches.groupby(['player_id', 'surface'])['won'].agg(['mean', 'count']).rename(columns={'mean': 'surface_win_pct', 'count': 'surface_matches'})
+    surface_stats = all_player_matches.groupby(['player_id', 'surface'], observed=True)['won'].agg(['mean', 'count']).rename(columns={'mean': 'surface_win_pct', 'count': 'surface_matches'})
     
-    winner_form = all_player_matches[all_player_matches['won'] == 1][['match_id', 'form']].rename(columns={'form': 'winner_form'})
-    loser_form = all_player_matches[all_player_matches['won'] == 0][['match_id', 'form']].rename(columns={'form': 'loser_form'})
+    winner_form = all_player_matches[all_player_matches['won'] == 1][['match_id'] + form_cols].rename(columns=lambda c: c.replace('form', 'winner_form'))
+    loser_form = all_player_matches[all_player_matches['won'] == 0][['match_id'] + form_cols].rename(columns=lambda c: c.replace('form', 'loser_form'))
     
     df = df.merge(winner_form, on='match_id', how='left')
     df = df.merge(loser_form, on='match_id', how='left')
     
     return df, surface_stats
 
-# --- ÉTAPE 4 : CRÉATION DE CARACTÉRISTIQUES (Mise à jour : 'form_diff' retirée) ---
-def create_features(df, surface_stats):
+# --- ÉTAPE 4 : CRÉATION DE CARACTÉRISTIQUES (surface « as-of », matrice symétrique sans copie) ---
+def attach_player_ratings(player_db, surface_stats, ratings=None):
+    """Ajoute à player_db le % de victoires par surface et, si fournis, les classements Elo actuels."""
+    surface_pct = surface_stats['surface_win_pct'].unstack('surface')
+    surface_pct.columns = [f'surface_win_pct_{s}' for s in surface_pct.columns]
+    player_db = player_db.join(surface_pct)
+    if ratings is not None:
+        player_db = player_db.join(ratings.current().drop(columns='elo_matches'))
+    return player_db
+
+def create_features(df, surface_stats, ratings=None):
     p1_stats = df[['winner_id', 'winner_name', 'winner_rank', 'winner_age', 'winner_ht', 'winner_hand', 'winner_form']].rename(columns=lambda x: x.replace('winner_', ''))
     p2_stats = df[['loser_id', 'loser_name', 'loser_rank', 'loser_age', 'loser_ht', 'loser_hand', 'loser_form']].rename(columns=lambda x: x.replace('loser_', ''))
     player_db = pd.concat([p1_stats, p2_stats]).sort_values('age').drop_duplicates(subset=['id'], keep='last').set_index('id')
+    # bilan complet par surface et Elo actuel, utilisés uniquement pour les prédictions
+    player_db = attach_player_ratings(player_db, surface_stats, ratings)
+
+    # --- Matrice symétrique : lignes d'origine (p1 = vainqueur) puis inversées ---
+    # construite directement à partir des colonnes utiles, sans copier ni doubler df
+    w_ht = df['winner_ht'].fillna(185).to_numpy(dtype=np.float32)
+    l_ht = df['loser_ht'].fillna(185).to_numpy(dtype=np.float32)
+    w_surf = df['winner_surface_win_pct'].fillna(0.5).to_numpy(dtype=np.float32)
+    l_surf = df['loser_surface_win_pct'].fillna(0.5).to_numpy(dtype=np.float32)
+    w_form = df['winner_form'].fillna(0.5).to_numpy(dtype=np.float32)
+    l_form = df['loser_form'].fillna(0.5).to_numpy(dtype=np.float32)
 
-    df['p1_id'], df['p2_id'] = df['winner_id'], df['loser_id']
-    df['p1_rank'], df['p2_rank'] = df['winner_rank'], df['loser_rank']
-    df['p1_age'], df['p2_age'] = df['winner_age'], df['loser_age']
-    df['p1_form'], df['p2_form'] = df['winner_form'], df['loser_form']
-    df['rank_diff'] = df['p1_rank'] - df['p2_rank']
-    df['age_diff'] = df['p1_age'] - df['p2_age']
-    df['result'] = 1
-
-    # --- SECTION 2: Créer la version inversée des matchs ---
-    df_inv = df.copy()
-    df_inv.rename(columns={
-        'p1_id': 'p2_id', 'p2_id': 'p1_id',
-        'p1_rank': 'p2_rank', 'p2_rank': 'p1_rank',
-        'p1_age': 'p2_age', 'p2_age': 'p1_age',
-        'p1_form': 'p2_form', 'p2_form': 'p1_form'
-    }, inplace=True)
-    df_inv['rank_diff'] = -df_inv['rank_diff']
-    df_inv['age_diff'] = -df_inv['age_diff']
-    df_inv['result'] = 0
-
-    # --- SECTION 3: Combiner et finaliser le DataFrame ---
-    model_df = pd.concat([df, df_inv], ignore_index=True)
-
-    model_df = model_df.merge(player_db[['name', 'hand', 'ht']], left_on='p1_id', right_index=True, how='left').rename(columns={'name': 'p1_name', 'hand': 'p1_hand', 'ht': 'p1_ht'})
-    model_df = model_df.merge(player_db[['name', 'hand', 'ht']], left_on='p2_id', right_index=True, how='left').rename(columns={'name': 'p2_name', 'hand': 'p2_hand', 'ht': 'p2_ht'})
-
-    model_df = model_df.merge(surface_stats.reset_index()[['player_id', 'surface', 'surface_win_pct']], left_on=['p1_id', 'surface'], right_on=['player_id', 'surface'], how='left').rename(columns={'surface_win_pct': 'p1_surface_win_pct'}).drop('player_id', axis=1)
-    model_df = model_df.merge(surface_stats.reset_index()[['player_id', 'surface', 'surface_win_pct']], left_on=['p2_id', 'surface'], right_on=['player_id', 'surface'], how='left').rename(columns={'surface_win_pct': 'p2_surface_win_pct'}).drop('player_id', axis=1)
-
-    model_df['surface_win_pct_diff'] = model_df['p1_surface_win_pct'].fillna(0.5) - model_df['p2_surface_win_pct'].fillna(0.5)
-    model_df['ht_diff'] = model_df['p1_ht'].fillna(185) - model_df['p2_ht'].fillna(185)
-    model_df['form_diff'] = model_df['p1_form'].fillna(0.5) - model_df['p2_form'].fillna(0.5)
-
-    feature_cols = ['rank_diff', 'age_diff', 'ht_diff', 'surface_win_pct_diff', 'form_diff', 'p1_hand', 'p2_hand', 'surface']
-    final_df = model_df[feature_cols + ['p1_name', 'p2_name', 'result']].copy()
+    final_df = pd.DataFrame({
+        'rank_diff': antisymmetric(df['winner_rank'] - df['loser_rank']),
+        'age_diff': antisymmetric(df['winner_age'] - df['loser_age']),
+        'ht_diff': antisymmetric(w_ht - l_ht),
+        'surface_win_pct_diff': antisymmetric(w_surf - l_surf),
+        'form_diff': antisymmetric(w_form - l_form),
+        'elo_diff': antisymmetric(df['winner_elo'] - df['loser_elo']),
+        'surface_elo_diff': antisymmetric(df['winner_surface_elo'] - df['loser_surface_elo']),
+        'h2h_diff': antisymmetric(df['winner_h2h_wins'] - df['loser_h2h_wins']),
+        'p1_hand': mirrored(df['winner_hand'], df['loser_hand']),
+        'p2_hand': mirrored(df['loser_hand'], df['winner_hand']),
+        'surface': mirrored(df['surface'], df['surface']),
+        'p1_id': mirrored(df['winner_id'], df['loser_id']),
+        'p2_id': mirrored(df['loser_id'], df['winner_id']),
+        'tourney_level': mirrored(df['tourney_level'], df['tourney_level']),
+        # saison du match, identique sur les deux lignes (découpage walk-forward sans fuite)
+        'season': mirrored(df['tourney_date'].dt.year.astype(np.int16), df['tourney_date'].dt.year.astype(np.int16)),
+        'p1_name': mirrored(df['winner_name'], df['loser_name']),
+        'p2_name': mirrored(df['loser_name'], df['winner_name']),
+        'result': mirrored_result(len(df)),
+    })
     return final_df, player_db
 
 # --- ÉTAPE 5 : ENTRAÎNEMENT (Mise à jour : 'form_diff' retirée) ---
-def train_model(df):
-    print("\n--- Phase 1 : Entraînement du Modèle (AVEC FORME) ---")
-    
-    df.dropna(subset=['rank_diff', 'age_diff', 'ht_diff', 'surface_win_pct_diff', 'form_diff'], inplace=True)
+# Entrées du modèle : différences numériques puis colonnes encodées en one-hot
+FEATURE_COLUMNS = ['rank_diff', 'age_diff', 'ht_diff', 'surface_win_pct_diff', 'form_diff', 'elo_diff', 'surface_elo_diff', 'h2h_diff']
+CATEGORICAL_COLUMNS = ['p1_hand', 'p2_hand', 'surface']
+# Mode catégoriel natif : codes entiers découpés par LightGBM, identifiants joueurs et niveau inclus
+NATIVE_CATEGORICAL_COLUMNS = ['p1_hand', 'p2_hand', 'surface', 'tourney_level', 'p1_id', 'p2_id']
+OPEN_CATEGORICAL_COLUMNS = ['p1_id', 'p2_id']  # joueur inconnu = valeur manquante
+MODEL_PATH = 'atp_model_lgbm_WITH_form.joblib'
+ENCODER_PATH = 'feature_encoder_lgbm_WITH_form.joblib'
+PLAYER_SNAPSHOT_PATH = 'player_snapshot.arrow'
+# index des confrontations directes (tous niveaux), relu par prediction_server.py
+H2H_PATH = 'h2h_index.npz'
+# date du dernier match vu par le modèle et historique des rafraîchissements
+MODEL_META_PATH = 'model_meta_lgbm_WITH_form.joblib'
+# nombre maximal d'arbres ajoutés par un rafraîchissement incrémental
+REFRESH_ROUNDS = 20
+
+def make_encoder(native_categorical=False):
+    if native_categorical:
+        return CategoryEncoder(FEATURE_COLUMNS, NATIVE_CATEGORICAL_COLUMNS, open_columns=OPEN_CATEGORICAL_COLUMNS)
+    return FeatureEncoder(FEATURE_COLUMNS, CATEGORICAL_COLUMNS, drop_first=True)
+
+def train_model(df, native_categorical=False, watermark=None):
+    mode = "catégories natives" if native_categorical else "one-hot"
+    print(f"\n--- Phase 1 : Entraînement du Modèle (AVEC FORME, {mode}) ---")
     
-    df_encoded = pd.get_dummies(df, columns=['p1_hand', 'p2_hand', 'surface'], drop_first=True)
-    X = df_encoded.drop(['result', 'p1_name', 'p2_name'], axis=1)
-    y = df_encoded['result']
+    df.dropna(subset=FEATURE_COLUMNS, inplace=True)
     
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-    print(f"Séparation des données : {len(X_train)} pour l'entraînement, {len(X_test)} pour le test.")
+    encoder = make_encoder(native_categorical).fit(df)
+    X = encoder.transform(df)
+    y = df['result'].to_numpy()
+
+    # test sur la dernière saison : les deux lignes symétriques d'un match restent
+    # du même côté (un découpage aléatoire les sépare et surestime la précision)
+    season = df['season'].to_numpy()
+    last_season = season.max()
+    test = season == last_season
+    if test.all():
+        raise ValueError(f"Une seule saison ({last_season}) : au moins deux sont nécessaires pour évaluer le modèle")
+    print(f"Séparation des données : {(~test).sum()} pour l'entraînement, {test.sum()} pour le test (saison {last_season}).")
 
     model = LGBMClassifier(random_state=42)
-    model.fit(X_train, y_train)
-    
-    accuracy = accuracy_score(y_test, model.predict(X_test))
-    print(f"Performance du Modèle (Accuracy) : {accuracy * 100:.2f}%")
+    model.fit(X[~test], y[~test], categorical_feature=encoder.categorical_feature)  # noms de colonnes portés par l'encodeur
+
+    accuracy = accuracy_score(y[test], model.predict(X[test]))
+    print(f"Performance du Modèle (Accuracy, saison {last_season}) : {accuracy * 100:.2f}%")
 
-    joblib.dump(model, 'atp_model_lgbm_WITH_form.joblib')
-    joblib.dump(X.columns, 'training_columns_lgbm_WITH_form.joblib')
-    print("Modèle et colonnes sauvegardés dans 'atp_model_lgbm_WITH_form.joblib' et 'training_columns_lgbm_WITH_form.joblib'")
+    # modèle final appris sur toutes les saisons, jusqu'au watermark
+    model = LGBMClassifier(random_state=42)
+    model.fit(X, y, categorical_feature=encoder.categorical_feature)
+
+    joblib.dump(model, MODEL_PATH)
+    joblib.dump(encoder, ENCODER_PATH)
+    joblib.dump({'watermark': watermark, 'rounds': model.booster_.num_trees(), 'refreshes': []}, MODEL_META_PATH)
+    print(f"Modèle et encodeur sauvegardés dans '{MODEL_PATH}' et '{ENCODER_PATH}'")
     
-    return model, X.columns
+    return model, encoder
+
+# --- RAFRAÎCHISSEMENT INCRÉMENTAL (nouveaux matchs seulement, boosting continué) ---
+def refresh_model(data_path, store_path, elo_path, max_rounds=REFRESH_ROUNDS):
+    """
+    Ajoute au modèle sauvegardé au plus 'max_rounds' arbres appris sur les seuls
+    nouveaux matchs (datés au plus tôt de son watermark et absents du journal du
+    magasin, init_model), met à jour le magasin de
+    caractéristiques et l'instantané des joueurs. Le coût suit le volume des
+    nouveaux matchs ; la reconstruction complète reste python predict.py.
+    """
+    print("\n--- Rafraîchissement incrémental du modèle ---")
+    model = joblib.load(MODEL_PATH)
+    encoder = joblib.load(ENCODER_PATH)
+    meta = joblib.load(MODEL_META_PATH)
+    watermark = meta['watermark']
+    if watermark is None:
+        raise ValueError(f"'{MODEL_META_PATH}' ne contient pas de watermark : reconstruction complète nécessaire")
+    store = PlayerFeatureStore.load(store_path)
+
+    # seules les saisons à partir de celle du watermark sont relues
+    raw = load_and_combine_matches(data_path, pd.Timestamp(watermark).year, None, columns=MODEL_COLUMNS, exclude_scores=INCOMPLETE_SCORES)
+    if raw.empty:
+        return model, 0
+    new = clean_and_prepare_data(raw, data_path)
+    # watermark dans l'unité des dates du magasin (celle de la colonne tourney_date)
+    model_watermark = pd.Series([pd.Timestamp(watermark)]).astype(new['tourney_date'].dtype).astype(np.int64).iloc[0]
+    if store.watermark is not None and store.watermark > model_watermark:
+        raise ValueError(f"Le magasin '{store_path}' est plus récent que le modèle : reconstruction complète nécessaire")
+    # matchs publiés après coup dans la semaine du watermark inclus ; ceux déjà
+    # appris (présents dans le journal du magasin) sont écartés
+    new = new[new['tourney_date'] >= pd.Timestamp(watermark)]
+    new = new[~store.contains(new)].reset_index(drop=True)
+    if new.empty:
+        print("Aucun nouveau match depuis le dernier entraînement.")
+        return model, 0
+
+    # bilan sur surface : état du magasin (historique) + matchs du lot strictement antérieurs
+    hist_w_wins, hist_w_matches = store.surface_record(new['winner_id'], new['surface'])
+    hist_l_wins, hist_l_matches = store.surface_record(new['loser_id'], new['surface'])
+    w_wins, w_matches, l_wins, l_matches = surface_record_asof(new['winner_id'], new['loser_id'], new['surface'], new['tourney_date'])
+    w_wins, w_matches = w_wins + hist_w_wins, w_matches + hist_w_matches
+    l_wins, l_matches = l_wins + hist_l_wins, l_matches + hist_l_matches
+    with np.errstate(invalid='ignore', divide='ignore'):
+        new['winner_surface_win_pct'] = np.where(w_matches > 0, w_wins / w_matches, np.nan)
+        new['loser_surface_win_pct'] = np.where(l_matches > 0, l_wins / l_matches, np.nan)
+    added = store.update(new)
+    new['winner_form'], new['loser_form'] = store.match_form(new)
+    print(f"{len(new)} nouveaux matchs ({added} ingérés par le magasin).")
+    # Elo : seuls les matchs postérieurs au watermark du fichier sont ingérés
+    ratings = EloRatings.load_or_build(elo_path, data_path)
+    add_elo_features(new, ratings)
+    # face-à-face : index enregistré, complété des seuls matchs postérieurs à son watermark
+    h2h = H2HIndex.load_or_build(H2H_PATH, data_path)
+    add_h2h_features(new, h2h)
+
+    featured, new_players = create_features(new, store.surface_stats(), ratings)
+    featured.dropna(subset=FEATURE_COLUMNS, inplace=True)
+    X = encoder.transform(featured)
+    y = featured['result'].to_numpy()
+
+    refreshed = LGBMClassifier(**model.get_params())
+    refreshed.set_params(n_estimators=max_rounds)
+    refreshed.fit(X, y, init_model=model.booster_, categorical_feature=encoder.categorical_feature)
+
+    # instantané : anciens joueurs, remplacés par leur ligne la plus récente s'ils ont rejoué
+    old = read_snapshot(PLAYER_SNAPSHOT_PATH)
+    players = pd.concat([old[SNAPSHOT_COLUMNS], new_players[SNAPSHOT_COLUMNS]])
+    players = players[~players.index.duplicated(keep='last')]
+    players = attach_player_ratings(players, store.surface_stats(), ratings)
+
+    new_watermark = max(new['tourney_date'].max(), pd.Timestamp(watermark))
+    joblib.dump(refreshed, MODEL_PATH)
+    meta['refreshes'].append({'from': watermark, 'to': new_watermark, 'matches': len(new),
+                              'rounds': refreshed.booster_.num_trees() - meta['rounds']})
+    meta['watermark'] = new_watermark
+    meta['rounds'] = refreshed.booster_.num_trees()
+    joblib.dump(meta, MODEL_META_PATH)
+    store.save(store_path)
+    write_snapshot(players, PLAYER_SNAPSHOT_PATH, store=store, watermark=new_watermark.date())
+    print(f"Modèle rafraîchi jusqu'au {new_watermark.date()} ({meta['rounds']} arbres).")
+    return refreshed, len(new)
+
+def evaluate_model(df, native_categorical=False, grid=DEFAULT_GRID, workers=None):
+    """Évaluation walk-forward par saison (cf. walk_forward.py) ; renvoie (détail, résumé)."""
+    print("\n--- Évaluation walk-forward par saison ---")
+    df = df.dropna(subset=FEATURE_COLUMNS)
+    encoder = make_encoder(native_categorical).fit(df)
+    detail, summary = walk_forward(encoder.transform(df), df['result'].to_numpy(), df['season'].to_numpy(),
+                                   grid=grid, categorical_feature=encoder.categorical_feature, workers=workers)
+    print(detail.pivot(index='season', columns='params_id', values='log_loss').round(4).to_string())
+    print(summary.to_string())
+    return detail, summary
 
 # --- ÉTAPE 6 : PRÉDICTION (Mise à jour : 'form_diff' retirée) ---
-def predict_match(model, player1_name, player2_name, surface, player_db, training_columns, p1_form_manual=0.5, p2_form_manual=0.5):
-    try:
-        p1 = player_db[player_db['name'] == player1_name].iloc[0]
-    except IndexError:
-        print(f"Avertissement : Joueur '{player1_name}' non trouvé. Utilisation de stats par défaut.")
-        p1 = pd.Series({'rank': 9999, 'age': 27, 'ht': 185, 'hand': 'R', 'name': player1_name})
-
-    try:
-        p2 = player_db[player_db['name'] == player2_name].iloc[0]
-    except IndexError:
-        print(f"Avertissement : Joueur '{player2_name}' non trouvé. Utilisation de stats par défaut.")
-        p2 = pd.Series({'rank': 9999, 'age': 27, 'ht': 185, 'hand': 'R', 'name': player2_name})
-
-    p1_rank = p1.get('rank', 9999); p2_rank = p2.get('rank', 9999)
-    p1_age = p1.get('age', 27); p2_age = p2.get('age', 27)
-    p1_ht = p1.get('ht', 185); p2_ht = p2.get('ht', 185)
-    p1_hand = p1.get('hand', 'R'); p2_hand = p2.get('hand', 'R')
-    
-    if pd.isna(p1_ht): p1_ht = 185
-    if pd.isna(p2_ht): p2_ht = 185
-    if pd.isna(p1_hand): p1_hand = 'R'
-    if pd.isna(p2_hand): p2_hand = 'R'
-    
-    try: p1_surface_pct = player_db.loc[p1.name, (slice(None), surface)]['surface_win_pct'].values[0]
-    except (KeyError, IndexError, AttributeError): p1_surface_pct = 0.5
-    try: p2_surface_pct = player_db.loc[p2.name, (slice(None), surface)]['surface_win_pct'].values[0]
-    except (KeyError, IndexError, AttributeError): p2_surface_pct = 0.5
-
-    form_diff_manual = p1_form_manual - p2_form_manual
-
-    match_data = {
-        'rank_diff': p1_rank - p2_rank,
-        'age_diff': p1_age - p2_age,
-        'ht_diff': p1_ht - p2_ht,
-        'surface_win_pct_diff': p1_surface_pct - p2_surface_pct,
-        'form_diff': form_diff_manual,
-        'p1_hand': p1_hand,
-        'p2_hand': p2_hand,
-        'surface': surface
+# Valeurs par défaut d'un joueur absent de player_db
+DEFAULT_PLAYER = {'rank': 9999, 'age': 27, 'ht': 185, 'hand': 'R', 'elo': ELO_START}
+FIXTURE_COLUMNS = ['player1', 'player2', 'surface', 'form1', 'form2']
+
+
+def _player_values(player_db, pos, col, default):
+    # valeur de 'col' pour chaque position (-1 = joueur inconnu), NaN remplacés par le défaut
+    if col not in player_db.columns:
+        return np.full(len(pos), default, dtype=object)
+    values = player_db[col].to_numpy(dtype=object)[np.maximum(pos, 0)]
+    values[(pos < 0) | pd.isna(values)] = default
+    return values
+
+
+def _player_ids(player_db, pos):
+    # identifiant de chaque joueur (None si inconnu)
+    ids = player_db.index.to_numpy(dtype=object)[np.maximum(pos, 0)]
+    ids[pos < 0] = None
+    return ids
+
+
+def _per_surface(player_db, pos, surfaces, prefix, default):
+    # valeur '<prefix><surface>' de chaque joueur pour la surface de son match
+    values = np.full(len(pos), default, dtype=np.float64)
+    for surface in pd.unique(surfaces):
+        col = f'{prefix}{surface}'
+        if col in player_db.columns:
+            rows = (surfaces == surface) & (pos >= 0)
+            values[rows] = player_db[col].to_numpy(dtype=np.float64)[pos[rows]]
+    values[np.isnan(values)] = default
+    return values
+
+
+def predict_matches(model, fixtures, player_db, encoder, h2h=None):
+    """
+    Prédit un lot de matchs en un seul appel à predict_proba.
+    'fixtures' : chemin d'un CSV ou DataFrame avec les colonnes
+    player1, player2, surface, form1, form2 (forme entre 0 et 1, 0.5 par défaut),
+    et éventuellement tourney_level (utilisé par le mode catégoriel natif).
+    'h2h' : H2HIndex pour le bilan des confrontations directes (0 sans index).
+    Renvoie la table des fixtures complétée de p1_win_prob et p2_win_prob.
+    """
+    if isinstance(fixtures, (str, os.PathLike)):
+        fixtures = pd.read_csv(fixtures)
+    fixtures = fixtures.reset_index(drop=True)
+    index = player_db if isinstance(player_db, PlayerIndex) else PlayerIndex(player_db)
+    db = index.db
+
+    p1_pos = index.positions(fixtures['player1'].tolist())
+    p2_pos = index.positions(fixtures['player2'].tolist())
+    for name in pd.unique(np.r_[fixtures['player1'].to_numpy(dtype=object)[p1_pos < 0],
+                                fixtures['player2'].to_numpy(dtype=object)[p2_pos < 0]]):
+        print(f"Avertissement : Joueur '{name}' non trouvé. Utilisation de stats par défaut.")
+
+    surfaces = fixtures['surface'].to_numpy(dtype=object)
+    form1 = fixtures['form1'].fillna(0.5).to_numpy(dtype=np.float64) if 'form1' in fixtures else np.full(len(fixtures), 0.5)
+    form2 = fixtures['form2'].fillna(0.5).to_numpy(dtype=np.float64) if 'form2' in fixtures else np.full(len(fixtures), 0.5)
+
+    numeric = {}
+    for col in ['rank', 'age', 'ht', 'elo']:
+        numeric[col] = (_player_values(db, p1_pos, col, DEFAULT_PLAYER[col]).astype(np.float64)
+                        - _player_values(db, p2_pos, col, DEFAULT_PLAYER[col]).astype(np.float64))
+    h2h_diff = np.zeros(len(fixtures))
+    if h2h is not None:
+        known = (p1_pos >= 0) & (p2_pos >= 0)
+        p1_wins, p2_wins = h2h.asof(db.index.to_numpy()[p1_pos[known]], db.index.to_numpy()[p2_pos[known]])
+        h2h_diff[known] = p1_wins - p2_wins
+
+    match_df = pd.DataFrame({
+        'rank_diff': numeric['rank'],
+        'age_diff': numeric['age'],
+        'ht_diff': numeric['ht'],
+        'surface_win_pct_diff': (_per_surface(db, p1_pos, surfaces, 'surface_win_pct_', 0.5)
+                                 - _per_surface(db, p2_pos, surfaces, 'surface_win_pct_', 0.5)),
+        'form_diff': form1 - form2,
+        'elo_diff': numeric['elo'],
+        'surface_elo_diff': _per_surface(db, p1_pos, surfaces, 'elo_', ELO_START) - _per_surface(db, p2_pos, surfaces, 'elo_', ELO_START),
+        'h2h_diff': h2h_diff,
+        'p1_hand': _player_values(db, p1_pos, 'hand', DEFAULT_PLAYER['hand']),
+        'p2_hand': _player_values(db, p2_pos, 'hand', DEFAULT_PLAYER['hand']),
+        'surface': surfaces,
+        'tourney_level': fixtures['tourney_level'].to_numpy(dtype=object) if 'tourney_level' in fixtures else None,
+        'p1_id': _player_ids(db, p1_pos),
+        'p2_id': _player_ids(db, p2_pos),
+    })
+    probability = model.predict_proba(encoder.transform(match_df))[:, 1]
+
+    result = fixtures.copy()
+    result['form1'] = form1
+    result['form2'] = form2
+    result['p1_win_prob'] = probability
+    result['p2_win_prob'] = 1 - probability
+    return result
+
+
+def _player_value(row, col, default):
+    # valeur de 'col' dans la ligne 'row' (dict, None = joueur inconnu), défaut si absente ou NaN
+    value = None if row is None else row.get(col)
+    return default if value is None or value != value else value
+
+
+def match_record(index, player1, player2, surface, form1=0.5, form2=0.5, h2h=None, tourney_level=None):
+    """
+    Caractéristiques d'un seul match (dict des colonnes d'entrée de l'encodeur),
+    mêmes valeurs que predict_matches mais sans DataFrame : pour encoder.transform_one.
+    """
+    p1, p2 = index.position(player1), index.position(player2)
+    for name, pos in ((player1, p1), (player2, p2)):
+        if pos is None:
+            print(f"Avertissement : Joueur '{name}' non trouvé. Utilisation de stats par défaut.")
+    row1 = None if p1 is None else index.values(p1)
+    row2 = None if p2 is None else index.values(p2)
+
+    def diff(col, default=None):
+        default = DEFAULT_PLAYER[col] if default is None else default
+        return float(_player_value(row1, col, default)) - float(_player_value(row2, col, default))
+
+    p1_id = None if p1 is None else index.ids[p1]
+    p2_id = None if p2 is None else index.ids[p2]
+    h2h_diff = 0.0
+    if h2h is not None and p1_id is not None and p2_id is not None:
+        record = h2h.pair(p1_id, p2_id)
+        if record is not None:
+            h2h_diff = float(record['wins'] - record['losses'])
+    return {
+        'rank_diff': diff('rank'),
+        'age_diff': diff('age'),
+        'ht_diff': diff('ht'),
+        'surface_win_pct_diff': diff(f'surface_win_pct_{surface}', 0.5),
+        'form_diff': form1 - form2,
+        'elo_diff': diff('elo'),
+        'surface_elo_diff': diff(f'elo_{surface}', ELO_START),
+        'h2h_diff': h2h_diff,
+        'p1_hand': _player_value(row1, 'hand', DEFAULT_PLAYER['hand']),
+        'p2_hand': _player_value(row2, 'hand', DEFAULT_PLAYER['hand']),
+        'surface': surface,
+        'tourney_level': tourney_level,
+        'p1_id': p1_id,
+        'p2_id': p2_id,
     }
-    match_df = pd.DataFrame([match_data])
 
-    match_df_encoded = pd.get_dummies(match_df)
 
-    match_df_aligned = match_df_encoded.reindex(columns=training_columns, fill_value=0)
+def predict_match(model, player1_name, player2_name, surface, player_db, encoder, p1_form_manual=0.5, p2_form_manual=0.5, h2h=None):
+    # un seul match : encodage direct (transform_one) puis le booster lui-même, sans DataFrame ;
+    # pour un objectif binaire il renvoie la probabilité de predict_proba[:, 1] sans la
+    # validation d'entrée de scikit-learn (environ 1 ms par appel)
+    index = player_db if isinstance(player_db, PlayerIndex) else PlayerIndex(player_db)
+    record = match_record(index, player1_name, player2_name, surface, p1_form_manual, p2_form_manual, h2h)
+    probability = float(model.booster_.predict(encoder.transform_one(record))[0])
 
-    probability = model.predict_proba(match_df_aligned)[:, 1][0]
-    
     print(f"\n--- Prédiction pour {player1_name} vs {player2_name} sur {surface} (Forme: {p1_form_manual*100:.0f}% vs {p2_form_manual*100:.0f}%) ---")
     print(f"Probabilité de victoire pour {player1_name} : {probability * 100:.2f}%")
     print(f"Probabilité de victoire pour {player2_name} : {(1 - probability) * 100:.2f}%")
+    return probability
 
 # =============================================================================
 # EXÉCUTION PRINCIPALE DU SCRIPT
@@ -196,34 +486,60 @@ if __name__ == "__main__":
     START_YEAR = 2021
     END_YEAR = 2024
     DATA_PATH = '.'
+    FEATURE_STORE_PATH = 'feature_store.npz'
+    ELO_PATH = 'elo_ratings.npz'
+    NATIVE_CATEGORICAL = False  # True : catégories natives LightGBM (ids joueurs, niveau) au lieu du one-hot
+    WALK_FORWARD = False        # True : évaluation par saison et comparaison de la grille de paramètres
+
+    if '--refresh' in sys.argv[1:]:
+        # python predict.py --refresh : nouveaux matchs seulement, sans reconstruction complète
+        refresh_model(DATA_PATH, FEATURE_STORE_PATH, ELO_PATH)
+        raise SystemExit
 
-    raw_data = load_and_combine_matches(DATA_PATH, START_YEAR, END_YEAR)
+    raw_data = load_and_combine_matches(DATA_PATH, START_YEAR, END_YEAR, columns=MODEL_COLUMNS, exclude_scores=INCOMPLETE_SCORES)
 
     if not raw_data.empty:
-        data = clean_and_prepare_data(raw_data)
+        data = clean_and_prepare_data(raw_data, DATA_PATH)
         print(f"\nDonnées nettoyées : {data.shape[0]} matchs exploitables restants.")
         
-        data_adv, surface_stats = precompute_advanced_stats(data)
+        # magasin reconstruit s'il commence après le premier match des données (START_YEAR avancé)
+        store = PlayerFeatureStore.load_or_create(FEATURE_STORE_PATH, dates=data['tourney_date'])
+        # Elo sur tout l'historique, tous niveaux (seuls les nouveaux matchs sont ingérés si le fichier existe)
+        ratings = EloRatings.load_or_build(ELO_PATH, DATA_PATH)
+        # face-à-face de toutes les paires, tous niveaux (seuls les nouveaux matchs sont ajoutés si l'index existe)
+        h2h = H2HIndex.load_or_build(H2H_PATH, DATA_PATH)
+        data_adv, surface_stats = precompute_advanced_stats(data, store=store, ratings=ratings, h2h=h2h)
+        store.save(FEATURE_STORE_PATH)
         
-        featured_data, player_db = create_features(data_adv, surface_stats)
+        featured_data, player_db = create_features(data_adv, surface_stats, ratings)
+        player_index = PlayerIndex(player_db)
+        # instantané des joueurs pour les processus d'inférence (prediction_server.py)
+        write_snapshot(player_db, PLAYER_SNAPSHOT_PATH, store=store, watermark=data['tourney_date'].max().date())
         print(f"Données transformées : {featured_data.shape[0]} lignes prêtes pour le modèle.")
         
-        model, training_columns = train_model(featured_data)
+        if WALK_FORWARD:
+            evaluate_model(featured_data, native_categorical=NATIVE_CATEGORICAL)
+        model, encoder = train_model(featured_data, native_categorical=NATIVE_CATEGORICAL, watermark=data['tourney_date'].max())
         
         print("\n" + "="*60)
         print("      SIMULATION DE PRÉDICTIONS AVEC LE MODÈLE 'LGBM' (SANS FORME)")
         print("="*60)
 
-        predict_match(model=model, player1_name="Emilio Nava", player2_name="Ugo Humbert", surface="Hard", player_db=player_db, training_columns=training_columns, p1_form_manual=0.6, p2_form_manual=0.4)
-        predict_match(model=model, player1_name="Karen Khachanov", player2_name="Juan Pablo Ficovich", surface="Hard", player_db=player_db, training_columns=training_columns, p1_form_manual=0.8, p2_form_manual=0.8)
-        predict_match(model=model, player1_name="Alexandre Muller", player2_name="Miomir Kecmanovic", surface="Hard", player_db=player_db, training_columns=training_columns, p1_form_manual=0.2, p2_form_manual=0.6)
-        predict_match(model=model, player1_name="Giovanni Mpetshi Perricard", player2_name="Holger Rune", surface="Hard", player_db=player_db, training_columns=training_columns, p1_form_manual=0.2, p2_form_manual=0.4)
-        predict_match(model=model, player1_name="Tomas Barrios Vera", player2_name="Alex Michelsen", surface="Hard", player_db=player_db, training_columns=training_columns, p1_form_manual=0.4, p2_form_manual=0.4)
-        predict_match(model=model, player1_name="Mikael Arseneault", player2_name="Alexei Popyrin", surface="Hard", player_db=player_db, training_columns=training_columns, p1_form_manual=0.6, p2_form_manual=0.2)
-        predict_match(model=model, player1_name="Jenson Brooksby", player2_name="Corentin Moutet", surface="Hard", player_db=player_db, training_columns=training_columns, p1_form_manual=0.4, p2_form_manual=0.6)
-        predict_match(model=model, player1_name="Tallon Griekspoor", player2_name="Tomas Martin Etcheverry", surface="Hard", player_db=player_db, training_columns=training_columns, p1_form_manual=0.6, p2_form_manual=0.2)
-        predict_match(model=model, player1_name="Jaume Munar", player2_name="Francisco Cerundolo", surface="Hard", player_db=player_db, training_columns=training_columns, p1_form_manual=0.6, p2_form_manual=0.4)
-        predict_match(model=model, player1_name="Nuno Borges", player2_name="Facundo Bagnis", surface="Hard", player_db=player_db, training_columns=training_columns, p1_form_manual=0.4, p2_form_manual=0.8)
-        predict_match(model=model, player1_name="Reilly Opelka", player2_name="Tomas Machac", surface="Hard", player_db=player_db, training_columns=training_columns, p1_form_manual=0.6, p2_form_manual=0.6)
-        predict_match(model=model, player1_name="Tristan Schoolkate", player2_name="Matteo Arnaldi", surface="Hard", player_db=player_db, training_columns=training_columns, p1_form_manual=0.8, p2_form_manual=0.4)
-        predict_match(model=model, player1_name="Roman Safiullin", player2_name="Casper Ruud", surface="Hard", player_db=player_db, training_columns=training_columns, p1_form_manual=0.4, p2_form_manual=0.4)
\ No newline at end of file
+        fixtures = pd.DataFrame([
+            ("Emilio Nava", "Ugo Humbert", "Hard", 0.6, 0.4),
+            ("Karen Khachanov", "Juan Pablo Ficovich", "Hard", 0.8, 0.8),
+            ("Alexandre Muller", "Miomir Kecmanovic", "Hard", 0.2, 0.6),
+            ("Giovanni Mpetshi Perricard", "Holger Rune", "Hard", 0.2, 0.4),
+            ("Tomas Barrios Vera", "Alex Michelsen", "Hard", 0.4, 0.4),
+            ("Mikael Arseneault", "Alexei Popyrin", "Hard", 0.6, 0.2),
+            ("Jenson Brooksby", "Corentin Moutet", "Hard", 0.4, 0.6),
+            ("Tallon Griekspoor", "Tomas Martin Etcheverry", "Hard", 0.6, 0.2),
+            ("Jaume Munar", "Francisco Cerundolo", "Hard", 0.6, 0.4),
+            ("Nuno Borges", "Facundo Bagnis", "Hard", 0.4, 0.8),
+            ("Reilly Opelka", "Tomas Machac", "Hard", 0.6, 0.6),
+            ("Tristan Schoolkate", "Matteo Arnaldi", "Hard", 0.8, 0.4),
+            ("Roman Safiullin", "Casper Ruud", "Hard", 0.4, 0.4),
+        ], columns=FIXTURE_COLUMNS)
+        predictions = predict_matches(model, fixtures, player_index, encoder, h2h)
+        with pd.option_context('display.width', 200, 'display.float_format', '{:.2%}'.format):
+            print(predictions.to_string(index=False))
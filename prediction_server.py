@@ -0,0 +1,201 @@
+# =============================================================================
+# Serveur local de prédiction (HTTP/JSON) avec modèle et index joueurs en mémoire
+# =============================================================================
+# Charge une seule fois au démarrage les artefacts écrits par predict.py
+# (modèle, encodeur, instantané des joueurs, index des face-à-face) puis répond aux requêtes sans relancer le
+# pipeline complet.
+#
+#   python prediction_server.py [--host 127.0.0.1] [--port 8765]
+#
+#   GET  /health   -> {"status": "ok", "players": ..., "features": ...}
+#   POST /predict  -> un match {"player1", "player2", "surface", "form1", "form2", "tourney_level"}
+#                     ou un lot {"matches": [ ... ]} ; form1/form2 valent 0.5 par défaut,
+#                     tourney_level (mode catégoriel natif) est manquant par défaut
+#
+# Les requêtes concurrentes sont regroupées par le Batcher : les matchs reçus
+# pendant quelques millisecondes sont prédits en un seul appel à predict_proba.
+# Chaque réponse indique sa latence (latency_ms), également journalisée.
+
+import argparse
+import json
+import queue
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from feature_encoder import UnknownCategoryError
+from h2h_index import H2HIndex
+from player_index import PlayerIndex
+from player_snapshot import read_snapshot
+from predict import ENCODER_PATH, FIXTURE_COLUMNS, H2H_PATH, MODEL_PATH, PLAYER_SNAPSHOT_PATH, predict_matches
+
+# Attente maximale pour compléter un lot, et taille maximale d'un lot
+BATCH_WAIT = 0.002
+MAX_BATCH = 4096
+
+
+class RequestError(ValueError):
+    """Requête invalide (réponse 400) ; toute autre exception est une erreur du serveur (500)."""
+
+
+# erreurs imputables à la requête : champ manquant ou mal typé, modalité inconnue du modèle
+INVALID_REQUEST = (RequestError, UnknownCategoryError)
+
+
+class Batcher:
+    """Regroupe les lots de matchs des requêtes concurrentes en un seul appel au modèle."""
+
+    def __init__(self, model, index, encoder, h2h=None, wait=BATCH_WAIT, max_batch=MAX_BATCH):
+        self.model = model
+        self.index = index
+        self.encoder = encoder
+        self.h2h = h2h
+        self.wait = wait
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def predict(self, fixtures):
+        """Bloque jusqu'à la prédiction de 'fixtures' ; renvoie la table de predict_matches."""
+        job = {'fixtures': fixtures, 'done': threading.Event(), 'result': None, 'error': None}
+        self._queue.put(job)
+        job['done'].wait()
+        if job['error'] is not None:
+            raise job['error']
+        return job['result']
+
+    def _run(self):
+        while True:
+            jobs = [self._queue.get()]
+            size = len(jobs[0]['fixtures'])
+            deadline = time.perf_counter() + self.wait
+            while size < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                jobs.append(job)
+                size += len(job['fixtures'])
+            self._score(jobs)
+
+    def _score(self, jobs):
+        try:
+            fixtures = pd.concat([j['fixtures'] for j in jobs], ignore_index=True)
+            result = predict_matches(self.model, fixtures, self.index, self.encoder, self.h2h)
+        except Exception as e:
+            # une requête invalide ne doit pas faire échouer les autres : on les rejoue une par une
+            if len(jobs) > 1:
+                for j in jobs:
+                    self._score([j])
+                return
+            jobs[0]['error'] = e
+            jobs[0]['done'].set()
+            return
+        start = 0
+        for j in jobs:
+            n = len(j['fixtures'])
+            j['result'] = result.iloc[start:start + n]
+            start += n
+            j['done'].set()
+
+
+def _fixtures(payload):
+    if not isinstance(payload, dict):
+        raise RequestError("Objet JSON attendu")
+    matches = payload['matches'] if 'matches' in payload else [payload]
+    if not isinstance(matches, list) or not all(isinstance(m, dict) for m in matches):
+        raise RequestError("'matches' doit être une liste d'objets")
+    fixtures = pd.DataFrame(matches)
+    missing = [c for c in ['player1', 'player2', 'surface'] if c not in fixtures.columns]
+    if missing:
+        raise RequestError(f"Champ(s) manquant(s) : {missing}")
+    for c in ['form1', 'form2']:
+        if c not in fixtures.columns:
+            fixtures[c] = 0.5
+        try:
+            fixtures[c] = pd.to_numeric(fixtures[c]).astype(np.float64)
+        except (ValueError, TypeError):
+            raise RequestError(f"'{c}' doit être un nombre") from None
+    # niveau du tournoi : utilisé par un modèle en catégories natives, valeur manquante sinon
+    if 'tourney_level' not in fixtures.columns:
+        fixtures['tourney_level'] = None
+    return fixtures[FIXTURE_COLUMNS + ['tourney_level']]
+
+
+def make_handler(batcher):
+    class PredictionHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            data = json.dumps(body, default=lambda v: v.item() if isinstance(v, np.generic) else str(v)).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path != '/health':
+                return self._reply(404, {'error': 'not found'})
+            self._reply(200, {'status': 'ok', 'players': len(batcher.index), 'features': batcher.encoder.n_features})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                return self._reply(404, {'error': 'not found'})
+            start = time.perf_counter()
+            try:
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError as e:
+                    raise RequestError(f"Corps JSON illisible : {e}") from None
+                result = batcher.predict(_fixtures(payload))
+            except INVALID_REQUEST as e:
+                return self._reply(400, {'error': str(e)})
+            except Exception:
+                traceback.print_exc()   # erreur du serveur : trace complète dans la console
+                return self._reply(500, {'error': 'erreur interne du serveur'})
+            latency = (time.perf_counter() - start) * 1000
+            self._reply(200, {'predictions': result.to_dict('records'), 'latency_ms': round(latency, 3)})
+            self.log_message('%d match(s) en %.2f ms', len(result), latency)
+
+    return PredictionHandler
+
+
+def load_artifacts(model_path=MODEL_PATH, encoder_path=ENCODER_PATH, players_path=PLAYER_SNAPSHOT_PATH, h2h_path=H2H_PATH):
+    model = joblib.load(model_path)
+    encoder = joblib.load(encoder_path)
+    index = PlayerIndex(read_snapshot(players_path))
+    h2h = H2HIndex.load(h2h_path)
+    return model, encoder, index, h2h
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur local de prédiction des matchs ATP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--encoder', default=ENCODER_PATH)
+    parser.add_argument('--players', default=PLAYER_SNAPSHOT_PATH)
+    parser.add_argument('--h2h', default=H2H_PATH)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    model, encoder, index, h2h = load_artifacts(args.model, args.encoder, args.players, args.h2h)
+    batcher = Batcher(model, index, encoder, h2h)
+    print(f"Artefacts chargés en {time.perf_counter() - t0:.2f} s ({len(index)} joueurs).")
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(batcher))
+    print(f"Serveur de prédiction à l'écoute sur http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
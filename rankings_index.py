@@ -0,0 +1,125 @@
+# =============================================================================
+# Index « as-of » des classements ATP (atp_rankings_*.csv)
+# =============================================================================
+# Tous les fichiers de classements sont lus une fois puis rangés dans des
+# tableaux NumPy triés par (joueur, date de classement). Le classement d'un
+# joueur à une date est une recherche dichotomique (searchsorted) sur la clé
+# joueur * DATE_SPAN + AAAAMMJJ ; une jointure as-of sur une table de matchs
+# entière se fait en un seul searchsorted vectorisé.
+
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from match_schema import yyyymmdd
+
+RANKING_COLUMNS = ['ranking_date', 'rank', 'player', 'points']
+DATE_SPAN = 10 ** 8
+
+
+def find_ranking_files(path='.'):
+    return sorted(glob.glob(os.path.join(path, 'atp_rankings_*.csv')))
+
+
+def read_rankings(path='.'):
+    """Concatène les fichiers de classements (avec ou sans ligne d'en-tête)."""
+    container = []
+    for f in find_ranking_files(path):
+        df = pd.read_csv(f, header=None, names=RANKING_COLUMNS, dtype=str, encoding='ISO-8859-1')
+        container.append(df)
+    if not container:
+        return pd.DataFrame(columns=RANKING_COLUMNS)
+    ranks = pd.concat(container, ignore_index=True)
+    for col in RANKING_COLUMNS:
+        ranks[col] = pd.to_numeric(ranks[col], errors='coerce')
+    # lignes d'en-tête et lignes incomplètes
+    ranks = ranks.dropna(subset=['ranking_date', 'rank', 'player'])
+    return ranks.astype({'ranking_date': np.int32, 'rank': np.int32, 'player': np.int32, 'points': 'float32'})
+
+
+def read_player_names(path='.'):
+    """{'Prénom Nom': player_id} depuis atp_players.csv."""
+    players = pd.read_csv(os.path.join(path, 'atp_players.csv'), encoding='ISO-8859-1',
+                          usecols=['player_id', 'name_first', 'name_last'])
+    names = players['name_first'].fillna('') + ' ' + players['name_last'].fillna('')
+    return dict(zip(names.str.strip().tolist(), players['player_id'].tolist()))
+
+
+class RankingsIndex:
+    def __init__(self, rankings, names=None):
+        rankings = rankings.drop_duplicates(subset=['player', 'ranking_date'], keep='last')
+        order = np.lexsort((rankings['ranking_date'].to_numpy(), rankings['player'].to_numpy()))
+        self.player = rankings['player'].to_numpy(np.int64)[order]
+        self.date = rankings['ranking_date'].to_numpy(np.int64)[order]
+        self.rank = rankings['rank'].to_numpy(np.int32)[order]
+        self.points = rankings['points'].to_numpy(np.float32)[order]
+        self.keys = self.player * DATE_SPAN + self.date
+        self.ranking_dates = np.unique(self.date)   # dates de publication
+        self.names = names or {}
+
+    @classmethod
+    def from_files(cls, path='.', with_names=True):
+        names = read_player_names(path) if with_names and os.path.exists(os.path.join(path, 'atp_players.csv')) else None
+        return cls(read_rankings(path), names)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def player_id(self, name):
+        return self.names.get(name)
+
+    # --- recherches ---
+    def _positions(self, player_ids, dates, strict):
+        player_ids = np.asarray(player_ids, dtype=np.int64)
+        query = player_ids * DATE_SPAN + dates
+        pos = np.searchsorted(self.keys, query, side='left' if strict else 'right') - 1
+        found = pos >= 0
+        found[found] &= self.player[pos[found]] == player_ids[found]
+        return pos, found
+
+    def asof(self, player_ids, dates, strict=False, max_days=None):
+        """
+        (classement, points) de chaque joueur au dernier classement publié au plus
+        tard à chaque date (strictement avant si 'strict'). NaN si le joueur
+        n'était pas classé, ou si ce classement date de plus de 'max_days' jours.
+        """
+        dates = yyyymmdd(dates)
+        pos, found = self._positions(player_ids, dates, strict)
+        if max_days is not None and found.any():
+            asof_day = pd.to_datetime(self.date[pos[found]].astype(str), format='%Y%m%d')
+            query_day = pd.to_datetime(dates[found].astype(str), format='%Y%m%d')
+            found[found] = np.asarray((query_day - asof_day).days) <= max_days
+        rank = np.full(len(pos), np.nan)
+        points = np.full(len(pos), np.nan)
+        rank[found] = self.rank[pos[found]]
+        points[found] = self.points[pos[found]]
+        return rank, points
+
+    def rank_on(self, player_id, date):
+        """Classement publié exactement à 'date' (AAAAMMJJ), None si le joueur n'y figure pas."""
+        key = int(player_id) * DATE_SPAN + int(date)
+        i = int(np.searchsorted(self.keys, key))
+        return int(self.rank[i]) if i < len(self.keys) and self.keys[i] == key else None
+
+    def rank_asof(self, player_id, date):
+        """Dernier classement connu au plus tard à 'date' (AAAAMMJJ), None sinon."""
+        key = int(player_id) * DATE_SPAN + int(date)
+        i = int(np.searchsorted(self.keys, key, side='right')) - 1
+        return int(self.rank[i]) if i >= 0 and self.player[i] == player_id else None
+
+    def has_ranking_date(self, date):
+        i = int(np.searchsorted(self.ranking_dates, int(date)))
+        return i < len(self.ranking_dates) and self.ranking_dates[i] == int(date)
+
+    def join_asof(self, matches, id_col, date_col='tourney_date', prefix=None, strict=True, max_days=None):
+        """
+        Ajoute à 'matches' les colonnes <prefix>rank_asof et <prefix>points_asof
+        (par défaut : classement publié strictement avant la date du tournoi).
+        """
+        prefix = id_col.replace('id', '') if prefix is None else prefix
+        rank, points = self.asof(matches[id_col].to_numpy(), matches[date_col], strict=strict, max_days=max_days)
+        matches[f'{prefix}rank_asof'] = rank
+        matches[f'{prefix}points_asof'] = points
+        return matches
@@ -0,0 +1,142 @@
+# =============================================================================
+# Analyse vectorisée des scores ("7-6(5) 6-4", "6-3 2-1 RET", "W/O", "[10-7]")
+# =============================================================================
+# Chaque chaîne de score distincte est analysée une seule fois (les scores
+# sont une colonne category : quelques dizaines de milliers de modalités pour
+# près d'un million de matchs) par une expression régulière appliquée à toute
+# la colonne (str.extractall), puis le résultat est réparti sur les matchs par
+# leurs codes. La table obtenue ne contient que des entiers et des booléens :
+#   - set<i>_w, set<i>_l : jeux du vainqueur et du perdant dans le set i
+#     (-1 si le set n'a pas été joué), set<i>_tb : points du perdant du
+#     tie-break (-1 sans tie-break ou si non renseigné) ;
+#   - n_sets, sets_w, sets_l, games_w, games_l, tiebreaks : totaux ;
+#   - retired, walkover, defaulted, unfinished, complete : état du match.
+# Un super tie-break de fin de match ("[10-7]") compte pour un set gagné 1-0.
+# Dans un match interrompu (abandon, disqualification, non terminé), le set en
+# cours ("6-3 2-1 RET") figure dans set<i>_* et games_* mais pas dans n_sets,
+# sets_w, sets_l : seuls les sets achevés (6 jeux et 2 d'écart, 7-6, super
+# tie-break à 10 points et 2 d'écart) y sont comptés.
+#
+# Les chaînes déjà analysées sont conservées dans le dossier du cache des
+# matchs (.cache_matches/scores.v<N>.arrow) : une analyse ne porte que sur les
+# chaînes jamais vues.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from match_cache import ARROW_AVAILABLE, CACHE_DIRNAME
+
+if ARROW_AVAILABLE:
+    import pyarrow.feather as feather
+
+# À incrémenter dès que les colonnes ou les règles d'analyse changent
+SCORE_VERSION = 2
+MAX_SETS = 5
+SET_COLUMNS = [f'set{i}_{part}' for i in range(1, MAX_SETS + 1) for part in ('w', 'l', 'tb')]
+TOTAL_COLUMNS = ['n_sets', 'sets_w', 'sets_l', 'games_w', 'games_l', 'tiebreaks']
+FLAG_COLUMNS = ['retired', 'walkover', 'defaulted', 'unfinished', 'complete']
+SCORE_COLUMNS = TOTAL_COLUMNS + FLAG_COLUMNS + SET_COLUMNS
+
+# Un set : jeux-jeux, points du tie-break entre parenthèses, ou [super tie-break]
+_SET_PATTERN = r'(?P<bracket>\[)?(?P<w>\d+)-(?P<l>\d+)(?:\((?P<tb>\d+)\))?'
+_FLAG_PATTERNS = {
+    'retired': r'RET',
+    'walkover': r'W/O|Walkover',
+    'defaulted': r'DEF|Default',
+    'unfinished': r'ABD|ABN|abandoned|unfinished|UNP|UNK|Played|\?',
+}
+
+_known = {}   # dossier des données (ou None) -> table indexée par chaîne de score
+
+
+def parse_score_strings(strings):
+    """Table SCORE_COLUMNS (une ligne par chaîne, même ordre) pour des chaînes distinctes."""
+    strings = pd.Series(np.asarray(strings, dtype=object), dtype=object).fillna('')
+    n = len(strings)
+    table = {}
+
+    sets = strings.str.extractall(_SET_PATTERN)
+    sets = sets[sets.index.get_level_values('match') < MAX_SETS]
+    row = sets.index.get_level_values(0).to_numpy()
+    number = sets.index.get_level_values('match').to_numpy()
+    a = sets['w'].astype(np.int64).to_numpy()
+    b = sets['l'].astype(np.int64).to_numpy()
+    tb = pd.to_numeric(sets['tb']).fillna(-1).to_numpy(np.int64)
+    bracket = sets['bracket'].notna().to_numpy()
+    # super tie-break : set gagné 1-0, points du perdant en guise de tie-break
+    tb = np.where(bracket, np.minimum(a, b), tb)
+    w = np.where(bracket, (a > b).astype(np.int64), a)
+    l = np.where(bracket, (a < b).astype(np.int64), b)
+    is_tiebreak = bracket | (tb >= 0) | ((np.maximum(w, l) == 7) & (np.minimum(w, l) == 6))
+    high, low = np.maximum(a, b), np.minimum(a, b)
+    finished = np.where(bracket, (high >= 10) & (high - low >= 2),
+                        ((high >= 6) & (high - low >= 2)) | ((high == 7) & (low == 6)))
+
+    for i in range(MAX_SETS):
+        on = number == i
+        for part, values in (('w', w), ('l', l), ('tb', tb)):
+            col = np.full(n, -1, dtype=np.int8)
+            col[row[on]] = values[on]
+            table[f'set{i + 1}_{part}'] = col
+
+    for flag, pattern in _FLAG_PATTERNS.items():
+        table[flag] = strings.str.contains(pattern, case=False, regex=True).to_numpy(dtype=bool)
+    # match interrompu : le set en cours n'est pas compté comme joué
+    interrupted = table['retired'] | table['defaulted'] | table['unfinished']
+    counted = finished | ~interrupted[row]
+
+    table['n_sets'] = np.bincount(row, weights=counted, minlength=n).astype(np.int8)
+    table['sets_w'] = np.bincount(row, weights=counted & (w > l), minlength=n).astype(np.int8)
+    table['sets_l'] = np.bincount(row, weights=counted & (w < l), minlength=n).astype(np.int8)
+    table['games_w'] = np.bincount(row, weights=w, minlength=n).astype(np.int16)
+    table['games_l'] = np.bincount(row, weights=l, minlength=n).astype(np.int16)
+    table['tiebreaks'] = np.bincount(row, weights=is_tiebreak, minlength=n).astype(np.int8)
+    table['complete'] = (table['n_sets'] > 0) & ~np.any([table[f] for f in _FLAG_PATTERNS], axis=0)
+    return pd.DataFrame(table, columns=SCORE_COLUMNS)
+
+
+def _cache_path(path):
+    return os.path.join(path, CACHE_DIRNAME, f'scores.v{SCORE_VERSION}.arrow')
+
+
+def _known_scores(strings, path=None):
+    # table des chaînes 'strings' (distinctes), en ne parsant que les inconnues
+    known = _known.get(path)
+    if known is None:
+        known = pd.DataFrame(columns=SCORE_COLUMNS, index=pd.Index([], dtype=object, name='score'))
+        if path is not None and ARROW_AVAILABLE and os.path.exists(_cache_path(path)):
+            known = feather.read_feather(_cache_path(path)).set_index('score')
+    new = [s for s, i in zip(strings, known.index.get_indexer(strings)) if i < 0]
+    if new:
+        parsed = parse_score_strings(new)
+        parsed.index = pd.Index(new, dtype=object, name='score')
+        known = pd.concat([known, parsed]) if len(known) else parsed
+        if path is not None and ARROW_AVAILABLE:
+            cached = _cache_path(path)
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            tmp = f"{cached}.{os.getpid()}.tmp"
+            feather.write_feather(known.reset_index(), tmp, compression='uncompressed')
+            os.replace(tmp, cached)
+    _known[path] = known
+    return known.iloc[known.index.get_indexer(strings)].reset_index(drop=True)
+
+
+def parse_scores(scores, path=None):
+    """
+    Table SCORE_COLUMNS alignée sur 'scores' (même index). Les chaînes
+    distinctes ne sont analysées qu'une fois ; avec 'path' (dossier des
+    données), le résultat est aussi conservé dans son cache.
+    """
+    scores = pd.Series(scores)
+    if isinstance(scores.dtype, pd.CategoricalDtype):
+        codes, uniques = scores.cat.codes.to_numpy(), scores.cat.categories.astype(str).tolist()
+    else:
+        codes, uniques = pd.factorize(scores)
+        uniques = [str(s) for s in uniques]
+    known = _known_scores(uniques + [''], path)
+    # codes -1 (score manquant) -> dernière ligne, celle de la chaîne vide
+    table = known.iloc[np.where(codes < 0, len(uniques), codes)]
+    table.index = scores.index
+    return table
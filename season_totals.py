@@ -0,0 +1,112 @@
+# =============================================================================
+# Totaux par joueur et par saison (statistiques de service et de retour)
+# =============================================================================
+# Les blocs de statistiques du vainqueur (w_ace..w_bpFaced) et du perdant
+# (l_ace..l_bpFaced) sont dépliés une seule fois en une table longue, une
+# ligne par joueur et par match, où chaque joueur porte ses statistiques de
+# service et celles de son adversaire (opp_*, c.-à-d. ses points de retour).
+# Tous les totaux joueur-saison sortent d'un seul groupby, puis les taux
+# (Ace%, DF%, 1stIn%, 1st%, 2nd%, SPW%, RPW%, TPW%, DomRatio) sont calculés
+# colonne par colonne. Le taux de premières balles s'appelle 1stIn% pour ne
+# pas se confondre avec le compteur 1stIn ; le CSV garde l'en-tête historique.
+
+import numpy as np
+import pandas as pd
+
+from match_schema import LOSER_STAT_COLUMNS, SERVE_STATS, WINNER_STAT_COLUMNS
+
+# Colonnes du CSV de sortie (identiques à l'ancien query_player_season_totals.py,
+# où '1stIn' est le taux 1stIn% de rate_stats)
+TOTALS_COLUMNS = ['Player', 'Year', 'Matches', 'Wins', 'Losses', 'Win%',
+                  'Ace%', 'DF%', '1stIn', '1st%', '2nd%',
+                  'SPW%', 'RPW%', 'TPW%', 'DomRatio']
+TOTALS_INPUT_COLUMNS = ['tourney_id', 'winner_id', 'winner_name', 'loser_id', 'loser_name'] + WINNER_STAT_COLUMNS + LOSER_STAT_COLUMNS
+
+
+def match_seasons(tourney_id):
+    """Saison de chaque match : les 4 premiers caractères de tourney_id (année du fichier)."""
+    if isinstance(tourney_id.dtype, pd.CategoricalDtype):
+        # une conversion par modalité plutôt que par ligne
+        years = pd.to_numeric(tourney_id.cat.categories.astype(str).str[:4], errors='coerce')
+        return np.asarray(years, dtype=np.float64)[tourney_id.cat.codes.to_numpy()].astype(np.int16)
+    return pd.to_numeric(tourney_id.astype(str).str[:4], errors='coerce').to_numpy().astype(np.int16)
+
+
+def player_perspective(matches):
+    """
+    Une ligne par joueur et par match avec statistiques : player_id, player,
+    season, won, <stat> (service du joueur) et opp_<stat> (service adverse),
+    plus surface, tourney_level et tourney_date quand 'matches' les contient.
+    Les matchs sans statistiques (w_ace ou l_ace manquant) sont écartés.
+    """
+    matches = matches[matches['w_ace'].notna() & matches['l_ace'].notna()]
+    n = len(matches)
+    season = match_seasons(matches['tourney_id'])
+    table = {
+        'player_id': np.r_[matches['winner_id'].to_numpy(np.int64), matches['loser_id'].to_numpy(np.int64)],
+        'player': np.r_[matches['winner_name'].to_numpy(dtype=object), matches['loser_name'].to_numpy(dtype=object)],
+        'season': np.r_[season, season],
+        'won': np.r_[np.ones(n, dtype=np.int64), np.zeros(n, dtype=np.int64)],
+    }
+    for col in ('surface', 'tourney_level', 'tourney_date'):
+        if col in matches:
+            values = matches[col].to_numpy(dtype=object)
+            table[col] = np.r_[values, values]
+    for stat, w_col, l_col in zip(SERVE_STATS, WINNER_STAT_COLUMNS, LOSER_STAT_COLUMNS):
+        w = matches[w_col].to_numpy(dtype=np.float64, na_value=np.nan)
+        l = matches[l_col].to_numpy(dtype=np.float64, na_value=np.nan)
+        table[stat] = np.r_[w, l]
+        table[f'opp_{stat}'] = np.r_[l, w]
+    return pd.DataFrame(table)
+
+
+def rate_stats(totals):
+    """
+    Taux dérivés des compteurs additifs (colonnes de player_perspective sommées,
+    plus 'matches') : Win%, Ace%, DF%, 1stIn%, 1st%, 2nd%, SPW%, RPW%, TPW%, DomRatio.
+    'totals' : DataFrame (une ligne par groupe) ou Series (un seul groupe).
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        svpt = totals['svpt']
+        spw = totals['1stWon'] + totals['2ndWon']
+        rpw = totals['opp_svpt'] - totals['opp_1stWon'] - totals['opp_2ndWon']
+        spw_rate = spw / svpt
+        rpw_rate = rpw / totals['opp_svpt']
+        rates = {
+            'Win%': totals['won'] / totals['matches'],
+            'Ace%': totals['ace'] / svpt,
+            'DF%': totals['df'] / svpt,
+            '1stIn%': totals['1stIn'] / svpt,
+            '1st%': totals['1stWon'] / totals['1stIn'],
+            '2nd%': totals['2ndWon'] / (svpt - totals['1stIn']),
+            'SPW%': spw_rate,
+            'RPW%': rpw_rate,
+            'TPW%': (spw + rpw) / (svpt + totals['opp_svpt']),
+            'DomRatio': rpw_rate / (1 - spw_rate),
+        }
+    return pd.DataFrame(rates) if isinstance(totals, pd.DataFrame) else pd.Series(rates, dtype=np.float64)
+
+
+def season_totals(matches, match_min=20):
+    """
+    Totaux et taux par joueur-saison (colonnes TOTALS_COLUMNS) pour les joueurs
+    ayant au moins 'match_min' matchs avec statistiques dans la saison.
+    Les matchs incomplets (W/O, abandons) doivent être exclus en amont.
+    """
+    long = player_perspective(matches)
+    sums = ['won'] + [c for c in long.columns if c.replace('opp_', '') in SERVE_STATS]
+    grouped = long.groupby(['season', 'player_id'], sort=True)
+    totals = grouped[sums].sum(min_count=0)
+    totals['matches'] = grouped.size()
+    totals['player'] = grouped['player'].last()
+    totals = totals[totals['matches'] >= match_min].reset_index()
+
+    result = pd.DataFrame({
+        'Player': totals['player'],
+        'Year': totals['season'].astype(int),
+        'Matches': totals['matches'],
+        'Wins': totals['won'].astype(int),
+        'Losses': (totals['matches'] - totals['won']).astype(int),
+    })
+    rates = rate_stats(totals).rename(columns={'1stIn%': '1stIn'})
+    return pd.concat([result, rates], axis=1)[TOTALS_COLUMNS]
@@ -0,0 +1,119 @@
+# =============================================================================
+# Comptage des sets d'un score donné (6-0, 6-1...) par joueur et par saison
+# =============================================================================
+# Les saisons sont lues une par une (tous les niveaux demandés d'une même
+# année ensemble, seules les colonnes utiles) : la mémoire reste bornée par
+# la plus grosse saison, quel que soit le nombre d'années parcourues.
+# Pour chaque saison, les sets viennent de la table d'analyse des scores
+# (score_parser, jeux du vainqueur et du perdant set par set) ; un motif
+# (a, b) est un set gagné a jeux à b par le joueur, côté vainqueur comme côté
+# perdant du match. Les occurrences sont triées une fois par ordre
+# chronologique (date, tour, match_num, numéro du set) : le nombre par joueur
+# et la N-ième occurrence sortent d'un seul groupby.
+
+import numpy as np
+import pandas as pd
+
+from match_loader import find_match_files, load_matches
+from match_schema import round_codes, yyyymmdd
+from score_parser import MAX_SETS, parse_scores
+
+PATTERN_TIERS = ('atp', 'qual_chall', 'futures')
+BAGEL = (6, 0)
+BREADSTICK = (6, 1)
+DEFAULT_PATTERNS = (BAGEL, BREADSTICK)
+PATTERN_INPUT_COLUMNS = ['tourney_id', 'tourney_name', 'tourney_date', 'round', 'match_num', 'score',
+                         'winner_id', 'winner_name', 'loser_id', 'loser_name']
+PATTERN_COLUMNS = ['season', 'player_id', 'player', 'pattern', 'count', 'nth_date', 'nth_tourney', 'nth_round']
+
+
+def pattern_name(pattern):
+    return f'{pattern[0]}-{pattern[1]}'
+
+
+def set_occurrences(matches, patterns=DEFAULT_PATTERNS, path=None):
+    """
+    Une ligne par set d'un des motifs, triée chronologiquement :
+    player_id, pattern, row (ligne du match dans 'matches'), set (1 à MAX_SETS).
+    Les walkovers sont ignorés ; les sets terminés d'un abandon comptent.
+    """
+    scores = parse_scores(matches['score'], path)
+    played = ~scores['walkover'].to_numpy()
+    w = np.column_stack([scores[f'set{i}_w'].to_numpy() for i in range(1, MAX_SETS + 1)])
+    l = np.column_stack([scores[f'set{i}_l'].to_numpy() for i in range(1, MAX_SETS + 1)])
+    winner_id = matches['winner_id'].to_numpy(np.int64)
+    loser_id = matches['loser_id'].to_numpy(np.int64)
+
+    parts = []
+    for k, (a, b) in enumerate(patterns):
+        for player, mine, theirs in ((winner_id, w, l), (loser_id, l, w)):
+            row, col = np.nonzero((mine == a) & (theirs == b) & played[:, None])
+            parts.append(pd.DataFrame({'player_id': player[row], 'pattern': np.full(len(row), k, dtype=np.int8),
+                                       'row': row, 'set': (col + 1).astype(np.int8)}))
+    occurrences = pd.concat(parts, ignore_index=True)
+
+    row = occurrences['row'].to_numpy()
+    date = yyyymmdd(matches['tourney_date'])[row]
+    rounds = round_codes(matches['round'])[row]
+    match_num = pd.to_numeric(matches['match_num'], errors='coerce').fillna(0).to_numpy(np.int64)[row]
+    order = np.lexsort((occurrences['set'].to_numpy(), match_num, rounds, date))
+    return occurrences.iloc[order].reset_index(drop=True)
+
+
+def count_set_patterns(matches, patterns=DEFAULT_PATTERNS, nth=10, min_count=1, path=None):
+    """
+    Nombre de sets de chaque motif par joueur sur 'matches' (une saison), et
+    date, tournoi et tour de la 'nth'-ième occurrence chronologique (vides si
+    le joueur en compte moins). Colonnes PATTERN_COLUMNS sauf 'season'.
+    """
+    occ = set_occurrences(matches, patterns, path)
+    grouped = occ.groupby(['player_id', 'pattern'], sort=True)
+    counts = grouped.size().rename('count').reset_index()
+    counts = counts[counts['count'] >= min_count]
+
+    # N-ième occurrence : rang chronologique dans le groupe
+    nth_occ = occ[grouped.cumcount().to_numpy() == nth - 1].set_index(['player_id', 'pattern'])['row']
+    rows = nth_occ.reindex(pd.MultiIndex.from_frame(counts[['player_id', 'pattern']])).to_numpy()
+    found = ~np.isnan(rows)
+    rows = np.where(found, rows, 0).astype(np.int64)
+
+    names = pd.Series(np.r_[matches['winner_name'].to_numpy(dtype=object), matches['loser_name'].to_numpy(dtype=object)],
+                      index=np.r_[matches['winner_id'].to_numpy(np.int64), matches['loser_id'].to_numpy(np.int64)])
+    names = names[~names.index.duplicated(keep='last')]
+
+    def nth_value(col):
+        values = matches[col].to_numpy(dtype=object)[rows]
+        values[~found] = None
+        return values
+
+    return pd.DataFrame({
+        'player_id': counts['player_id'].to_numpy(),
+        'player': names.reindex(counts['player_id'].to_numpy()).to_numpy(),
+        'pattern': [pattern_name(patterns[k]) for k in counts['pattern'].tolist()],
+        'count': counts['count'].to_numpy(),
+        'nth_date': nth_value('tourney_date'),
+        'nth_tourney': nth_value('tourney_name'),
+        'nth_round': nth_value('round'),
+    })
+
+
+def season_set_patterns(path='.', tiers=PATTERN_TIERS, start_year=None, end_year=None,
+                        patterns=DEFAULT_PATTERNS, nth=10, min_count=1, workers=None):
+    """
+    count_set_patterns pour chaque saison, en ne chargeant qu'une saison à la
+    fois (tous les niveaux de 'tiers'). Renvoie une table PATTERN_COLUMNS.
+    """
+    files = find_match_files(path, tiers, start_year, end_year)
+    seasons = sorted({int(f[-8:-4]) for f in files})
+    results = []
+    for season in seasons:
+        matches = load_matches([f for f in files if int(f[-8:-4]) == season], workers=workers,
+                               columns=PATTERN_INPUT_COLUMNS)
+        if matches.empty:
+            continue
+        counts = count_set_patterns(matches, patterns, nth, min_count, path)
+        counts.insert(0, 'season', season)
+        results.append(counts)
+    if not results:
+        return pd.DataFrame(columns=PATTERN_COLUMNS)
+    return pd.concat(results, ignore_index=True)[PATTERN_COLUMNS]
@@ -0,0 +1,178 @@
+# =============================================================================
+# Cube de compteurs additifs (service et retour) par joueur, saison, mois,
+# surface et niveau de tournoi
+# =============================================================================
+# Construit une fois depuis la table longue de season_totals.player_perspective
+# (une ligne par joueur et par match avec statistiques, cf. colonnes w_* et l_*
+# de matches_data_dictionary.txt) : chaque cellule du cube cumule, pour une
+# combinaison (joueur, saison, mois, surface, niveau), le nombre de matchs, de
+# victoires et les statistiques de service du joueur et de ses adversaires.
+#
+# Ces compteurs étant additifs, toute granularité plus grossière (carrière,
+# saison, surface, niveau, mois...) est une somme de cellules ; les taux
+# (Ace%, SPW%, RPW%, DomRatio...) sont dérivés des sommes par
+# season_totals.rate_stats, jamais moyennés. Les cellules sont triées par
+# joueur : la tranche d'un joueur est une recherche dichotomique, suivie de
+# masques sur quelques centaines de cellules.
+#
+# Le cube enregistré garde l'empreinte (taille, mtime) des CSV sources, comme
+# le cache des matchs : load_or_build le reconstruit dès qu'un fichier a été
+# ajouté, modifié ou supprimé.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from match_loader import INCOMPLETE_SCORES, find_match_files, load_tier, source_signature
+from match_schema import SERVE_STATS, yyyymmdd
+from season_totals import TOTALS_INPUT_COLUMNS, player_perspective, rate_stats
+
+CUBE_TIERS = ('atp', 'qual_chall', 'futures')
+CUBE_INPUT_COLUMNS = TOTALS_INPUT_COLUMNS + ['surface', 'tourney_level', 'tourney_date', 'score']
+CUBE_DIMENSIONS = ['player_id', 'season', 'month', 'surface', 'tourney_level']
+CUBE_COUNTERS = ['matches', 'won'] + SERVE_STATS + [f'opp_{s}' for s in SERVE_STATS]
+
+
+class StatsCube:
+    def __init__(self, dims, counters, surfaces, levels, names=None):
+        # dims : dict dimension -> tableau aligné sur les cellules (surface et niveau
+        # en codes dans 'surfaces' / 'levels', -1 si manquant) ; counters : matrice
+        # (cellules x CUBE_COUNTERS), cellules triées par joueur
+        self.dims = dims
+        self.counters = counters
+        self.surfaces = list(surfaces)
+        self.levels = list(levels)
+        self.names = names or {}          # id -> nom
+        self.signature = []               # empreinte des CSV sources (match_loader.source_signature)
+
+    @classmethod
+    def from_matches(cls, matches):
+        """Cube à partir d'une table de matchs (matchs incomplets déjà exclus)."""
+        long = player_perspective(matches)
+        surface = pd.Categorical(long['surface'])
+        level = pd.Categorical(long['tourney_level'].astype(str))
+        keys = pd.DataFrame({
+            'player_id': long['player_id'].to_numpy(np.int32),
+            'season': long['season'].to_numpy(np.int16),
+            'month': (yyyymmdd(long['tourney_date']) // 100 % 100).astype(np.int8),
+            'surface': surface.codes.astype(np.int8),
+            'tourney_level': level.codes.astype(np.int16),
+        })
+        values = long[['won'] + CUBE_COUNTERS[2:]].fillna(0)
+        values.insert(0, 'matches', 1)
+        cells = values.groupby([keys[d] for d in CUBE_DIMENSIONS], sort=True).sum()
+
+        dims = {d: cells.index.get_level_values(d).to_numpy() for d in CUBE_DIMENSIONS}
+        names = pd.Series(long['player'].to_numpy(), index=long['player_id'].to_numpy())
+        names = names[~names.index.duplicated(keep='last')].to_dict()
+        return cls(dims, cells[CUBE_COUNTERS].to_numpy(np.int32), surface.categories.astype(str),
+                   level.categories.astype(str), names)
+
+    @classmethod
+    def from_files(cls, path='.', tiers=CUBE_TIERS, start_year=None, end_year=None):
+        matches = load_tier(path, tiers, start_year=start_year, end_year=end_year,
+                            columns=CUBE_INPUT_COLUMNS, exclude_scores=INCOMPLETE_SCORES)
+        return cls.from_matches(matches)
+
+    def __len__(self):
+        return len(self.counters)
+
+    def player_id(self, name):
+        if not hasattr(self, '_ids'):
+            self._ids = {n: pid for pid, n in self.names.items()}
+        return self._ids.get(name)
+
+    # --- tranches ---
+    def _codes(self, values, categories):
+        values = [values] if isinstance(values, str) else values
+        return [categories.index(v) if v in categories else -2 for v in values]
+
+    def _mask(self, rows, season=None, month=None, surface=None, tourney_level=None):
+        # masque des cellules 'rows' satisfaisant les filtres (valeur ou liste de valeurs)
+        mask = np.ones(rows.stop - rows.start, dtype=bool)
+        filters = {'season': season, 'month': month,
+                   'surface': None if surface is None else self._codes(surface, self.surfaces),
+                   'tourney_level': None if tourney_level is None else self._codes(tourney_level, self.levels)}
+        for dim, wanted in filters.items():
+            if wanted is None:
+                continue
+            values = self.dims[dim][rows]
+            mask &= values == wanted if np.isscalar(wanted) else np.isin(values, list(wanted))
+        return mask
+
+    def _rows(self, player_id):
+        if player_id is None:
+            return slice(0, len(self.counters))
+        start, end = np.searchsorted(self.dims['player_id'], [player_id, player_id + 1])
+        return slice(int(start), int(end))
+
+    def totals(self, player_id=None, season=None, month=None, surface=None, tourney_level=None):
+        """Compteurs (Series indexée par CUBE_COUNTERS) sommés sur les cellules filtrées."""
+        rows = self._rows(player_id)
+        mask = self._mask(rows, season, month, surface, tourney_level)
+        return pd.Series(self.counters[rows][mask].sum(axis=0), index=CUBE_COUNTERS)
+
+    def rates(self, player_id=None, season=None, month=None, surface=None, tourney_level=None):
+        """Compteurs et taux dérivés (cf. season_totals.rate_stats) sur les cellules filtrées."""
+        totals = self.totals(player_id, season, month, surface, tourney_level)
+        return pd.concat([totals, rate_stats(totals)])
+
+    def rollup(self, by=('player_id', 'season'), player_id=None, season=None, month=None, surface=None,
+               tourney_level=None, with_rates=True):
+        """
+        Compteurs sommés à la granularité 'by' (sous-ensemble de CUBE_DIMENSIONS,
+        vide pour un seul total) sur les cellules filtrées, avec les taux dérivés.
+        """
+        rows = self._rows(player_id)
+        mask = self._mask(rows, season, month, surface, tourney_level)
+        counters = pd.DataFrame(self.counters[rows][mask], columns=CUBE_COUNTERS)
+        by = list(by)
+        if by:
+            keys = {d: self.dims[d][rows][mask] for d in by}
+            if 'surface' in keys:
+                keys['surface'] = pd.Categorical.from_codes(keys['surface'], self.surfaces)
+            if 'tourney_level' in keys:
+                keys['tourney_level'] = pd.Categorical.from_codes(keys['tourney_level'], self.levels)
+            table = counters.groupby([pd.Series(v, name=d) for d, v in keys.items()], observed=True).sum()
+        else:
+            table = counters.sum().to_frame().T
+        if with_rates:
+            table = pd.concat([table, rate_stats(table)], axis=1)
+        if 'player_id' in by:
+            table.insert(0, 'player', [self.names.get(pid) for pid in table.index.get_level_values('player_id')])
+        return table
+
+    # --- persistance ---
+    def save(self, path):
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, counters=self.counters,
+                 surfaces=np.array(self.surfaces, dtype=str), levels=np.array(self.levels, dtype=str),
+                 name_ids=np.array(list(self.names.keys()), dtype=np.int64),
+                 name_values=np.array(list(self.names.values()), dtype=str),
+                 signature=np.array(self.signature, dtype=str),
+                 **{f'dim_{d}': v for d, v in self.dims.items()})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            dims = {d: z[f'dim_{d}'] for d in CUBE_DIMENSIONS}
+            names = dict(zip(z['name_ids'].tolist(), z['name_values'].tolist()))
+            cube = cls(dims, z['counters'], z['surfaces'].tolist(), z['levels'].tolist(), names)
+            cube.signature = z['signature'].tolist() if 'signature' in z else []
+            return cube
+
+    @classmethod
+    def load_or_build(cls, path, data_path='.', tiers=CUBE_TIERS):
+        """Relit le cube s'il existe et que ses CSV sources n'ont pas changé, sinon le construit et l'enregistre."""
+        signature = source_signature(find_match_files(data_path, tiers))
+        if os.path.exists(path):
+            cube = cls.load(path)
+            if cube.signature == signature:
+                return cube
+            print(f"Avertissement : fichiers de matchs modifiés, le cube '{path}' est reconstruit.")
+        cube = cls.from_files(data_path, tiers)
+        cube.signature = signature
+        cube.save(path)
+        return cube
@@ -0,0 +1,113 @@
+# =============================================================================
+# Séries de victoires (ou de défaites) de tous les joueurs en un seul passage
+# =============================================================================
+# Les matchs sont mis au format long (une ligne par joueur et par match :
+# joueur, date, ordre du tour, victoire) puis triés une seule fois par
+# (joueur, date, tour, match_num). Les résultats de chaque joueur sont
+# découpés en plages consécutives (run-length encoding) : une série sans
+# interruption est une plage du résultat cherché.
+#
+# Avec une tolérance de 'gaps_allowed' résultats contraires, une série réunit
+# plusieurs plages consécutives du même joueur tant que le total des résultats
+# contraires qui les séparent ne dépasse pas la tolérance ; la dernière plage
+# atteignable depuis chaque plage de départ se trouve par une recherche
+# dichotomique sur les sommes cumulées des interruptions. Seules les séries
+# maximales (non contenues dans la série de la plage précédente) sont gardées.
+
+import numpy as np
+import pandas as pd
+
+from match_schema import round_codes, yyyymmdd
+
+STREAK_COLUMNS = ['player_id', 'name', 'start_date', 'start_rank', 'length', 'gaps']
+
+
+def long_format(matches):
+    """
+    Une ligne par joueur et par match, triée par (joueur, date, tour, match_num) :
+    player_id, name, date (AAAAMMJJ), round_order, won, rank, row (ligne du match).
+    Sans colonnes winner_id/loser_id, les joueurs sont identifiés par leur nom.
+    """
+    n = len(matches)
+    by_id = 'winner_id' in matches and 'loser_id' in matches
+    id_cols = ('winner_id', 'loser_id') if by_id else ('winner_name', 'loser_name')
+    player = np.r_[matches[id_cols[0]].to_numpy(), matches[id_cols[1]].to_numpy()]
+    if not by_id:
+        player = pd.factorize(player)[0]
+    date = yyyymmdd(matches['tourney_date'])
+    rounds = round_codes(matches['round']) if 'round' in matches else np.zeros(n, dtype=np.int8)
+    match_num = (pd.to_numeric(matches['match_num'], errors='coerce').fillna(0).to_numpy(np.int64)
+                 if 'match_num' in matches else np.zeros(n, dtype=np.int64))
+    rank = {side: pd.to_numeric(matches[f'{side}_rank'], errors='coerce').to_numpy(np.float64)
+            if f'{side}_rank' in matches else np.full(n, np.nan) for side in ('winner', 'loser')}
+
+    table = pd.DataFrame({
+        'player_id': player.astype(np.int64),
+        'name': np.r_[matches['winner_name'].to_numpy(dtype=object), matches['loser_name'].to_numpy(dtype=object)],
+        'date': np.r_[date, date],
+        'round_order': np.r_[rounds, rounds],
+        'match_num': np.r_[match_num, match_num],
+        'won': np.r_[np.ones(n, dtype=bool), np.zeros(n, dtype=bool)],
+        'rank': np.r_[rank['winner'], rank['loser']],
+        'row': np.r_[np.arange(n), np.arange(n)],
+    })
+    order = np.lexsort((table['match_num'].to_numpy(), table['round_order'].to_numpy(),
+                        table['date'].to_numpy(), table['player_id'].to_numpy()))
+    return table.iloc[order].reset_index(drop=True)
+
+
+def find_streaks(matches, wins=True, gaps_allowed=0, min_length=20, max_rank=None, tourney_level=None, since=None):
+    """
+    Séries de victoires (wins=True) ou de défaites de plus de 'min_length'
+    matchs, avec au plus 'gaps_allowed' résultats contraires à l'intérieur.
+    Filtres : niveau(x) de tournoi, date de début (AAAAMMJJ) et classement
+    maximal au début de la série (9999 si le joueur n'était pas classé).
+    Renvoie une table STREAK_COLUMNS (+ start_row, ligne du premier match dans
+    'matches'), triée par longueur puis date décroissantes.
+    """
+    if tourney_level is not None:
+        levels = [tourney_level] if isinstance(tourney_level, str) else list(tourney_level)
+        matches = matches[matches['tourney_level'].isin(levels)]
+    if since is not None:
+        matches = matches[yyyymmdd(matches['tourney_date']) >= since]
+    table = long_format(matches)
+    if table.empty:
+        return pd.DataFrame(columns=STREAK_COLUMNS + ['start_row'])
+
+    player = table['player_id'].to_numpy()
+    target = table['won'].to_numpy() == wins
+    # plages : début dès que le joueur ou le résultat change ; seules les plages
+    # du résultat cherché sont gardées
+    change = np.r_[True, (player[1:] != player[:-1]) | (target[1:] != target[:-1])]
+    run_start = np.flatnonzero(change)
+    run_length = np.diff(np.r_[run_start, len(table)])
+    keep = target[run_start]
+    start, length = run_start[keep], run_length[keep]
+
+    # interruption avant chaque plage : résultats contraires depuis la fin de la plage
+    # précédente du même joueur (plus que la tolérance pour une première plage)
+    gap = start - np.r_[0, start[:-1] + length[:-1]]
+    gap[np.r_[True, player[start[1:]] != player[start[:-1]]]] = gaps_allowed + 1
+
+    # dernière plage atteignable depuis chaque plage de départ
+    gaps_cum = np.cumsum(gap)
+    last = np.searchsorted(gaps_cum, gaps_cum + gaps_allowed, side='right') - 1
+    length_cum = np.r_[0, np.cumsum(length)]
+    total = length_cum[last + 1] - length_cum[:len(start)]
+    used = gaps_cum[last] - gaps_cum
+    maximal = np.r_[True, last[1:] != last[:-1]]
+    found = maximal & (total > min_length)
+
+    first = start[found]
+    streaks = pd.DataFrame({
+        'player_id': player[first],
+        'name': table['name'].to_numpy(dtype=object)[first],
+        'start_date': table['date'].to_numpy()[first],
+        'start_rank': np.nan_to_num(table['rank'].to_numpy()[first], nan=9999).astype(np.int64),
+        'length': total[found],
+        'gaps': used[found],
+        'start_row': table['row'].to_numpy()[first],
+    })
+    if max_rank is not None:
+        streaks = streaks[streaks['start_rank'] <= max_rank]
+    return streaks.sort_values(['length', 'start_date'], ascending=False, kind='stable').reset_index(drop=True)